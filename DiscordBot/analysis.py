@@ -0,0 +1,101 @@
+# analysis.py
+# The CPU-bound part of handling a message (unicode folding and the local pre-filter) can run in
+# worker processes, so a flood of long messages in one guild doesn't hold up every other shard.
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from uni2ascii import uni2ascii
+from normalize import MessageContext, looks_english
+from prefilter import PreFilter
+
+
+logger = logging.getLogger('discord')
+
+# Each worker process loads its own copy of the pre-filter once, in _init_worker
+_prefilter = None
+
+
+def _init_worker(lexicon_path, model_path, cutoffs):
+    global _prefilter
+    _prefilter = PreFilter.from_files(lexicon_path, model_path, **cutoffs)
+
+
+def analyze_text(raw):
+    '''
+    Returns (worker pid, ascii text, verdict, scores, CPU seconds). The verdict is None when the
+    text has to be translated before it can be classified.
+    '''
+    start = time.process_time()
+    text = uni2ascii(raw)
+    verdict, scores = None, {}
+    if not text.strip() or looks_english(text):
+        verdict, scores = _prefilter.classify(text)
+    return os.getpid(), text, verdict, scores, time.process_time() - start
+
+
+def classify_text(text):
+    start = time.process_time()
+    verdict, scores = _prefilter.classify(text)
+    return os.getpid(), text, verdict, scores, time.process_time() - start
+
+
+class AnalysisPool:
+    '''
+    A drop-in replacement for Normalizer.normalize that does the CPU work in a process pool.
+    Translation stays in this process (it is network-bound and uses the normalizer's cache), and
+    the returned MessageContext carries the pre-filter verdict so eval_text doesn't redo it.
+    '''
+
+    def __init__(self, normalizer, lexicon_path, model_path, cutoffs=None, workers=2, max_concurrency=64):
+        self.normalizer = normalizer
+        self.initargs = (lexicon_path, model_path, cutoffs or {})
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.pool = None
+        self.semaphore = None
+        self.per_worker = {} # pid -> [jobs, CPU seconds]
+
+    def _ensure_pool(self):
+        if self.pool is None:
+            # spawn, for the same reason as the render pool
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=self.initargs)
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.pool
+
+    async def _run(self, job, text):
+        pool = self._ensure_pool()
+        async with self.semaphore:
+            pid, text, verdict, scores, cpu = await asyncio.get_running_loop().run_in_executor(pool, job, text)
+        entry = self.per_worker.setdefault(pid, [0, 0.0])
+        entry[0] += 1
+        entry[1] += cpu
+        return text, verdict, scores
+
+    async def normalize(self, message):
+        start = time.perf_counter()
+        raw = message.content
+        text, verdict, scores = await self._run(analyze_text, raw)
+        translated = text
+        if verdict is None:
+            translated = await self.normalizer.translate(text)
+            translated, verdict, scores = await self._run(classify_text, translated)
+        return MessageContext(message, raw, translated, translated != text, time.perf_counter() - start,
+                              prefilter=(verdict, scores))
+
+    async def normalize_text(self, raw):
+        return await self.normalizer.normalize_text(raw)
+
+    def stats(self):
+        return {
+            'normalizer': self.normalizer.stats(),
+            'workers': {pid: {'jobs': jobs, 'cpu_s': round(cpu, 3)} for pid, (jobs, cpu) in self.per_worker.items()},
+        }
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
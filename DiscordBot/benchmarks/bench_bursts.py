@@ -0,0 +1,113 @@
+# bench_bursts.py
+# Cost per message and memory of the burst detector, next to exact per-author timestamp queues,
+# on a stream of messages from many authors with a few flooders and one copy-paste raid mixed in.
+#
+#   python benchmarks/bench_bursts.py --messages 300000 --authors 200000
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bursts import BurstDetector, RATE, REPEATED
+from verdict_cache import normalize_key_text
+
+
+class ExactRates:
+    '''
+    The straightforward alternative: a queue of recent timestamps per author and per text.
+    '''
+
+    def __init__(self, rate_limit=15, rate_window=30, repeat_limit=8, repeat_window=60, min_repeat_length=20):
+        self.limits = {RATE: (rate_limit, rate_window), REPEATED: (repeat_limit, repeat_window)}
+        self.min_repeat_length = min_repeat_length
+        self.recent = {}
+        self.reported = set()
+
+    def _count(self, key, now):
+        limit, window = self.limits[key[0]]
+        times = self.recent.get(key)
+        if times is None:
+            times = self.recent[key] = deque()
+        times.append(now)
+        while times[0] <= now - window:
+            times.popleft()
+        if len(times) > limit and key not in self.reported:
+            self.reported.add(key)
+            return [(key[0], len(times))]
+        return []
+
+    def add(self, author_id, text, now):
+        bursts = self._count((RATE, author_id), now)
+        text = normalize_key_text(text)
+        if len(text) >= self.min_repeat_length:
+            bursts += self._count((REPEATED, text), now)
+        return bursts
+
+
+def make_stream(args):
+    rng = random.Random(1)
+    words = 'the game last night was great and we should play again tomorrow after class'.split()
+    stream = []
+    flooders = set(range(args.flooders))
+    raid_text = 'join my server for free nitro discord-gift/raid'
+    for i in range(args.messages):
+        now = i / args.rate
+        roll = rng.random()
+        if roll < 0.03 and flooders:
+            # flooders post every second for a while, far above the limit
+            author = rng.choice(sorted(flooders))
+            text = f'spam {i}'
+        elif roll < 0.032:
+            author = args.authors + rng.randrange(1000)
+            text = raid_text
+        else:
+            author = args.flooders + rng.randrange(args.authors)
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 12)))
+        stream.append((author, text, now))
+    return stream
+
+
+def feed(detector, stream):
+    found = {RATE: set(), REPEATED: set()}
+    for author, text, now in stream:
+        for kind, count in detector.add(author, text, now):
+            found[kind].add(author if kind == RATE else text)
+    return found
+
+
+def run(name, make_detector, stream, args):
+    detector = make_detector()
+    start = time.perf_counter()
+    found = feed(detector, stream)
+    elapsed = time.perf_counter() - start
+    # a second pass under tracemalloc, which would distort the timing
+    tracemalloc.start()
+    detector = make_detector()
+    feed(detector, stream)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    authors = len({author for author, _, _ in stream})
+    flooders = found[RATE] & set(range(args.flooders))
+    print(f"{name}: {elapsed / len(stream) * 1e6:.2f} us per message, {memory / 1e6:.1f} MB "
+          f"({memory / authors:.0f} bytes per author seen); found {len(flooders)}/{args.flooders} flooders, "
+          f"{len(found[RATE]) - len(flooders)} false rate bursts, {len(found[REPEATED])} repeated texts")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=300000)
+    parser.add_argument('--authors', type=int, default=200000)
+    parser.add_argument('--flooders', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=1000, help="messages per second across all authors")
+    args = parser.parse_args()
+    stream = make_stream(args)
+    run('sketch', lambda: BurstDetector(min_repeat_length=20), stream, args)
+    run('exact queues', ExactRates, stream, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+# bench_columnar.py
+# File size, load time and query time of the columnar history against the tab-separated files,
+# for the same synthetic messages.
+#   - load: building the in-memory author index and mention graph the bot starts with
+#   - queries: one author's hourly histogram, every mention edge, and a pass over all content,
+#     each from a cold start (open/parse the files, then answer)
+#
+#   python benchmarks/bench_columnar.py --messages 1000000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar import HistoryReader, HistoryWriter, read_names, read_segments
+from history import HistoryIndex, parse_timestamp, to_datetime
+from mention_graph import MentionGraph
+from message_store import MessageFile, read_rows
+
+
+AUTHORS = 5000
+START = 1640995200.0 # 2022-01-01
+
+
+def synthetic(n):
+    rng = random.Random(n)
+    words = ('the game last night was great and i think we should play again tomorrow after class '
+             'did anyone finish the homework yet it was harder than i expected honestly').split()
+    t = START
+    for i in range(n):
+        t += rng.expovariate(1 / 2.0)
+        author = int(AUTHORS * rng.random() ** 3)
+        mentions = [f'user{int(AUTHORS * rng.random() ** 3)}'] if rng.random() < 0.1 else []
+        content = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 20)))
+        yield 10 ** 17 + i, 10 ** 17 + author, f'user{author}', content, t, mentions
+
+
+def write_files(directory, n):
+    time_file = MessageFile(os.path.join(directory, 'time_data.csv'))
+    network_file = MessageFile(os.path.join(directory, 'network_data.csv'))
+    writer = HistoryWriter(os.path.join(directory, 'history'))
+    time_rows, network_rows, history_rows = [], [], []
+    for message_id, author_id, author_name, content, t, mentions in synthetic(n):
+        # the same fields the store writes
+        base = [str(message_id), str(author_id), author_name, content, str(to_datetime(t))]
+        time_rows.append(base + [str(mentions), "1"])
+        network_rows.extend(base + [name, "1"] for name in mentions)
+        history_rows.append((message_id, author_id, author_name, content, round(t * 1e6), mentions))
+        if len(time_rows) >= 10000:
+            time_file.write(time_rows)
+            network_file.write(network_rows)
+            writer.append(history_rows)
+            time_rows, network_rows, history_rows = [], [], []
+    time_file.write(time_rows)
+    network_file.write(network_rows)
+    writer.append(history_rows)
+    time_file.close()
+    network_file.close()
+    writer.close()
+
+
+def size_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1e6
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names) / 1e6
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def csv_histogram(path, author_id):
+    counts = {}
+    for row in read_rows(path):
+        if row['message_author_id'] == str(author_id):
+            t = parse_timestamp(row['message_timestamp'])
+            counts[t - t % 3600] = counts.get(t - t % 3600, 0) + 1
+    return sorted(counts.items())
+
+
+def csv_edges(path):
+    weights = {}
+    for row in read_rows(path):
+        edge = (row['message_author_name'], row['message_mentions'])
+        weights[edge] = weights.get(edge, 0) + 1
+    return weights
+
+
+def csv_load(time_path, network_path):
+    # How the bot built its author index and mention graph from the tab-separated files
+    index = HistoryIndex()
+    for row in read_rows(time_path):
+        try:
+            index.add(row['message_author_id'], parse_timestamp(row['message_timestamp']))
+        except ValueError:
+            continue
+    graph = MentionGraph()
+    for row in read_rows(network_path):
+        graph.add(row['message_author_name'], row['message_mentions'])
+    return index, graph
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        write_files(directory, args.messages)
+        time_path = os.path.join(directory, 'time_data.csv')
+        network_path = os.path.join(directory, 'network_data.csv')
+        history_path = os.path.join(directory, 'history')
+        author_id = 10 ** 17 + AUTHORS // 2
+
+        print(f"{args.messages} messages")
+        print(f"size: CSV {size_mb(time_path) + size_mb(network_path):.1f} MB, columnar {size_mb(history_path):.1f} MB")
+
+        csv_time, _ = timed(lambda: csv_load(time_path, network_path))
+        col_time, _ = timed(lambda: (
+            HistoryIndex().load_segments(read_segments(history_path, ['author_id', 'timestamp'])),
+            MentionGraph().load_segments(read_segments(history_path, ['message_id', 'author', 'mention_count', 'mentions']),
+                                         read_names(history_path))))
+        print(f"load author index and mention graph: CSV {csv_time:.2f} s, columnar {col_time:.2f} s")
+
+        # The columnar side answers the way the bot does, from the indexes loaded above
+        csv_time, csv_result = timed(lambda: csv_histogram(time_path, author_id))
+        col_time, col_result = timed(lambda: HistoryIndex().load_segments(read_segments(history_path, ['author_id', 'timestamp']))
+                                     .histogram(author_id, 'hour'))
+        assert csv_result == col_result
+        print(f"one author's hourly histogram: CSV {csv_time * 1000:.0f} ms, columnar {col_time * 1000:.1f} ms")
+
+        csv_time, csv_result = timed(lambda: csv_edges(network_path))
+        col_time, col_result = timed(lambda: MentionGraph().load_segments(
+            read_segments(history_path, ['message_id', 'author', 'mention_count', 'mentions']), read_names(history_path)).out_edges)
+        assert csv_result == {(source, target): weight for source, targets in col_result.items() for target, weight in targets.items()}
+        print(f"all mention edges: CSV {csv_time * 1000:.0f} ms, columnar {col_time * 1000:.1f} ms")
+
+        # NumPy's import is a one-off cost of the first content pass, not part of it
+        import numpy
+
+        csv_time, _ = timed(lambda: sum(len(row['message_content']) for row in read_rows(time_path)))
+        col_time, _ = timed(lambda: sum(len(content) for _, content, _, _ in HistoryReader(history_path).messages()))
+        print(f"every message's content: CSV {csv_time * 1000:.0f} ms, columnar {col_time * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=1000000)
+    main(parser.parse_args())
@@ -0,0 +1,107 @@
+# bench_dispatch.py
+# A spam wave of flagged messages posted to a mod channel that enforces Discord's per-channel limit
+# (5 messages per 5 seconds; discord.py sleeps out the limit before sending), one post per alert as
+# the bot used to do and through the coalescing dispatcher. Time is scaled by `--scale` so a wave
+# of `--seconds` Discord seconds runs quickly.
+#
+#   python benchmarks/bench_dispatch.py --alerts 300 --authors 30
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import deque
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mod_dispatch import ModDispatcher
+from mod_queue import ModCase
+from scheduler import percentile
+from fake_discord import Post
+
+
+class RateLimitedChannel:
+    def __init__(self, limit, period, latency):
+        self.id = 1
+        self.limit = limit
+        self.period = period
+        self.latency = latency
+        self.sends = deque()
+        self.lock = asyncio.Lock()
+        self.sent = 0
+        self.waited = 0.0
+
+    async def send(self, content=None, **kwargs):
+        async with self.lock:
+            if len(self.sends) >= self.limit:
+                delay = self.sends[0] + self.period - time.perf_counter()
+                if delay > 0:
+                    self.waited += delay
+                    await asyncio.sleep(delay)
+                self.sends.popleft()
+            self.sends.append(time.perf_counter())
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return Post()
+
+
+def make_wave(args):
+    rng = random.Random(1)
+    spam = [f'free nitro click here discord-gift/{i}' for i in range(args.texts)]
+    return [ModCase(1000 + rng.randrange(args.authors), None, i, 1, rng.choice(spam), 'flagged')
+            for i in range(args.alerts)]
+
+
+async def run(args, coalesce):
+    channel = RateLimitedChannel(5, 5 * args.scale, args.send_latency * args.scale)
+    delays = []
+    wave = make_wave(args)
+    for case in wave:
+        case.author_name = f'user{case.author_id}'
+
+    async def send(channel, text, case):
+        post = await channel.send(text)
+        # every alert carried by this post has now reached the moderators
+        now = time.perf_counter()
+        delays.extend(now - arrived[message_id] for message_id in case.message_ids())
+        return post
+
+    dispatcher = ModDispatcher(send, window=1.0 * args.scale, rate=1 / args.scale, burst=5)
+    arrived = {}
+    tasks = []
+    start = time.perf_counter()
+    gap = args.seconds * args.scale / len(wave)
+    for i, case in enumerate(wave):
+        delay = start + i * gap - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        arrived[case.message_id] = time.perf_counter()
+        if coalesce:
+            dispatcher.submit(channel, 'Flagged message', case)
+        else:
+            tasks.append(asyncio.create_task(send(channel, 'Flagged message', case)))
+    await asyncio.gather(*tasks)
+    await dispatcher.drain()
+    elapsed = time.perf_counter() - start
+    # report in Discord seconds
+    delays = [d / args.scale for d in delays]
+    waited = (channel.waited + dispatcher.rate_limit_wait) / args.scale
+    print(f"{'coalesced' if coalesce else 'one post per alert'}: {len(wave)} alerts in {channel.sent} posts, "
+          f"all delivered after {elapsed / args.scale:.1f} s, {waited:.1f} s waiting on the rate limit; "
+          f"alert delay p50 {percentile(delays, 50):.1f} s, p99 {percentile(delays, 99):.1f} s")
+
+
+async def main(args):
+    await run(args, False)
+    await run(args, True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--alerts', type=int, default=300)
+    parser.add_argument('--authors', type=int, default=30)
+    parser.add_argument('--texts', type=int, default=5, help="distinct spam texts in the wave")
+    parser.add_argument('--seconds', type=float, default=20, help="length of the wave")
+    parser.add_argument('--send-latency', type=float, default=0.1)
+    parser.add_argument('--scale', type=float, default=0.02, help="real seconds per Discord second")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,80 @@
+# bench_edits.py
+# Scoring calls made for an edit storm, before and after debouncing. "before" is what the bot used
+# to do: every edit event went through on_message and was scored again. Each simulated author
+# edits a message several times in quick succession, sometimes only touching whitespace or case.
+#
+#   python benchmarks/bench_edits.py --messages 200 --edits 8 --delay 0.05
+import argparse
+import asyncio
+import os
+import random
+import sys
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from edits import EditPipeline
+from normalize import Normalizer
+
+
+class IdentityTranslator:
+    def translate(self, text):
+        return text
+
+
+class Message:
+    def __init__(self, id, content):
+        self.id = id
+        self.content = content
+
+
+def edit_storm(messages, edits, seed=1):
+    rng = random.Random(seed)
+    events = []
+    for i in range(messages):
+        text = f"message number {i} from the edit storm"
+        for j in range(edits):
+            roll = rng.random()
+            if roll < 0.3:
+                text = text + ' '
+            elif roll < 0.5:
+                text = text.upper() if text.islower() else text.lower()
+            else:
+                text = text + f" edit {j}"
+            events.append(Message(i, text))
+    rng.shuffle(events)
+    return events
+
+
+async def run(messages, edits, delay):
+    events = edit_storm(messages, edits)
+    scored = []
+
+    async def score(message, context):
+        scored.append(message.id)
+
+    pipeline = EditPipeline(Normalizer(translator=IdentityTranslator()), score, delay=delay, max_wait=delay * 5)
+    for i in range(messages):
+        pipeline.remember(i, f"message number {i} from the edit storm")
+    for message in events:
+        pipeline.submit(message)
+        await asyncio.sleep(0)
+    while pipeline.pending:
+        await asyncio.sleep(delay)
+    return len(events), len(scored), pipeline.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--edits', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.05)
+    args = parser.parse_args()
+    events, scored, stats = asyncio.run(run(args.messages, args.edits, args.delay))
+    print(f"{events} edit events")
+    print(f"  before: {events} scoring calls")
+    print(f"   after: {scored} scoring calls ({stats['collapsed']} collapsed, "
+          f"{stats['scoring_avoided'] - stats['collapsed']} unchanged after normalization)")
+
+
+if __name__ == '__main__':
+    main()
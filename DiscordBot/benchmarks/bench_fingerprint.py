@@ -0,0 +1,72 @@
+# bench_fingerprint.py
+# Ingest cost and duplicate lookup time of ContentIndex as history grows, against the full scan
+# generate_freq_table used to do. Spam texts are lightly mutated so near-duplicate lookup has
+# something to group.
+#
+#   python benchmarks/bench_fingerprint.py --sizes 10000 100000 --threshold 0.8
+import argparse
+import os
+import random
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fingerprint import ContentIndex
+
+
+SPAM = 'get free discord nitro for 3 months at discord-gift.example claim now before it expires'
+
+
+def mutate(text):
+    # the kind of edit spammers use to dodge exact matching
+    i = random.randrange(len(text))
+    return text[:i] + random.choice('.!* ') + text[i:]
+
+
+def synthetic(n):
+    random.seed(n)
+    for i in range(n):
+        if random.random() < 0.05:
+            yield mutate(SPAM), f'bot{random.randrange(40)}', float(i)
+        else:
+            yield f'ordinary message {i} about {random.randrange(1000)}', f'user{random.randrange(2000)}', float(i)
+
+
+def scan(rows, text):
+    # the comparison loop of the old generate_freq_table, minus re-reading the file from disk
+    counts = {}
+    for content, author, _ in rows:
+        if content == text:
+            counts[author] = counts.get(author, 0) + 1
+    return counts
+
+
+def main(args):
+    print(f"{'messages':>9} {'ingest us/msg':>14} {'exact us':>9} {'near-dup ms':>12} {'exact copies':>13} {'near copies':>12} {'scan ms':>8}")
+    for n in args.sizes:
+        rows = list(synthetic(n))
+        index = ContentIndex()
+        start = time.perf_counter()
+        for content, author, t in rows:
+            index.add(content, author, t)
+        ingest = (time.perf_counter() - start) / n * 1e6
+
+        probe = mutate(SPAM)
+        start = time.perf_counter()
+        exact = index.author_counts(probe)
+        exact_us = (time.perf_counter() - start) * 1e6
+        start = time.perf_counter()
+        near = index.author_counts(probe, args.threshold)
+        near_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        scan(rows, probe)
+        scan_ms = (time.perf_counter() - start) * 1000
+        print(f"{n:>9} {ingest:>14.1f} {exact_us:>9.1f} {near_ms:>12.2f} "
+              f"{sum(c for c, _, _ in exact.values()):>13} {sum(c for c, _, _ in near.values()):>12} {scan_ms:>8.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--threshold', type=float, default=0.8)
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+# bench_history.py
+# Build and per-author query time of HistoryIndex at 10k, 1M and 10M stored messages, with the
+# old full-file scan of generate_time_plot for comparison at the sizes where it is practical.
+#
+#   python benchmarks/bench_history.py --sizes 10000 1000000 10000000 --csv-up-to 1000000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import HistoryIndex, parse_timestamp, to_datetime
+
+
+AUTHORS = 5000
+START = 1640995200.0 # 2022-01-01
+
+
+def synthetic(n):
+    # Zipf-ish activity: a few authors send most of the messages
+    random.seed(n)
+    t = START
+    for _ in range(n):
+        t += random.expovariate(1 / 2.0)
+        yield int(AUTHORS * random.random() ** 3), t
+
+
+def write_csv(path, n):
+    with open(path, 'w') as f:
+        f.write('message_id\tmessage_author_id\tmessage_author_name\tmessage_content\tmessage_timestamp\tmessage_mentions\tcount\t\n')
+        for i, (author, t) in enumerate(synthetic(n)):
+            f.write(f'{i}\t{author}\tuser{author}\thello\t{to_datetime(t).replace(tzinfo=None)}\t[]\t1\t\n')
+
+
+def csv_scan(path, author):
+    # The loop generate_time_plot used to run on every ✅ reaction
+    times = []
+    with open(path) as f:
+        for row in (line.split('\t') for line in f):
+            if len(row) > 1 and row[1] == str(author):
+                times.append(parse_timestamp(row[4]))
+    return times
+
+
+def main(args):
+    print(f"{'messages':>10} {'build s':>8} {'memory MB':>10} {'author msgs':>12} {'times us':>9} {'hist us':>8} {'csv scan ms':>12}")
+    for n in args.sizes:
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = HistoryIndex()
+        for author, t in synthetic(n):
+            index.add(author, t)
+        build = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+
+        # a moderately active author, like the ones that get flagged
+        author = AUTHORS // 2
+        repeats = 20
+        start = time.perf_counter()
+        for _ in range(repeats):
+            times = index.author_times(author)
+        times_us = (time.perf_counter() - start) / repeats * 1e6
+        start = time.perf_counter()
+        for _ in range(repeats):
+            index.histogram(author, index.pick_bucket(author))
+        hist_us = (time.perf_counter() - start) / repeats * 1e6
+
+        scan = '-'
+        if n <= args.csv_up_to:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'time_data.csv')
+                write_csv(path, n)
+                start = time.perf_counter()
+                csv_scan(path, author)
+                scan = f'{(time.perf_counter() - start) * 1000:.1f}'
+        print(f"{n:>10} {build:>8.2f} {memory:>10.1f} {len(times):>12} {times_us:>9.1f} {hist_us:>8.1f} {scan:>12}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 1000000, 10000000])
+    parser.add_argument('--csv-up-to', type=int, default=1000000, help='largest size to also time the CSV scan at')
+    main(parser.parse_args())
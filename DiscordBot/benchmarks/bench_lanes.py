@@ -0,0 +1,122 @@
+# bench_lanes.py
+# Moderator-action latency while message ingestion is saturated, with every event handled as its
+# own task (what discord.py does and what the bot used to do) and with the lane scheduler.
+#
+# Each channel message costs some CPU for normalization and the pre-filter, a Perspective round
+# trip and a little more CPU; messages arrive faster than the loop can do that work. A moderator
+# action (a reaction that deletes a message) arrives every `--mod-interval` seconds and costs one
+# Discord API round trip. Latency is measured from arrival to completion.
+#
+#   python benchmarks/bench_lanes.py --rate 3000 --seconds 5
+import argparse
+import asyncio
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lanes import LaneScheduler, MODERATOR, BULK
+from scheduler import percentile
+
+
+def burn(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def score_message(args):
+    burn(args.cpu_ms / 2000)
+    await asyncio.sleep(args.perspective_latency)
+    burn(args.cpu_ms / 2000)
+    return True
+
+
+async def moderator_action(args):
+    await asyncio.sleep(args.api_latency)
+    return True
+
+
+async def run(args, lanes):
+    mod_latencies = [] # (arrival offset, latency)
+    scored = 0
+    tasks = set()
+
+    async def on_message():
+        nonlocal scored
+        if lanes is None:
+            result = await score_message(args)
+        else:
+            result = await lanes.run(BULK, score_message, args, sheddable=True)
+        scored += result is not None
+
+    async def on_reaction(arrived):
+        if lanes is None:
+            await moderator_action(args)
+        else:
+            await lanes.run(MODERATOR, moderator_action, args)
+        mod_latencies.append((arrived - start, time.perf_counter() - arrived))
+
+    def dispatch(coro):
+        task = asyncio.create_task(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    start = time.perf_counter()
+    sent = 0
+    reactions = 0
+    next_mod = start
+    while time.perf_counter() - start < args.seconds:
+        now = time.perf_counter()
+        # messages that should have arrived by now
+        due = int((now - start) * args.rate)
+        for _ in range(due - sent):
+            dispatch(on_message())
+        sent = max(sent, due)
+        if now >= next_mod:
+            dispatch(on_reaction(now))
+            reactions += 1
+            next_mod += args.mod_interval
+        await asyncio.sleep(0.001)
+    # give outstanding moderator actions a bounded time to finish
+    deadline = time.perf_counter() + args.drain
+    while len(mod_latencies) < reactions and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    for task in list(tasks):
+        task.cancel()
+    return sent, scored, reactions, mod_latencies
+
+
+def report(name, sent, scored, reactions, mod_latencies, shed=None):
+    # a starved loop also falls behind reading events, so fewer of them arrive in the run
+    print(f"{name}: {sent} messages and {reactions} moderator actions arrived; {scored} messages scored"
+          + (f", {shed} shed" if shed is not None else "")
+          + f", {len(mod_latencies)} moderator actions completed")
+    by_second = {}
+    for arrived, latency in mod_latencies:
+        by_second.setdefault(int(arrived), []).append(latency * 1000)
+    for second, latencies in sorted(by_second.items()):
+        print(f"  second {second}: moderator action p50 {percentile(latencies, 50):8.1f} ms  "
+              f"p99 {percentile(latencies, 99):8.1f} ms")
+
+
+async def main(args):
+    report("one task per event", *await run(args, None))
+    lanes = LaneScheduler(args.concurrency, (None, None, args.bulk_limit), (1000, 1000, args.max_queued))
+    report("lane scheduler", *await run(args, lanes), shed=lanes.shed[BULK])
+    await lanes.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=float, default=3000, help="channel messages per second")
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--cpu-ms', type=float, default=0.5, help="CPU per message")
+    parser.add_argument('--perspective-latency', type=float, default=0.05)
+    parser.add_argument('--api-latency', type=float, default=0.02)
+    parser.add_argument('--mod-interval', type=float, default=0.1)
+    parser.add_argument('--concurrency', type=int, default=128)
+    parser.add_argument('--bulk-limit', type=int, default=96)
+    parser.add_argument('--max-queued', type=int, default=5000)
+    parser.add_argument('--drain', type=float, default=30, help="seconds to wait for late moderator actions")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+# bench_memory.py
+# Replays a million channel messages through deleteMap and the report session map and samples
+# RSS as it goes. The bounded maps stay flat once full; the old dicts of bound methods and
+# abandoned Report objects grow with every message.
+#
+#   python benchmarks/bench_memory.py --messages 1000000 --old-messages 200000
+import argparse
+import gc
+import os
+import resource
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import DELETE_MAP_SIZE, DELETE_MAP_TTL, MAX_OPEN_REPORTS, REPORT_TIMEOUT
+from lru import LRUCache
+from report import Report
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+class Message:
+    # roughly the per-message payload a discord.Message keeps alive
+    def __init__(self, i):
+        self.id = 950000000000000000 + i
+        self.channel_id = 950000000000000001
+        self.content = f'message {i} ' + 'x' * 200
+        self.embeds = []
+        self.attachments = []
+        self.mentions = []
+
+    async def add_reaction(self, emoji):
+        pass
+
+
+def replay(n, bounded, sample_every):
+    delete_map = LRUCache(DELETE_MAP_SIZE, DELETE_MAP_TTL) if bounded else {}
+    reports = LRUCache(MAX_OPEN_REPORTS, REPORT_TIMEOUT) if bounded else {}
+    samples = []
+    for i in range(n):
+        message = Message(i)
+        if bounded:
+            delete_map.set(str(message.id), (message.channel_id, message.id))
+        else:
+            delete_map[str(message.id)] = message.add_reaction
+        if i % 20 == 0:
+            # someone types "report" and never finishes
+            report = Report(None)
+            report.message = message
+            if bounded:
+                reports.set(i, report)
+            else:
+                reports[i] = report
+        if (i + 1) % sample_every == 0:
+            samples.append((i + 1, rss_mb()))
+    return samples
+
+
+def main(args):
+    for name, bounded, n in (('bounded', True, args.messages), ('old unbounded', False, args.old_messages)):
+        gc.collect()
+        base = rss_mb()
+        samples = replay(n, bounded, args.sample_every)
+        print(f"{name}: RSS growth in MB after N messages")
+        print('  ' + '  '.join(f"{count // 1000}k:{rss - base:.0f}" for count, rss in samples))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--old-messages', type=int, default=200000)
+    parser.add_argument('--sample-every', type=int, default=100000)
+    main(parser.parse_args())
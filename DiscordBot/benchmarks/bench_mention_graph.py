@@ -0,0 +1,75 @@
+# bench_mention_graph.py
+# Build and query time of the live MentionGraph on synthetic servers of 10k to 1M mention edges.
+# The old path (re-reading network_data.csv with pandas and rebuilding the whole nx.DiGraph on
+# every ✅) is timed for comparison up to --old-up-to edges.
+#
+#   python benchmarks/bench_mention_graph.py --edges 10000 100000 1000000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import networkx as nx
+import pandas as pd
+from mention_graph import MentionGraph
+
+
+def synthetic(n):
+    random.seed(n)
+    users = max(100, n // 20)
+    for _ in range(n):
+        # mentions cluster: most go to a nearby, popular user
+        source = int(users * random.random() ** 2)
+        yield f'user{source}', f'user{(source + int(random.expovariate(0.05))) % users}'
+
+
+def old_rebuild(path):
+    data_panda = pd.read_csv(path, sep='\t', lineterminator='\n')
+    data_panda.dropna(axis=0, how='all', inplace=True)
+    return nx.from_pandas_edgelist(data_panda, source='message_author_name', target='message_mentions',
+                                   edge_attr=True, create_using=nx.DiGraph())
+
+
+def main(args):
+    print(f"{'edges':>9} {'build s':>8} {'ego ms':>7} {'ego nodes':>10} {'ego layout ms':>14} {'old rebuild s':>14}")
+    for n in args.edges:
+        edges = list(synthetic(n))
+        start = time.perf_counter()
+        graph = MentionGraph()
+        for source, target in edges:
+            graph.add(source, target)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ego = graph.ego('user50', args.hops, args.max_nodes)
+        query = (time.perf_counter() - start) * 1000
+        G = nx.DiGraph()
+        G.add_weighted_edges_from(ego)
+        start = time.perf_counter()
+        nx.spring_layout(G, iterations=1000)
+        layout = (time.perf_counter() - start) * 1000
+
+        old = '-'
+        if n <= args.old_up_to:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'network_data.csv')
+                with open(path, 'w') as f:
+                    f.write('message_id\tmessage_author_id\tmessage_author_name\tmessage_content\tmessage_timestamp\tmessage_mentions\tcount\t\n')
+                    for i, (source, target) in enumerate(edges):
+                        f.write(f'{i}\t{i}\t{source}\thi\t2022-03-08 00:00:00\t{target}\t1\t\n')
+                start = time.perf_counter()
+                old_rebuild(path)
+                old = f'{time.perf_counter() - start:.2f}'
+        print(f"{n:>9} {build:>8.2f} {query:>7.2f} {G.number_of_nodes():>10} {layout:>14.1f} {old:>14}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edges', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--hops', type=int, default=2)
+    parser.add_argument('--max-nodes', type=int, default=50)
+    parser.add_argument('--old-up-to', type=int, default=1000000)
+    main(parser.parse_args())
@@ -0,0 +1,77 @@
+# bench_message_store.py
+# Sustained messages/sec written to disk: the old per-message open/write/close path against
+# MessageStore's batched background writer, under each fsync policy.
+#
+#   python benchmarks/bench_message_store.py --messages 20000
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_store import MessageStore, read_rows, FSYNC_NONE, FSYNC_BATCH, FSYNC_SECOND
+
+
+def make_messages(n):
+    users = [SimpleNamespace(id=800000000000000000 + i, name=f'user{i}') for i in range(50)]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [SimpleNamespace(id=900000000000000000 + i, author=users[i % 50], created_at=now,
+                            content=f'message {i}\twith a tab' if i % 10 == 0 else f'message {i}',
+                            mentions=[users[(i + 1) % 50]] if i % 4 == 0 else [])
+            for i in range(n)]
+
+
+def old_path(messages, directory):
+    # What handle_channel_message used to do for every message, on the event loop thread
+    for message in messages:
+        f = open(os.path.join(directory, 'time_data.csv'), 'a+', newline='')
+        row = [str(message.id), str(message.author.id), message.author.name, message.content, str(message.created_at), str([m.name for m in message.mentions]), "1"]
+        for el in row:
+            f.write(el + '\t')
+        f.write('\n')
+        f.close()
+        write_obj = open(os.path.join(directory, 'network_data.csv'), 'a+', newline='')
+        for m in message.mentions:
+            row = [str(message.id), str(message.author.id), message.author.name, message.content, str(message.created_at), str(m.name), "1"]
+            for el in row:
+                write_obj.write(el + '\t')
+            write_obj.write('\n')
+        write_obj.close()
+
+
+async def store_path(messages, directory, fsync):
+    store = MessageStore(os.path.join(directory, 'time_data.csv'), os.path.join(directory, 'network_data.csv'),
+                         os.path.join(directory, 'revisions.csv'), fsync=fsync)
+    for i, message in enumerate(messages):
+        store.record(message)
+        if i % 100 == 0:
+            # let the background writer run, as it would between gateway events
+            await asyncio.sleep(0)
+    await store.close()
+
+
+def main(args):
+    messages = make_messages(args.messages)
+    print(f"{args.messages} messages")
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        old_path(messages, directory)
+        print(f"{'per-message open/close':>28}: {args.messages / (time.perf_counter() - start):>10.0f} msg/s")
+    for fsync in (FSYNC_NONE, FSYNC_SECOND, FSYNC_BATCH):
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            asyncio.run(store_path(messages, directory, fsync))
+            rate = args.messages / (time.perf_counter() - start)
+            rows = sum(1 for _ in read_rows(os.path.join(directory, 'time_data.csv')))
+            assert rows == args.messages, rows
+            print(f"{'MessageStore fsync=' + fsync:>28}: {rate:>10.0f} msg/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=20000)
+    main(parser.parse_args())
@@ -0,0 +1,84 @@
+# bench_normalize.py
+# Per-message CPU and wall time of text normalization, before and after the single-pass pipeline.
+# "before" is what the bot used to do for a guild message: uni2ascii + a new GoogleTranslator +
+# translate, once in on_message and again in handle_channel_message. The translate request itself
+# is replaced by a fixed sleep so the benchmark doesn't depend on Google being reachable.
+#
+#   python benchmarks/bench_normalize.py --rtt 0.05 --passes 3
+import argparse
+import asyncio
+import os
+import sys
+import time
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from deep_translator import GoogleTranslator
+from uni2ascii import uni2ascii
+from normalize import Normalizer
+
+
+class LatencyTranslator:
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.calls = 0
+
+    def translate(self, text):
+        self.calls += 1
+        time.sleep(self.rtt)
+        return text
+
+
+def load_texts(path):
+    with open(path) as f:
+        next(f) # header
+        return [row[3] for row in (line.split('\t') for line in f) if len(row) > 3]
+
+
+class Message:
+    def __init__(self, content):
+        self.content = content
+
+
+def before(texts, rtt):
+    fake = LatencyTranslator(rtt)
+    for text in texts:
+        content = text
+        for _ in range(2):
+            content = uni2ascii(content)
+            GoogleTranslator(source='auto', target='en')
+            content = fake.translate(content)
+    return fake.calls
+
+
+async def after(texts, rtt):
+    fake = LatencyTranslator(rtt)
+    normalizer = Normalizer(translator=fake)
+    for text in texts:
+        await normalizer.normalize(Message(text))
+    return fake.calls
+
+
+def measure(fn):
+    wall, cpu = time.perf_counter(), time.process_time()
+    calls = fn()
+    return time.perf_counter() - wall, time.process_time() - cpu, calls
+
+
+def main(args):
+    texts = load_texts(args.data) * args.passes
+    n = len(texts)
+    print(f"{n} messages, simulated translate round trip {args.rtt * 1000:.0f}ms")
+    print(f"{'':>7} {'wall ms/msg':>12} {'cpu us/msg':>11} {'translate calls':>16}")
+    for name, fn in (('before', lambda: before(texts, args.rtt)),
+                     ('after', lambda: asyncio.run(after(texts, args.rtt)))):
+        wall, cpu, calls = measure(fn)
+        print(f"{name:>7} {wall / n * 1000:>12.2f} {cpu / n * 1e6:>11.1f} {calls:>16}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', default=os.path.join(BOT_DIR, 'time_data.csv'))
+    parser.add_argument('--passes', type=int, default=3)
+    parser.add_argument('--rtt', type=float, default=0.05)
+    main(parser.parse_args())
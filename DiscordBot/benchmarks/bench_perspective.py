@@ -0,0 +1,90 @@
+# bench_perspective.py
+# Messages/sec through PerspectiveClient against a local stub server at 1, 10 and 100 concurrent channels.
+# The blocking `requests.post` path the bot used before is shown for comparison: it serialises every
+# channel behind one event loop, so its throughput does not grow with the number of channels.
+#
+#   python benchmarks/bench_perspective.py --latency 0.02 --messages 500
+import argparse
+import asyncio
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from perspective import PerspectiveClient, REQUESTED_ATTRIBUTES
+from stub_perspective import StubPerspective
+
+
+async def run_async(url, channels, messages):
+    client = PerspectiveClient('stub-key', url=url, max_concurrency=channels)
+
+    async def channel(n):
+        for i in range(messages // channels):
+            await client.analyze(f'channel {n} message {i}')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(channel(n) for n in range(channels)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return (messages // channels) * channels / elapsed
+
+
+async def run_blocking(url, channels, messages):
+    data = '{"comment": {"text": "%s"}, "requestedAttributes": {%s}}'
+    attrs = ', '.join(f'"{a}": {{}}' for a in REQUESTED_ATTRIBUTES)
+
+    async def channel(n):
+        for i in range(messages // channels):
+            # The old eval_text: a synchronous call made directly on the event loop
+            requests.post(url + '?key=stub-key', data=data % (f'channel {n} message {i}', attrs)).json()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(channel(n) for n in range(channels)))
+    return (messages // channels) * channels / (time.perf_counter() - start)
+
+
+async def main(args):
+    stub = await StubPerspective(latency=args.latency, error_rate=args.error_rate).start()
+    # requests blocks the loop, so the stub has to run on its own loop in a thread for the baseline
+    print(f"stub latency {args.latency * 1000:.0f}ms, {args.messages} messages per run")
+    print(f"{'channels':>8} {'async msg/s':>12}")
+    for channels in (1, 10, 100):
+        rate = await run_async(stub.url, channels, args.messages)
+        print(f"{channels:>8} {rate:>12.1f}")
+    await stub.stop()
+
+    if not args.skip_blocking:
+        blocking = await blocking_baseline(args)
+        print(f"blocking requests.post baseline (any channel count): {blocking:.1f} msg/s")
+
+
+async def blocking_baseline(args):
+    ready = asyncio.get_running_loop().create_future()
+    done = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def serve():
+        async def _serve():
+            stub = await StubPerspective(latency=args.latency).start()
+            loop.call_soon_threadsafe(ready.set_result, stub.url)
+            while not done.is_set():
+                await asyncio.sleep(0.05)
+            await stub.stop()
+        asyncio.run(_serve())
+
+    thread = loop.run_in_executor(None, serve)
+    url = await ready
+    rate = await run_blocking(url, 10, min(args.messages, 100))
+    done.set()
+    await thread
+    return rate
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.02, help='stub response latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of stub responses that are 503')
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--skip-blocking', action='store_true')
+    asyncio.run(main(parser.parse_args()))
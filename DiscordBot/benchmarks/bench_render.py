@@ -0,0 +1,80 @@
+# bench_render.py
+# Load test for the render service: many moderators react ✅ at once, each reaction renders the
+# time plot, network graph and frequency table. Reports reaction latency and the worst event-loop
+# stall, against drawing the same images directly on the event loop as the bot used to.
+#
+#   python benchmarks/bench_render.py --reactions 20 --workers 4
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render import RenderService, render_time_plot, render_network_graph, render_freq_table
+from scheduler import percentile
+
+
+def jobs(i):
+    random.seed(i)
+    start = datetime.datetime(2022, 3, 8, tzinfo=datetime.timezone.utc)
+    counts = [(start + datetime.timedelta(hours=h), random.randint(1, 20)) for h in range(48)]
+    edges = [(f'user{random.randint(0, 40)}', f'user{random.randint(0, 40)}', random.randint(1, 5)) for _ in range(80)]
+    table = {'buy cheap followers': {f'user{a}': random.randint(1, 9) for a in range(6)}}
+    return [
+        (render_time_plot, (counts, 1 / 24, f"User user{i}'s messages over time")),
+        (render_network_graph, (edges, 'user0', f"User user{i}'s network")),
+        (render_freq_table, (table,)),
+    ]
+
+
+async def watch_loop(stop, lags):
+    # How late a 10ms timer fires is how long the event loop was blocked
+    while not stop.is_set():
+        before = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - before - 0.01)
+
+
+async def run(args, use_pool):
+    service = RenderService(args.workers, args.timeout)
+    if use_pool:
+        # warm the workers so process start-up isn't counted against the first reaction
+        await asyncio.gather(*(service.render(job, *job_args) for job, job_args in jobs(-1)))
+
+    async def reaction(i):
+        start = time.perf_counter()
+        if use_pool:
+            images = await asyncio.gather(*(service.render(job, *job_args) for job, job_args in jobs(i)))
+        else:
+            images = [job(*job_args) for job, job_args in jobs(i)]
+        assert all(png.startswith(b'\x89PNG') for png in images)
+        return time.perf_counter() - start
+
+    stop, lags = asyncio.Event(), []
+    watcher = asyncio.create_task(watch_loop(stop, lags))
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(reaction(i) for i in range(args.reactions)))
+    total = time.perf_counter() - start
+    stop.set()
+    await watcher
+    service.close()
+    return total, latencies, max(lags, default=0.0)
+
+
+def main(args):
+    print(f"{args.reactions} simultaneous ✅ reactions, 3 images each")
+    print(f"{'':>16} {'total s':>8} {'p50 s':>6} {'p99 s':>6} {'max loop stall ms':>18}")
+    for name, use_pool in (('on event loop', False), (f'pool x{args.workers}', True)):
+        total, latencies, stall = asyncio.run(run(args, use_pool))
+        print(f"{name:>16} {total:>8.2f} {percentile(latencies, 50):>6.2f} {percentile(latencies, 99):>6.2f} {stall * 1000:>18.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reactions', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    main(parser.parse_args())
@@ -0,0 +1,118 @@
+# bench_retention.py
+# Analysis latency over months of simulated traffic, with the history kept whole and with a
+# retention window and rollups. After each simulated month both histories are loaded cold, as
+# on a restart, and queried the way the moderator analytics do:
+#   - load: the author index and mention graph the bot starts with
+#   - time plot: the busiest author's histogram, and the evidence summary
+#   - network: the busiest author's neighbourhood in the mention graph
+#   - content: building the near-duplicate index, then looking up a copied text
+#
+#   python benchmarks/bench_retention.py --months 6 --per-day 5000
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar import HistoryReader, HistoryWriter, read_names, read_segments
+from fingerprint import ContentIndex
+from history import HistoryIndex
+from mention_graph import load_mention_graph
+from retention import Compactor, read_content, read_hourly
+
+
+AUTHORS = 5000
+TEXTS = 20000
+START = 1640995200.0 # 2022-01-01
+DAY = 24 * 60 * 60
+
+
+def traffic(args):
+    rng = random.Random(1)
+    words = ('the game last night was great and i think we should play again tomorrow after class '
+             'did anyone finish the homework yet it was harder than i expected honestly').split()
+    # most messages repeat a text someone has posted before, like copy-pasta and common replies
+    texts = args.texts = [' '.join(rng.choice(words) for _ in range(rng.randint(3, 20))) for _ in range(TEXTS)]
+    t = START
+    for i in range(args.months * 30 * args.per_day):
+        t += rng.expovariate(args.per_day / DAY)
+        author = int(AUTHORS * rng.random() ** 3)
+        mentions = [f'user{int(AUTHORS * rng.random() ** 3)}'] if rng.random() < 0.1 else []
+        yield (10 ** 17 + i, 10 ** 17 + author, f'user{author}', texts[int(TEXTS * rng.random() ** 4)],
+               round(t * 1e6), mentions)
+
+
+def size_mb(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names) / 1e6
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def analyse(history_path, rollup_path, now, text):
+    times = {}
+    times['load'], (index, graph) = timed(lambda: (
+        HistoryIndex().load_segments(read_segments(history_path, ['author_id', 'timestamp']))
+                      .load_rollups(read_hourly(rollup_path)),
+        load_mention_graph(None, history_path, rollup_path)))
+    busiest = 10 ** 17
+    times['time plot'], histogram = timed(lambda: (index.histogram(busiest, index.pick_bucket(busiest)),
+                                                   index.summary(busiest, now))[0])
+    times['network'], edges = timed(lambda: graph.ego('user0'))
+    times['content build'], content = timed(lambda: ContentIndex().load_rollups(read_content(rollup_path, read_names(history_path)))
+                                            .load_messages(HistoryReader(history_path).messages()))
+    times['content lookup'], copies = timed(lambda: content.author_counts(text, 0.8))
+    return times, (index.histogram(busiest, 'day'), graph.out_edges, copies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--months', type=int, default=6)
+    parser.add_argument('--per-day', type=int, default=5000)
+    parser.add_argument('--retention-days', type=int, default=30)
+    args = parser.parse_args()
+    import numpy # loaded by the content index; not part of any one measurement
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {name: (os.path.join(directory, name, 'history'), os.path.join(directory, name, 'rollups'))
+                 for name in ['whole', 'retained']}
+        writers = {name: HistoryWriter(history_path, segment_seconds=DAY) for name, (history_path, _) in paths.items()}
+        compactor = Compactor(*paths['retained'], args.retention_days * DAY)
+        stream = traffic(args)
+        batch = []
+        month_end = START + 30 * DAY
+        print(f"{args.per_day} messages a day, {args.retention_days} days of raw messages kept")
+        print(f"{'month':>5} {'MB on disk':>16} " +
+              ' '.join(f'{stage:>22}' for stage in ['load s', 'time plot ms', 'network ms', 'content build s',
+                                                     'content lookup ms']))
+        for month in range(1, args.months + 1):
+            for message in stream:
+                batch.append(message)
+                if len(batch) >= 10000 or message[4] >= month_end * 1e6:
+                    for writer in writers.values():
+                        writer.append(batch)
+                    batch = []
+                if message[4] >= month_end * 1e6:
+                    break
+            asyncio.run(compactor.run_once(month_end))
+            results = {name: analyse(history_path, rollup_path, month_end, args.texts[0])
+                       for name, (history_path, rollup_path) in paths.items()}
+            # the rollups answer the same as the whole history
+            assert results['whole'][1] == results['retained'][1]
+            sizes = [size_mb(os.path.join(directory, name)) for name in ['whole', 'retained']]
+            scale = {'load': 1, 'time plot': 1000, 'network': 1000, 'content build': 1, 'content lookup': 1000}
+            print(f"{month:>5} {sizes[0]:>6.1f} -> {sizes[1]:>6.1f} " +
+                  ' '.join(f"{results['whole'][0][stage] * scale[stage]:>10.2f} -> {results['retained'][0][stage] * scale[stage]:>7.2f}"
+                           for stage in scale))
+            month_end += 30 * DAY
+        for writer in writers.values():
+            writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# bench_scheduler.py
+# Replays bursty channel traffic through ScoringScheduler against the stub Perspective server and
+# reports Perspective calls made, queue depth and p50/p99 enqueue-to-verdict time.
+#
+#   python benchmarks/bench_scheduler.py --messages 400 --qps 50 --duplicates 0.3
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perspective import PerspectiveClient
+from scheduler import ScoringScheduler
+from stub_perspective import StubPerspective
+
+
+async def main(args):
+    stub = await StubPerspective(latency=args.latency).start()
+    client = PerspectiveClient('stub-key', url=stub.url)
+    scheduler = ScoringScheduler(client.analyze, window=args.window, max_batch=args.max_batch, qps=args.qps)
+    random.seed(0)
+    max_depth = 0
+
+    async def message(i):
+        nonlocal max_depth
+        # Spam waves repeat the same few texts
+        text = f'spam wave {i % 5}' if random.random() < args.duplicates else f'message {i}'
+        await asyncio.sleep(random.random() * args.spread)
+        result = scheduler.submit(text)
+        max_depth = max(max_depth, scheduler.queue_depth() + 1)
+        await result
+
+    start = time.perf_counter()
+    await asyncio.gather(*(message(i) for i in range(args.messages)))
+    elapsed = time.perf_counter() - start
+
+    stats = scheduler.stats()
+    print(f"{args.messages} messages over {elapsed:.2f}s ({args.messages / elapsed:.1f} msg/s)")
+    print(f"perspective calls: {stats['perspective_calls']} (unbatched would be {args.messages})")
+    print(f"batches: {stats['batches']}, max queue depth: {max_depth}")
+    print(f"rate limiter wait: {stats['rate_limit_wait_s']}s")
+    print(f"enqueue -> verdict p50 {stats['p50_ms']}ms, p99 {stats['p99_ms']}ms")
+
+    await scheduler.close()
+    await client.close()
+    await stub.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=400)
+    parser.add_argument('--spread', type=float, default=2.0, help='seconds over which messages arrive')
+    parser.add_argument('--duplicates', type=float, default=0.3, help='fraction of messages that repeat a spam text')
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--window', type=float, default=0.05)
+    parser.add_argument('--max-batch', type=int, default=20)
+    parser.add_argument('--qps', type=float, default=200)
+    asyncio.run(main(parser.parse_args()))
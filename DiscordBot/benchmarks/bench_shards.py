@@ -0,0 +1,110 @@
+# bench_shards.py
+# Runs ShardedModBot against a local fake gateway: one guild per shard, each sending messages to
+# its group channel at a fixed rate. Guild 0 sends long messages, so with analysis
+# done inline its CPU work delays every other shard; with analysis workers it mostly doesn't.
+# Perspective is replaced by deterministic local scores and nothing touches the network.
+#
+#   python benchmarks/bench_shards.py --shards 4 --messages 300 --rate 50 --workers 0 2 4
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from perspective import REQUESTED_ATTRIBUTES
+from scheduler import ScoringScheduler
+from stub_perspective import fake_scores
+from fake_discord import Guild, Message, StubTranslator, User, connect, ids
+
+GROUP = '0'
+
+
+class FakeGateway:
+    '''
+    Delivers MESSAGE_CREATE events for one guild per shard, each shard from its own task, the way
+    discord.py's shard connections feed a single AutoShardedClient.
+    '''
+
+    def __init__(self, client, shard_count, messages, rate, heavy_length):
+        self.client = client
+        self.guilds = [Guild(GROUP, shard_id) for shard_id in range(shard_count)]
+        self.messages = messages
+        self.rate = rate
+        self.heavy_length = heavy_length
+
+    async def connect(self):
+        await connect(self.client, self.guilds, GROUP)
+
+    async def shard(self, guild):
+        authors = [User(next(ids), f'user{guild.shard_id}_{i}') for i in range(20)]
+        for i in range(self.messages):
+            text = f"message {i} in shard {guild.shard_id} with some ordinary words in it"
+            if guild.shard_id == 0:
+                text = (text + ' ') * (self.heavy_length // len(text))
+            # dispatch runs each event handler as its own task, like a real gateway event
+            self.client.dispatch('message', Message(guild, authors[i % len(authors)], text))
+            await asyncio.sleep(1 / self.rate)
+
+    async def run(self):
+        await asyncio.gather(*(self.shard(guild) for guild in self.guilds))
+        total = self.messages * len(self.guilds)
+        while sum(stats['messages'] for stats in self.client.shard_stats.stats().values()) < total:
+            await asyncio.sleep(0.05)
+
+
+async def fake_analyze(text):
+    await asyncio.sleep(0.005)
+    return fake_scores(text, REQUESTED_ATTRIBUTES)
+
+
+async def run(shard_count, messages, rate, workers, heavy_length):
+    from bot import ShardedModBot
+    client = ShardedModBot('unused', analysis_workers=workers, shard_count=shard_count,
+                           shard_ids=list(range(shard_count)))
+    client.normalizer.translator = StubTranslator()
+    client.scheduler = ScoringScheduler(fake_analyze, qps=10000)
+    gateway = FakeGateway(client, shard_count, messages, rate, heavy_length)
+    await gateway.connect()
+    if workers:
+        # start the workers before timing, as they would be by the time messages arrive
+        await client.analyzer.normalize(Message(gateway.guilds[0], User(2, 'warmup'), 'warm up'))
+        client.shard_stats.shards.clear()
+    client.shard_stats.started = time.monotonic()
+    await gateway.run()
+    shards = client.shard_stats.stats()
+    worker_stats = client.analyzer.stats()['workers'] if workers else {}
+    await client.close()
+    return shards, worker_stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--rate', type=float, default=50, help="messages per second per shard")
+    parser.add_argument('--heavy-length', type=int, default=20000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4])
+    args = parser.parse_args()
+
+    lexicon = os.path.join(BOT_DIR, 'prefilter_lexicon.json')
+    for workers in args.workers:
+        # the bot keeps its data files in the working directory
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copy(lexicon, directory)
+            os.chdir(directory)
+            shards, worker_stats = asyncio.run(run(args.shards, args.messages, args.rate, workers, args.heavy_length))
+        print(f"analysis workers: {workers}")
+        for shard_id, stats in shards.items():
+            label = 'heavy' if shard_id == 0 else 'light'
+            print(f"  shard {shard_id} ({label}): {stats['msg_per_s']:8.1f} msg/s  "
+                  f"p50 {stats['p50_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms")
+        for pid, stats in worker_stats.items():
+            print(f"  worker {pid}: {stats['jobs']} jobs, {stats['cpu_s']} CPU s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# bench_startup.py
+# Startup cost of the bot, in a fresh interpreter each time:
+#   - a `python -X importtime` report of `import bot`, summed per top-level package
+#   - time to ready: importing bot and constructing ModBot against the history files in this
+#     directory, i.e. everything before the gateway connection, checked against a target
+#   - which heavy analytics dependencies were loaded by then (none should be; numpy comes in with
+#     the near-duplicate index, built in the background once the bot is connected)
+#
+#   python benchmarks/bench_startup.py --runs 5 --target 1.0
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['pandas', 'matplotlib', 'networkx', 'dataframe_image', 'deep_translator', 'numpy']
+DATA_FILES = ['time_data.csv', 'network_data.csv', 'prefilter_lexicon.json']
+
+READY_SNIPPET = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {bot_dir!r})
+import bot
+imported = time.perf_counter()
+client = bot.ModBot('unused')
+ready = time.perf_counter()
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'import_s': imported - start, 'ready_s': ready - start, 'heavy': heavy}}))
+'''
+
+
+def import_report(top):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import bot'],
+                            cwd=BOT_DIR, capture_output=True, text=True, check=True)
+    packages = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        if name == 'bot':
+            total = int(cumulative_us)
+    print(f"import bot: {total / 1000:.0f} ms cumulative; slowest packages by self time:")
+    for package, us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:24s} {us / 1000:7.1f} ms")
+
+
+def time_to_ready(runs):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in DATA_FILES:
+            if os.path.isfile(os.path.join(BOT_DIR, name)):
+                shutil.copy(os.path.join(BOT_DIR, name), directory)
+        snippet = READY_SNIPPET.format(bot_dir=BOT_DIR, heavy=HEAVY_MODULES)
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, '-c', snippet], cwd=directory,
+                                    capture_output=True, text=True, check=True)
+            results.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--target', type=float, default=1.0, help="time-to-ready target in seconds")
+    args = parser.parse_args()
+
+    import_report(args.top)
+    results = time_to_ready(args.runs)
+    ready = sorted(r['ready_s'] for r in results)
+    imported = sorted(r['import_s'] for r in results)
+    median = ready[len(ready) // 2]
+    print(f"time to ready over {args.runs} runs: median {median:.3f} s "
+          f"(import {imported[len(imported) // 2]:.3f} s), target {args.target:.1f} s: "
+          f"{'ok' if median <= args.target else 'MISSED'}")
+    heavy = sorted(set(name for r in results for name in r['heavy']))
+    print(f"heavy modules loaded before the bot connects: {', '.join(heavy) or 'none'}")
+    if median > args.target:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
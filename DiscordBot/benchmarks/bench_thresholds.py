@@ -0,0 +1,61 @@
+# bench_thresholds.py
+# Cost of deciding which attributes to flag: the old per-attribute dict loop in eval_text, a
+# guild's policy applied to one score vector at a time (the bot's hot path), and the same policy
+# applied to a whole batch of logged vectors with NumPy (offline re-tuning).
+#
+#   python benchmarks/bench_thresholds.py --vectors 1000000
+import argparse
+import os
+import random
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perspective import PERSPECTIVE_SCORE_THRESHOLD_BY_ATTR
+from thresholds import ATTRIBUTES, ThresholdEngine, to_vector
+
+
+def old_flagged(response_scores):
+    scores = {}
+    flagged_scores = {}
+    for attr, score in response_scores.items():
+        scores[attr] = score
+        if score >= PERSPECTIVE_SCORE_THRESHOLD_BY_ATTR[attr]:
+            flagged_scores[attr] = score
+    return scores, flagged_scores
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vectors', type=int, default=1000000)
+    parser.add_argument('--per-message', type=int, default=200000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    results = [{attr: rng.random() ** 4 for attr in ATTRIBUTES} for _ in range(args.per_message)]
+    engine = ThresholdEngine()
+
+    start = time.perf_counter()
+    old = [old_flagged(scores)[1] for scores in results]
+    elapsed = time.perf_counter() - start
+    print(f"dict loop: {elapsed / len(results) * 1e6:.2f} us per message")
+
+    start = time.perf_counter()
+    new = [engine.evaluate(scores, 1, 2)[1] for scores in results]
+    elapsed = time.perf_counter() - start
+    assert old == new
+    print(f"policy per vector: {elapsed / len(results) * 1e6:.2f} us per message")
+
+    import numpy as np
+    matrix = np.random.default_rng(1).random((args.vectors, len(ATTRIBUTES))) ** 4
+    policy = engine.policy(1, 2)
+    start = time.perf_counter()
+    over, flagged = policy.evaluate_many(matrix)
+    elapsed = time.perf_counter() - start
+    sample = [policy.evaluate(to_vector(dict(zip(ATTRIBUTES, row)))) != {} for row in matrix[:10000].tolist()]
+    assert sample == flagged[:10000].tolist()
+    print(f"policy over a batch of {args.vectors}: {elapsed * 1000:.0f} ms, "
+          f"{elapsed / args.vectors * 1e9:.0f} ns per vector, {int(flagged.sum())} flagged")
+
+
+if __name__ == '__main__':
+    main()
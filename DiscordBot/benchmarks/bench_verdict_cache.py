@@ -0,0 +1,51 @@
+# bench_verdict_cache.py
+# Replays the message texts in time_data.csv through VerdictCache in front of a simulated
+# Perspective call and reports the hit rate and the scoring latency saved.
+#
+#   python benchmarks/bench_verdict_cache.py --passes 3 --rtt 0.15
+import argparse
+import os
+import sys
+import time
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from perspective import REQUESTED_ATTRIBUTES
+from stub_perspective import fake_scores
+from verdict_cache import VerdictCache
+
+
+def load_texts(path):
+    with open(path) as f:
+        next(f) # header
+        return [row[3] for row in (line.split('\t') for line in f) if len(row) > 3]
+
+
+def main(args):
+    texts = load_texts(args.data)
+    cache = VerdictCache(args.size)
+    lookup_time = 0.0
+    for _ in range(args.passes):
+        for text in texts:
+            start = time.perf_counter()
+            scores = cache.get(text)
+            lookup_time += time.perf_counter() - start
+            if scores is None:
+                cache.put(text, fake_scores(text, REQUESTED_ATTRIBUTES))
+
+    stats = cache.stats()
+    lookups = stats['hits'] + stats['misses']
+    print(f"{lookups} messages ({len(texts)} rows x {args.passes} passes), {stats['size']} distinct texts")
+    print(f"hits {stats['hits']}, misses {stats['misses']}, hit rate {stats['hit_rate']:.1%}")
+    print(f"mean cache lookup {lookup_time / lookups * 1e6:.1f}us")
+    print(f"Perspective time saved at {args.rtt * 1000:.0f}ms per call: {stats['hits'] * args.rtt:.1f}s "
+          f"({stats['hits'] * args.rtt / lookups * 1000:.1f}ms per message)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', default=os.path.join(BOT_DIR, 'time_data.csv'))
+    parser.add_argument('--passes', type=int, default=1, help='replay the file this many times (simulates a restart with a persisted cache)')
+    parser.add_argument('--rtt', type=float, default=0.15, help='assumed Perspective round trip in seconds')
+    parser.add_argument('--size', type=int, default=50000)
+    main(parser.parse_args())
@@ -0,0 +1,61 @@
+# eval_prefilter.py
+# Replays a labeled score log (the bot's scores_log.jsonl: one {"text", "scores"} object per line)
+# through the pre-filter and compares the tiered verdict with Perspective alone.
+#
+#   python benchmarks/eval_prefilter.py scores_log.jsonl --train-fraction 0.7
+#   python benchmarks/eval_prefilter.py scores_log.jsonl --model prefilter_model.json
+import argparse
+import os
+import random
+import sys
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from prefilter import PreFilter, HashedLinearModel, load_scores_log, is_flagged, CLEAN, BAD, UNCERTAIN
+
+
+def main(args):
+    rows = load_scores_log(args.log)
+    random.seed(0)
+    random.shuffle(rows)
+    model = None
+    if args.model:
+        model = HashedLinearModel.load(args.model)
+        test = rows
+    elif args.train_fraction:
+        split = int(len(rows) * args.train_fraction)
+        model = HashedLinearModel().train((r['text'], int(is_flagged(r['scores']))) for r in rows[:split])
+        test = rows[split:]
+    else:
+        test = rows
+
+    prefilter = PreFilter.from_files(args.lexicon, None, clean_below=args.clean_below, bad_above=args.bad_above)
+    prefilter.model = model
+
+    missed = false_alarms = 0
+    for row in test:
+        verdict, _ = prefilter.classify(row['text'])
+        flagged = is_flagged(row['scores'])
+        if verdict == CLEAN and flagged:
+            missed += 1
+        elif verdict == BAD and not flagged:
+            false_alarms += 1
+
+    stats = prefilter.stats()
+    n = len(test)
+    print(f"{n} labeled messages ({sum(is_flagged(r['scores']) for r in test)} flagged by Perspective)")
+    print(f"clean {stats[CLEAN]}, bad {stats[BAD]}, uncertain {stats[UNCERTAIN]}")
+    print(f"remote calls avoided: {n - stats[UNCERTAIN]} ({stats['remote_avoided']:.1%})")
+    print(f"disagreements with Perspective-only: {missed + false_alarms} ({(missed + false_alarms) / n:.2%}) "
+          f"- {missed} flagged messages passed as clean, {false_alarms} clean messages flagged")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('log', help='labeled replay set in scores_log.jsonl format')
+    parser.add_argument('--model', help='a trained prefilter_model.json; otherwise one is trained on --train-fraction')
+    parser.add_argument('--train-fraction', type=float, default=0.0)
+    parser.add_argument('--lexicon', default=os.path.join(BOT_DIR, 'prefilter_lexicon.json'))
+    parser.add_argument('--clean-below', type=float, default=0.05)
+    parser.add_argument('--bad-above', type=float, default=0.97)
+    main(parser.parse_args())
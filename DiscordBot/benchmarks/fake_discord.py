@@ -0,0 +1,90 @@
+# fake_discord.py
+# Just enough of discord.py's User/Guild/Channel/Message for ModBot to handle messages offline,
+# plus a translator stand-in. Used by the replay harness and the shard benchmark.
+import asyncio
+import itertools
+import random
+import time
+from datetime import datetime, timezone
+
+ids = itertools.count(1000000)
+
+
+class StubTranslator:
+    '''
+    Returns the text unchanged after `latency` seconds, failing `error_rate` of the time.
+    '''
+
+    def __init__(self, latency=0.0, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+
+    def translate(self, text):
+        # called from a worker thread, like the real translator
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise ConnectionError("stub translator error")
+        return text
+
+
+class User:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class Post:
+    def __init__(self):
+        self.id = next(ids)
+
+
+class Channel:
+    def __init__(self, guild, name, send_latency=0.0):
+        self.id = next(ids)
+        self.guild = guild
+        self.name = name
+        self.send_latency = send_latency
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.sent += 1
+        return Post()
+
+
+class Guild:
+    def __init__(self, group, shard_id=0, send_latency=0.0):
+        self.id = next(ids)
+        self.shard_id = shard_id
+        self.channel = Channel(self, f'group-{group}')
+        self.mod_channel = Channel(self, f'group-{group}-mod', send_latency)
+
+
+class Message:
+    def __init__(self, guild, author, content, mentions=(), created_at=None):
+        self.id = next(ids)
+        self.guild = guild
+        self.channel = guild.channel
+        self.author = author
+        self.content = content
+        self.mentions = list(mentions)
+        self.created_at = created_at or datetime.now(timezone.utc)
+        self.edited_at = None
+
+
+async def connect(client, guilds, group):
+    '''
+    Sets up `client` as if it had logged in and seen `guilds` in on_ready.
+    '''
+    # what login() does before the gateway connects
+    await client._async_setup_hook()
+    client._connection.user = User(1, f'Group {group} Bot')
+    client.group_num = group
+    client.mod_channels = {guild.id: guild.mod_channel for guild in guilds}
+    client.mod_channel_ids = {guild.mod_channel.id for guild in guilds}
+    client.general_channel = guilds[0].channel
+    client.general_channel_ids = {guild.channel.id for guild in guilds}
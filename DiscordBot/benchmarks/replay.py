@@ -0,0 +1,347 @@
+# replay.py
+# Offline replay of channel traffic through the whole ModBot pipeline: on_message, normalization,
+# recording, eval_text and the mod-channel post. Discord is replaced by the objects in
+# fake_discord.py, Perspective by the local stub server and the translator by StubTranslator, each
+# with configurable latency and error rate. Traffic comes from a file in the time_data.csv format
+# or from a synthetic generator.
+#
+# Reports messages/sec, a latency histogram per stage, event-loop lag and memory, and can save
+# the summary as a baseline or compare against one and exit 1 on a regression.
+#
+#   python benchmarks/replay.py --synthetic 5000
+#   python benchmarks/replay.py --traffic time_data.csv --loops 20
+#   python benchmarks/replay.py --synthetic 5000 --save-baseline benchmarks/baselines/replay.json
+#   python benchmarks/replay.py --synthetic 5000 --baseline benchmarks/baselines/replay.json
+import argparse
+import ast
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from history import parse_timestamp, to_datetime
+from message_store import read_rows
+from perspective import PerspectiveClient
+from scheduler import ScoringScheduler, percentile
+from stub_perspective import StubPerspective
+from fake_discord import Guild, Message, StubTranslator, User, connect
+
+GROUP = '0'
+# upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf')]
+# (metric, which direction is better) compared against a baseline
+BASELINE_METRICS = [('msg_per_s', 'higher'), ('total_p50_ms', 'lower'), ('total_p99_ms', 'lower'),
+                    ('loop_lag_p99_ms', 'lower'), ('rss_growth_mb', 'lower')]
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def load_traffic(path):
+    '''
+    Reads (author id, author name, content, mention names, timestamp) from a time_data.csv file.
+    '''
+    traffic = []
+    for row in read_rows(path):
+        try:
+            mentions = ast.literal_eval(row['message_mentions'])
+        except (ValueError, SyntaxError):
+            mentions = []
+        traffic.append((int(row['message_author_id']), row['message_author_name'], row['message_content'],
+                        mentions, parse_timestamp(row['message_timestamp'])))
+    return traffic
+
+
+def synthetic_traffic(n, authors=200, seed=1):
+    '''
+    Ordinary chat with some abusive, spammy, foreign-language, emoji-only and mentioning messages
+    mixed in, from authors whose activity follows a long tail.
+    '''
+    rng = random.Random(seed)
+    words = ('the game last night was great and i think we should play again tomorrow after class '
+             'did anyone finish the homework yet it was harder than i expected honestly').split()
+    abuse = ['you are such an idiot', 'shut up loser', 'i will kill you', 'what a pathetic moron']
+    spam = ['free nitro click here discord-gift/xyz', 'claim your prize now at steamcommunity-gift']
+    foreign = ['hola amigos, ¿cómo están todos hoy?', 'je ne sais pas où il est allé', 'das ist wirklich schön']
+    names = [f'user{i}' for i in range(authors)]
+    weights = [1 / (i + 1) for i in range(authors)]
+    start = time.time() - n
+    traffic = []
+    for i in range(n):
+        author = rng.choices(range(authors), weights)[0]
+        roll = rng.random()
+        if roll < 0.05:
+            content = rng.choice(abuse)
+        elif roll < 0.08:
+            content = rng.choice(spam)
+        elif roll < 0.13:
+            content = rng.choice(foreign)
+        elif roll < 0.16:
+            content = '😂😂'
+        else:
+            content = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 20)))
+        mentions = [rng.choice(names)] if rng.random() < 0.1 else []
+        # ids well clear of the fake bot user's
+        traffic.append((1000 + author, names[author], content, mentions, start + i))
+    return traffic
+
+
+class StageTimer:
+    '''
+    Wraps bot methods so every call records its duration under a stage name.
+    '''
+
+    def __init__(self):
+        self.samples = {}
+
+    def wrap(self, obj, attr, stage):
+        fn = getattr(obj, attr)
+        samples = self.samples.setdefault(stage, [])
+        if asyncio.iscoroutinefunction(fn):
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    samples.append(time.perf_counter() - start)
+        else:
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    samples.append(time.perf_counter() - start)
+        setattr(obj, attr, timed)
+
+    def summary(self):
+        result = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ms = [s * 1000 for s in samples]
+            histogram = [0] * len(BUCKETS_MS)
+            for value in ms:
+                histogram[next(i for i, bound in enumerate(BUCKETS_MS) if value <= bound)] += 1
+            result[stage] = {
+                'count': len(ms),
+                'p50_ms': round(percentile(ms, 50), 3),
+                'p90_ms': round(percentile(ms, 90), 3),
+                'p99_ms': round(percentile(ms, 99), 3),
+                'max_ms': round(max(ms), 3),
+                'histogram': histogram,
+            }
+        return result
+
+
+class LoopLag:
+    '''
+    Measures how late a periodic sleep wakes up: time the event loop spent unable to run it.
+    '''
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self.task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self.task.cancel()
+        ms = [s * 1000 for s in self.samples]
+        return {'p50_ms': round(percentile(ms, 50), 3), 'p99_ms': round(percentile(ms, 99), 3),
+                'max_ms': round(max(ms, default=0.0), 3)}
+
+
+def instrument(client, timer):
+    timer.wrap(client, 'on_message', 'total')
+    timer.wrap(client.analyzer, 'normalize', 'normalize')
+    timer.wrap(client.normalizer, 'translate', 'translate')
+    timer.wrap(client.store, 'record', 'store_record')
+    timer.wrap(client, 'eval_text', 'eval_text')
+    timer.wrap(client.perspective, 'analyze', 'perspective')
+    timer.wrap(client, 'send_mod_post', 'mod_post')
+    # the dispatcher holds the unwrapped method
+    client.dispatcher.send = client.send_mod_post
+
+
+async def replay(traffic, args):
+    from bot import ModBot, SCORING_BATCH_WINDOW, SCORING_MAX_BATCH, MOD_COALESCE_WINDOW, MOD_POST_BURST
+    from mod_dispatch import ModDispatcher
+    stub = await StubPerspective(latency=args.perspective_latency, error_rate=args.perspective_errors).start()
+    client = ModBot('stub-key', analysis_workers=args.workers)
+    client.perspective = PerspectiveClient('stub-key', url=stub.url)
+    client.normalizer.translator = StubTranslator(args.translate_latency, args.translate_errors)
+    client.dispatcher = ModDispatcher(client.send_mod_post, window=MOD_COALESCE_WINDOW, rate=args.mod_rate,
+                                      burst=MOD_POST_BURST, metrics=client.metrics)
+    timer = StageTimer()
+    instrument(client, timer)
+    client.scheduler = ScoringScheduler(client.perspective.analyze, window=SCORING_BATCH_WINDOW,
+                                        max_batch=SCORING_MAX_BATCH, qps=args.qps)
+    guild = Guild(GROUP, send_latency=args.send_latency)
+    await connect(client, [guild], GROUP)
+    users = {}
+    errors = {}
+    in_flight = asyncio.Semaphore(args.concurrency)
+
+    async def handle(message):
+        try:
+            await client.on_message(message)
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        finally:
+            in_flight.release()
+
+    lag = LoopLag()
+    lag.start()
+    rss_start = rss_mb()
+    tasks = set()
+    start = time.perf_counter()
+    for i, (author_id, author_name, content, mentions, timestamp) in enumerate(traffic):
+        if author_id not in users:
+            users[author_id] = User(author_id, author_name)
+        mentioned = [users.setdefault(name, User(hash(name), name)) for name in mentions]
+        message = Message(guild, users[author_id], content, mentioned, to_datetime(timestamp))
+        await in_flight.acquire()
+        task = asyncio.create_task(handle(message))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        if args.rate:
+            # hold a steady arrival rate rather than sleeping a fixed gap after each message
+            delay = start + (i + 1) / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    loop_lag = lag.stop()
+    # alerts still waiting out the coalescing window
+    await client.dispatcher.drain()
+    rss_end = rss_mb()
+
+    stages = timer.summary()
+    summary = {
+        'messages': len(traffic),
+        'elapsed_s': round(elapsed, 3),
+        'msg_per_s': round(len(traffic) / elapsed, 1),
+        'total_p50_ms': stages['total']['p50_ms'],
+        'total_p99_ms': stages['total']['p99_ms'],
+        'loop_lag_p50_ms': loop_lag['p50_ms'],
+        'loop_lag_p99_ms': loop_lag['p99_ms'],
+        'loop_lag_max_ms': loop_lag['max_ms'],
+        'rss_start_mb': round(rss_start, 1),
+        'rss_growth_mb': round(rss_end - rss_start, 1),
+        'rss_peak_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 1),
+        'mod_alerts': client.dispatcher.alerts,
+        'mod_posts': guild.mod_channel.sent,
+        'perspective_requests': stub.requests,
+        'errors': errors,
+        'stages': stages,
+    }
+    await client.close()
+    await stub.stop()
+    return summary
+
+
+def print_summary(summary):
+    print(f"{summary['messages']} messages in {summary['elapsed_s']} s: {summary['msg_per_s']} msg/s, "
+          f"{summary.get('mod_alerts', summary['mod_posts'])} mod alerts in {summary['mod_posts']} mod posts, "
+          f"{summary['perspective_requests']} Perspective requests")
+    if summary['errors']:
+        print(f"handler errors: {summary['errors']}")
+    print(f"event loop lag: p50 {summary['loop_lag_p50_ms']} ms, p99 {summary['loop_lag_p99_ms']} ms, "
+          f"max {summary['loop_lag_max_ms']} ms")
+    print(f"memory: {summary['rss_start_mb']} MB at start, +{summary['rss_growth_mb']} MB, "
+          f"peak {summary['rss_peak_mb']} MB")
+    labels = ['<=' + (f'{b:g}' if b != float('inf') else 'inf') for b in BUCKETS_MS]
+    print(f"{'stage':14s} {'count':>7s} {'p50 ms':>9s} {'p90 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+    for stage, s in summary['stages'].items():
+        print(f"{stage:14s} {s['count']:7d} {s['p50_ms']:9.3f} {s['p90_ms']:9.3f} {s['p99_ms']:9.3f} {s['max_ms']:9.3f}")
+        print(' ' * 15 + ' '.join(f"{label}:{count}" for label, count in zip(labels, s['histogram']) if count))
+
+
+def compare(summary, baseline, tolerance):
+    '''
+    Returns a line per metric that is worse than the baseline by more than `tolerance`.
+    '''
+    regressions = []
+    for metric, better in BASELINE_METRICS:
+        old, new = baseline.get(metric), summary.get(metric)
+        if old is None or new is None:
+            continue
+        if better == 'higher':
+            worse = new < old * (1 - tolerance)
+        else:
+            # small absolute values are mostly noise, so allow a floor of 1 (ms or MB)
+            worse = new > max(old * (1 + tolerance), old + 1)
+        if worse:
+            regressions.append(f"{metric}: {old} -> {new}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--traffic', help="replay a file in the time_data.csv format")
+    parser.add_argument('--synthetic', type=int, default=2000, help="number of synthetic messages")
+    parser.add_argument('--loops', type=int, default=1, help="replay the traffic this many times")
+    parser.add_argument('--rate', type=float, default=0, help="arrival rate in msg/s (0: as fast as possible)")
+    parser.add_argument('--concurrency', type=int, default=100, help="messages being handled at once")
+    parser.add_argument('--qps', type=float, default=1000, help="Perspective rate limit")
+    parser.add_argument('--perspective-latency', type=float, default=0.02)
+    parser.add_argument('--perspective-errors', type=float, default=0.0)
+    parser.add_argument('--translate-latency', type=float, default=0.05)
+    parser.add_argument('--translate-errors', type=float, default=0.0)
+    parser.add_argument('--mod-rate', type=float, default=1000, help="mod-channel posts per second")
+    parser.add_argument('--send-latency', type=float, default=0.03, help="mod-channel send latency")
+    parser.add_argument('--workers', type=int, default=0, help="analysis worker processes")
+    parser.add_argument('--save-baseline', help="write the summary to this JSON file")
+    parser.add_argument('--baseline', help="compare against this JSON file and exit 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    traffic = load_traffic(os.path.abspath(args.traffic)) if args.traffic else synthetic_traffic(args.synthetic)
+    traffic = traffic * args.loops
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    # the bot keeps its data files in the working directory
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copy(os.path.join(BOT_DIR, 'prefilter_lexicon.json'), directory)
+        os.chdir(directory)
+        summary = asyncio.run(replay(traffic, args))
+    print_summary(summary)
+
+    if save_path:
+        summary['settings'] = {k: v for k, v in vars(args).items() if k not in ('save_baseline', 'baseline')}
+        with open(save_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"saved baseline to {save_path}")
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# stub_perspective.py
+# A local stand-in for the Perspective comments:analyze endpoint, used by the benchmarks.
+import asyncio
+import hashlib
+import random
+from aiohttp import web
+
+
+def fake_scores(text, attributes):
+    # Deterministic per text so repeated messages score the same
+    digest = hashlib.sha1(text.encode('utf-8')).digest()
+    return {attr: digest[i % len(digest)] / 255 for i, attr in enumerate(attributes)}
+
+
+class StubPerspective:
+    def __init__(self, latency=0.02, error_rate=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.runner = None
+
+    async def analyze(self, request):
+        self.requests += 1
+        body = await request.json()
+        await asyncio.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return web.Response(status=503)
+        attributes = list(body['requestedAttributes'])
+        scores = fake_scores(body['comment']['text'], attributes)
+        return web.json_response({'attributeScores': {
+            attr: {'summaryScore': {'value': value, 'type': 'PROBABILITY'}} for attr, value in scores.items()
+        }})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/v1alpha1/comments:analyze', self.analyze)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/v1alpha1/comments:analyze'
+
+    async def stop(self):
+        await self.runner.cleanup()
@@ -1,61 +1,210 @@
 # bot.py
 import discord
-from discord.ext import commands
 import os
 import json
 import logging
 import re
-import requests
 from report import Report
-from uni2ascii import uni2ascii
+from perspective import PerspectiveClient
+from scheduler import ScoringScheduler
+from verdict_cache import VerdictCache
+from normalize import Normalizer
+from prefilter import PreFilter, CLEAN, BAD
+from message_store import MessageStore
+from columnar import HistoryReader, read_segments, read_names
+from history import HistoryIndex, BUCKET_SECONDS, to_datetime, message_timestamp
+from lru import LRUCache
+from mod_queue import ModQueue, ModCase
+from event_filter import EventFilter
+from edits import EditPipeline
+from analysis import AnalysisPool
+from shards import ShardStats
+from metrics import Metrics
+from lanes import LaneScheduler, MODERATOR, FLAGGED, BULK
+from mod_dispatch import ModDispatcher
+from bursts import BurstDetector, RATE
+from evidence import EvidenceCache
+from thresholds import ThresholdEngine, OutcomeLog, POSTED
+from mention_graph import load_mention_graph
+from retention import Compactor, read_hourly, read_content
+from render import RenderService, render_time_plot, render_network_graph, render_freq_table
+import io
 import time
 import asyncio
-import csv
-import pandas as pd
-from datetime import datetime, timedelta
-from matplotlib import pyplot as plt
-from matplotlib import dates as mpl_dates
-import networkx as nx
-from deep_translator import GoogleTranslator
-import dataframe_image as dfi
-from pandas.plotting import table
-
-
-PERSPECTIVE_SCORE_THRESHOLD = 0.80
-PERSPECTIVE_SCORE_THRESHOLD_BY_ATTR = {
-    'SEVERE_TOXICITY': 0.51, 'PROFANITY': 0.80,
-    'IDENTITY_ATTACK': 0.51, 'THREAT': 0.51,
-    'TOXICITY': 0.70, 'INSULT': 0.70, 'INCOHERENT': 0.9,
-    'SPAM': 0.9,
-}
-# Set up logging to the console
+
+
+# Messages arriving within this many seconds of each other are scored as one batch
+SCORING_BATCH_WINDOW = 0.05
+SCORING_MAX_BATCH = 20
+# Perspective's default quota is 1 query per second; raise this if the project has more
+PERSPECTIVE_QPS = 1
+# Scores for previously seen texts are reused instead of calling Perspective again
+VERDICT_CACHE_PATH = './verdict_cache.json'
+VERDICT_CACHE_SIZE = 50000
+# Local pre-filter: messages the model is sure about skip Perspective entirely
+PREFILTER_LEXICON_PATH = './prefilter_lexicon.json'
+PREFILTER_MODEL_PATH = './prefilter_model.json'
+PREFILTER_CLEAN_BELOW = 0.05
+PREFILTER_BAD_ABOVE = 0.97
+# Every Perspective result is appended here so the pre-filter model can be retrained offline
+SCORES_LOG_PATH = './scores_log.jsonl'
+# The tab-separated message history the bot used to keep. It is only read to convert it to the
+# columnar history and trimmed until it ages out; new messages are no longer written to it
+TIME_DATA_PATH = './time_data.csv'
+NETWORK_DATA_PATH = './network_data.csv'
+# Every message is kept in a compact columnar history, buffered and written in batches by a
+# background task. The in-memory indexes are loaded from it; it is converted from
+# time_data.csv the first time the bot starts without it
+HISTORY_PATH = './history'
+HISTORY_SEGMENT_ROWS = 1000000
+HISTORY_SEGMENT_SECONDS = 24 * 60 * 60
+# Raw messages are kept for HISTORY_RETENTION seconds. Older ones are folded into hourly counts
+# per author, mention edge weights and per-content counts under ROLLUPS_PATH, which the analytics
+# still read, and are dropped from the history and the CSV files. Texts nobody has posted within
+# the window are dropped from the in-memory near-duplicate index. Checked every COMPACTION_INTERVAL
+HISTORY_RETENTION = 30 * 24 * 60 * 60
+ROLLUPS_PATH = './rollups'
+COMPACTION_INTERVAL = 60 * 60
+REVISIONS_PATH = './revisions.csv'
+STORE_FLUSH_INTERVAL = 1.0
+STORE_MAX_BUFFER = 500
+STORE_FSYNC = 'second'
+# The mention graph lives in memory and is snapshotted here every few minutes
+MENTION_GRAPH_PATH = './mention_graph.json'
+MENTION_GRAPH_SNAPSHOT_INTERVAL = 300
+# Network plots show users within this many mentions of the flagged user, capped in size
+MENTION_GRAPH_HOPS = 2
+MENTION_GRAPH_MAX_NODES = 50
+# Near-duplicate messages at or above this estimated similarity count as copies in the frequency table
+DUPLICATE_SIMILARITY = 0.8
+# Per-message and per-reporter state is bounded in size and expires
+DELETE_MAP_SIZE = 100000
+DELETE_MAP_TTL = 7 * 24 * 60 * 60
+MAX_OPEN_REPORTS = 10000
+REPORT_TIMEOUT = 30 * 60
+STATE_SWEEP_INTERVAL = 60
+# Every mod-channel post is recorded with the case it is about, so reactions need no lookups
+MOD_QUEUE_PATH = './mod_queue.jsonl'
+# Analytics images are drawn in worker processes, one job per worker; the rest wait their turn
+RENDER_WORKERS = 2
+RENDER_TIMEOUT = 30.0
+# The matplotlib table backend doesn't need a headless browser in the render workers
+FREQ_TABLE_CONVERSION = 'matplotlib'
+# An edit is rescored once the message has been quiet this long, or this long after its first edit
+EDIT_DEBOUNCE = 2.0
+EDIT_MAX_WAIT = 10.0
+# Messages being analyzed in worker processes at once (sharded mode only)
+ANALYSIS_MAX_CONCURRENCY = 64
+# Stage timings are recorded for this fraction of calls; lower it if the overhead ever shows
+METRICS_SAMPLE_RATE = 1.0
+# Prometheus text on http://127.0.0.1:METRICS_PORT/metrics (None to disable) and a JSON dump
+METRICS_PORT = None
+METRICS_DUMP_PATH = './metrics.json'
+METRICS_DUMP_INTERVAL = 60
+LOOP_LAG_INTERVAL = 0.5
+# Moderator actions and report DMs run first, flagged-message posts second, scoring and analytics
+# last. Scoring may use at most LANE_LIMITS[BULK] of the workers, and is shed once that many
+# messages are waiting
+LANE_CONCURRENCY = 128
+LANE_LIMITS = (None, None, 96)
+LANE_MAX_QUEUED = (1000, 1000, 5000)
+# Alerts about the same author or content within this many seconds share one mod-channel post, and
+# each mod channel is sent at most MOD_POST_RATE posts per second in bursts of MOD_POST_BURST
+MOD_COALESCE_WINDOW = 1.0
+MOD_POST_RATE = 1.0
+MOD_POST_BURST = 5
+MOD_MAX_GROUP = 100
+# Authors sending more than BURST_RATE_LIMIT messages in BURST_RATE_WINDOW seconds, and texts posted
+# more than BURST_REPEAT_LIMIT times in BURST_REPEAT_WINDOW seconds, are reported as they happen
+BURST_RATE_LIMIT = 15
+BURST_RATE_WINDOW = 30
+BURST_REPEAT_LIMIT = 8
+BURST_REPEAT_WINDOW = 60
+BURST_MIN_REPEAT_LENGTH = 20
+BURST_COOLDOWN = 300
+# Scores, author history and copy counts for a reported message are looked up while the reporter
+# fills in the questionnaire, shared by repeat reports of it, and waited on this long at most
+EVIDENCE_CACHE_SIZE = 1000
+EVIDENCE_TTL = 10 * 60
+EVIDENCE_TIMEOUT = 5.0
+# Flagging thresholds per guild and channel (see thresholds.py for the format); the file is checked
+# for changes every THRESHOLDS_RELOAD_INTERVAL seconds. Without it every guild gets the defaults
+# in perspective.py
+THRESHOLDS_PATH = './thresholds.json'
+THRESHOLDS_RELOAD_INTERVAL = 5
+# Score vectors of scored mod-channel posts and the moderators' actions on them, for re-tuning
+OUTCOMES_LOG_PATH = './outcomes.jsonl'
 logger = logging.getLogger('discord')
-logger.setLevel(logging.DEBUG)
-handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='w')
-handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
-logger.addHandler(handler)
-
-# There should be a file called 'token.json' inside the same folder as this file
-token_path = 'tokens.json'
-if not os.path.isfile(token_path):
-    raise Exception(f"{token_path} not found!")
-with open(token_path) as f:
-    # If you get an error here, it means your token is formatted incorrectly. Did you put it in quotes?
-    tokens = json.load(f)
-    discord_token = tokens['discord']
-    perspective_key = tokens['perspective']
 
 
 class ModBot(discord.Client):
-    def __init__(self, key):
+    def __init__(self, key, analysis_workers=0, **options):
         intents = discord.Intents.default()
-        super().__init__(command_prefix='.', intents=intents)
+        super().__init__(command_prefix='.', intents=intents, **options)
         self.group_num = None
         self.mod_channels = {} # Map from guild to the mod channel id for that guild
+        self.mod_channel_ids = set()
         self.general_channel = None
-        self.reports = {} # Map from user IDs to the state of their report
+        self.general_channel_ids = set()
+        self.event_filter = EventFilter()
+        self.reports = LRUCache(MAX_OPEN_REPORTS, REPORT_TIMEOUT) # Map from user IDs to the state of their report
         self.perspective_key = key
-        self.deleteMap = {}
+        self.metrics = Metrics(METRICS_SAMPLE_RATE)
+        self.perspective = PerspectiveClient(key)
+        self.scheduler = ScoringScheduler(self.perspective.analyze, window=SCORING_BATCH_WINDOW,
+                                          max_batch=SCORING_MAX_BATCH, qps=PERSPECTIVE_QPS)
+        self.verdict_cache = VerdictCache(VERDICT_CACHE_SIZE, path=VERDICT_CACHE_PATH)
+        self.normalizer = Normalizer(metrics=self.metrics)
+        self.prefilter = PreFilter.from_files(PREFILTER_LEXICON_PATH, PREFILTER_MODEL_PATH,
+                                              clean_below=PREFILTER_CLEAN_BELOW, bad_above=PREFILTER_BAD_ABOVE)
+        self.score_log = open(SCORES_LOG_PATH, 'a', buffering=1)
+        self.thresholds = ThresholdEngine(THRESHOLDS_PATH)
+        self.outcomes = OutcomeLog(OUTCOMES_LOG_PATH)
+        self.store = MessageStore(TIME_DATA_PATH, NETWORK_DATA_PATH, REVISIONS_PATH, max_buffer=STORE_MAX_BUFFER,
+                                  flush_interval=STORE_FLUSH_INTERVAL, fsync=STORE_FSYNC, history_path=HISTORY_PATH,
+                                  segment_rows=HISTORY_SEGMENT_ROWS, segment_seconds=HISTORY_SEGMENT_SECONDS,
+                                  metrics=self.metrics)
+        if not os.path.isdir(HISTORY_PATH):
+            from convert_history import convert
+            convert(TIME_DATA_PATH, HISTORY_PATH, HISTORY_SEGMENT_ROWS, HISTORY_SEGMENT_SECONDS)
+        self.history = HistoryIndex().load_segments(read_segments(HISTORY_PATH, ['author_id', 'timestamp']))
+        self.history.load_rollups(read_hourly(ROLLUPS_PATH))
+        self.mention_graph = load_mention_graph(MENTION_GRAPH_PATH, HISTORY_PATH, ROLLUPS_PATH)
+        self.compactor = Compactor(HISTORY_PATH, ROLLUPS_PATH, HISTORY_RETENTION, store=self.store,
+                                   index=self.history, trim_slack=HISTORY_SEGMENT_SECONDS, metrics=self.metrics)
+        # The near-duplicate index (and numpy) is left out of construction so the bot connects
+        # quickly; once ready it is built from the message history in the background
+        self.content_index = None
+        self.content_index_task = None
+        self.content_backlog = None # messages that arrive while the index is being built
+        self.background_tasks = []
+        self.renderer = RenderService(RENDER_WORKERS, RENDER_TIMEOUT, metrics=self.metrics)
+        self.deleteMap = LRUCache(DELETE_MAP_SIZE, DELETE_MAP_TTL) # Map from message ID to (channel ID, message ID)
+        self.mod_queue = ModQueue(MOD_QUEUE_PATH) # Map from mod-channel post ID to its ModCase
+        # With analysis workers, unicode folding and the pre-filter run in other processes
+        self.analyzer = self.normalizer
+        if analysis_workers:
+            self.analyzer = AnalysisPool(self.normalizer, PREFILTER_LEXICON_PATH, PREFILTER_MODEL_PATH,
+                                         {'clean_below': PREFILTER_CLEAN_BELOW, 'bad_above': PREFILTER_BAD_ABOVE},
+                                         workers=analysis_workers, max_concurrency=ANALYSIS_MAX_CONCURRENCY)
+        self.shard_stats = ShardStats()
+        self.edits = EditPipeline(self.analyzer, self.handle_edit, delay=EDIT_DEBOUNCE, max_wait=EDIT_MAX_WAIT)
+        self.lanes = LaneScheduler(LANE_CONCURRENCY, LANE_LIMITS, LANE_MAX_QUEUED, metrics=self.metrics)
+        self.dispatcher = ModDispatcher(self.send_mod_post, window=MOD_COALESCE_WINDOW, rate=MOD_POST_RATE,
+                                        burst=MOD_POST_BURST, max_group=MOD_MAX_GROUP, metrics=self.metrics)
+        self.bursts = BurstDetector(BURST_RATE_LIMIT, BURST_RATE_WINDOW, BURST_REPEAT_LIMIT, BURST_REPEAT_WINDOW,
+                                    min_repeat_length=BURST_MIN_REPEAT_LENGTH, cooldown=BURST_COOLDOWN)
+        self.evidence = EvidenceCache({'scores': self.evidence_scores, 'history': self.evidence_history,
+                                       'duplicates': self.evidence_duplicates},
+                                      maxsize=EVIDENCE_CACHE_SIZE, ttl=EVIDENCE_TTL, metrics=self.metrics)
+        self.metrics.gauge('scoring_queue_depth', self.scheduler.queue_depth)
+        self.metrics.gauge('lane_queued', lambda: sum(self.lanes.depths().values()))
+        self.metrics.gauge('mod_alerts_pending', self.dispatcher.pending)
+        self.metrics.gauge('store_buffered_rows', lambda: self.store.stats()['buffered'])
+        self.metrics.gauge('edits_pending', lambda: len(self.edits.pending))
+        self.metrics.gauge('report_sessions', lambda: len(self.reports))
+        self.metrics.gauge('mod_queue_cases', lambda: len(self.mod_queue))
+        self.metrics.gauge('delete_map_size', lambda: len(self.deleteMap))
 
     async def on_ready(self):
         print(f'{self.user.name} has connected to Discord! It is these guilds:')
@@ -77,43 +226,81 @@ class ModBot(discord.Client):
                     self.mod_channels[guild.id] = channel
                 if channel.name == f'group-{self.group_num}':
                     self.general_channel = channel
+        # Raw events are filtered on these ids before any other work is done
+        self.mod_channel_ids = {channel.id for channel in self.mod_channels.values()}
+        self.general_channel_ids = {self.general_channel.id} if self.general_channel else set()
+
+        # on_ready runs again after a reconnect; only start the background jobs once
+        if not self.background_tasks:
+            self.background_tasks = [
+                asyncio.create_task(self.mention_graph.snapshot_periodically(MENTION_GRAPH_PATH, MENTION_GRAPH_SNAPSHOT_INTERVAL)),
+                asyncio.create_task(self.expire_state()),
+                asyncio.create_task(self.compactor.compact_periodically(COMPACTION_INTERVAL)),
+                asyncio.create_task(self.thresholds.reload_periodically(THRESHOLDS_RELOAD_INTERVAL)),
+                asyncio.create_task(self.metrics.watch_loop_lag(LOOP_LAG_INTERVAL)),
+                asyncio.create_task(self.metrics.dump_periodically(METRICS_DUMP_PATH, METRICS_DUMP_INTERVAL)),
+                asyncio.create_task(self.preload_content_index()),
+            ]
+            if METRICS_PORT:
+                await self.metrics.serve(port=METRICS_PORT)
+
+    async def expire_state(self):
+        while True:
+            await asyncio.sleep(STATE_SWEEP_INTERVAL)
+            self.deleteMap.expire()
+            self.reports.expire()
 
     async def on_raw_message_edit(self, payload):
-        guild = client.get_guild(payload.guild_id)
-        channel = guild.get_channel(payload.channel_id)
-        message = await channel.fetch_message(payload.message_id)
-        # handle adversarial attempts at hiding text via unicode
-        message.content = uni2ascii(message.content)
-        # translate all messages in other languages to english
-        message.content = GoogleTranslator(source='auto', target='en').translate(message.content)
-        # treat all edited messages as new messages
-        await self.on_message(message)
+        # Only edits in the channel we moderate need rescoring
+        if not self.event_filter.allow('edit', payload.channel_id, self.general_channel_ids):
+            self.event_filter.saved_rest_call()
+            return
+        # discord.py 2.5+ hands us the updated message; older versions need a fetch
+        message = getattr(payload, 'message', None)
+        if message is None:
+            message = await self.get_channel(payload.channel_id).fetch_message(payload.message_id)
+        else:
+            self.event_filter.saved_rest_call()
+        if message.author.id == self.user.id:
+            return
+        # Bursts of edits are collapsed and only rescored if the normalized text changed
+        self.edits.submit(message)
+
+    async def handle_edit(self, message, context):
+        message.content = context.text
+        self.store.record_revision(message)
+        await self.score_and_flag(message, context)
 
     async def on_message(self, message):
         '''
         This function is called whenever a message is sent in a channel that the bot can see (including DMs).
         Currently the bot is configured to only handle messages that are sent over DMs or in your group's "group-#" channel.
         '''
-        # Ignore messages from the bot unless it's a forwarded message
-        if message.author.id == self.user.id and not message.content.startswith("User-reported message"):
+        # Ignore messages from the bot
+        if message.author.id == self.user.id:
             return
+        start = time.perf_counter()
+        self.metrics.count('messages')
 
+        # Normalize the text once; every later stage reads the normalized content
+        with self.metrics.timer('normalize'):
+            context = await self.analyzer.normalize(message)
+        message.content = context.text
 
-        # handle adversarial attempts at hiding text via unicode
-        message.content = uni2ascii(message.content)
-        # translate all messages in other languages to english
-        message.content = GoogleTranslator(source='auto', target='en').translate(message.content)
-
-
-        # Create a map of messageId -> message.delete() function to use if moderator reacts to bot
-        # self.deleteMap[str(message.id)] = message.delete
-        self.deleteMap[str(message.id)] = message.add_reaction
+        # Remember where each message lives so a moderator's 👍 can act on it later without
+        # keeping the whole message object alive
+        self.deleteMap.set(str(message.id), (message.channel.id, message.id))
 
         # Check if this message was sent in a server ("guild") or if it's a DM
         if message.guild:
-            await self.handle_channel_message(message)
+            self.edits.remember(message.id, context.text)
+            await self.handle_channel_message(message, context)
+            elapsed = time.perf_counter() - start
+            self.shard_stats.record(message.guild.shard_id, elapsed)
+            self.metrics.observe('channel_message', elapsed)
         else:
-            await self.handle_dm(message)
+            # Report flows share the moderators' lane
+            await self.lanes.run(MODERATOR, self.handle_dm, message)
 
     async def handle_dm(self, message):
         # Handle a help message
@@ -126,280 +313,385 @@ class ModBot(discord.Client):
         author_id = message.author.id
         responses = []
 
-        # Only respond to messages if they're part of a reporting flow
-        if author_id not in self.reports and not message.content.startswith(Report.START_KEYWORD):
+        # Only respond to messages if they're part of a reporting flow; abandoned reports expire
+        report = self.reports.get(author_id)
+        if report is None and not message.content.startswith(Report.START_KEYWORD):
             return
 
         # If we don't currently have an active report for this user, add one
-        if author_id not in self.reports:
-            self.reports[author_id] = Report(self)
+        if report is None:
+            report = Report(self)
+        # (re)storing the report restarts its inactivity timer
+        self.reports.set(author_id, report)
 
         # Let the report class handle this message; forward all the messages it returns to uss
-        responses = await self.reports[author_id].handle_message(message)
+        responses = await report.handle_message(message)
         for r in responses:
             await message.channel.send(r)
 
         # If the report is complete or cancelled, remove it from our map
-        if self.reports[author_id].report_complete():
+        if report.report_complete():
             self.reports.pop(author_id)
 
-    def generate_time_plot(self, authorToGraph, user):
-        with open("./time_data.csv") as f:
-            data = [line.split('\t') for line in f]
-            times = []
-            for row in data:
-                if len(row)>1 and str(row[1]) == str(authorToGraph):
-                    message_id, message_author_id, message_author_name, message_content, message_timestamp, message_mentions, count, temp = row
-                    times.append(datetime.strptime(message_timestamp[:-7], '%Y-%m-%d %H:%M:%S')) #cutting out the milliseconds
-                    # plt.plot_date(time, count)
-        plt.hist(times)
-        plt.gcf().autofmt_xdate()
-        date_format = mpl_dates.DateFormatter('%D %H:%M:%S')
-        plt.gca().xaxis.set_major_formatter(date_format)
-        plt.title("User "+ str(user)+"'s messages over time")
-        plt.savefig(fname='timePlot')
-
-    def generate_network_graph(self, user):
-        data_panda = pd.read_csv("./network_data.csv", sep='\t',lineterminator='\n')
-        data_panda.dropna( #drop blank rows
-                axis = 0,
-                how = 'all',
-                thresh = None,
-                subset = None,
-                inplace = True,
-        )
-        G = nx.from_pandas_edgelist(data_panda, #Create a directed graph
-                    source = 'message_author_name',
-                    target = 'message_mentions',
-                    edge_attr = True,
-                    create_using = nx.DiGraph()
-        )
-        color_map = []
-        size_map = []
-        for node in G:
-            if node == user.name: color_map.append('red')
-            else: color_map.append('green')
-            size_map.append(500)
-        nx.draw_networkx(G,
-            node_color = color_map,
-            node_size = size_map,
-            node_shape = "8",#can choose s,o,^,>,v,<,d,p,h,8...o is default
-            alpha = 0.75,
-            font_size = 10,
-            font_color = "black",
-            font_weight = "bold",
-            edge_color = "skyblue",
-            style = "solid",
-            width = 5,
-            label = "User Mentions",
-            pos = nx.spring_layout(G, iterations = 1000),
-            arrows = True, with_labels = True)
-        plt.title("User "+ str(user)+"'s network")
-        plt.savefig(fname='networkPlot')    
-
-    def generate_freq_table(self, flagged_message):
-        f = open("./time_data.csv")
-        csv_f = csv.reader(f)
-        message_of_interest = {}
-        author_count = {}
-        with open("./time_data.csv") as f:
-            data = [line.split('\t') for line in f]
-            for row in data:
-                if len(row)>1 and str(row[3]) == str(flagged_message.content):
-                    message_id, message_author_id, message_author_name, message_content, message_timestamp, message_mentions, count, temp = row
-                    if message_author_name not in author_count:
-                        author_count[message_author_name] = 1
-                    else:
-                        author_count[message_author_name] += 1 
-                    message_of_interest[flagged_message.content] = author_count
-            print("Check dictionary: ", message_of_interest) 
-            freq_data = pd.DataFrame(message_of_interest)
-            dfi.export(freq_data,"table.png") 
-      
+    def resolve_message(self, message_id):
+        '''
+        Returns a PartialMessage for a message the bot has seen, without fetching it. Messages that
+        have aged out of deleteMap are assumed to be in the general channel.
+        '''
+        channel_id, message_id = self.deleteMap.get(str(message_id), (None, int(message_id)))
+        channel = self.get_channel(channel_id) if channel_id else None
+        return (channel or self.general_channel).get_partial_message(message_id)
+
+    async def generate_time_plot(self, authorToGraph, user):
+        bucket = self.history.pick_bucket(authorToGraph)
+        counts = [(to_datetime(start), count) for start, count in self.history.histogram(authorToGraph, bucket)]
+        return await self.renderer.render(render_time_plot, counts, BUCKET_SECONDS[bucket] / BUCKET_SECONDS['day'],
+                                          "User "+ str(user)+"'s messages over time")
+
+    async def generate_network_graph(self, user):
+        edges = self.mention_graph.ego(user, MENTION_GRAPH_HOPS, MENTION_GRAPH_MAX_NODES)
+        return await self.renderer.render(render_network_graph, edges, user, "User "+ str(user)+"'s network")
+
+    def index_content(self, message):
+        if self.content_index is not None:
+            self.content_index.add_message(message)
+        elif self.content_backlog is not None:
+            self.content_backlog[str(message.id)] = message
+
+    def start_content_index(self):
+        # A failed build is retried on the next request
+        if self.content_index_task is None or (self.content_index_task.done() and self.content_index is None):
+            self.content_index_task = asyncio.create_task(self.build_content_index())
+        return self.content_index_task
+
+    async def get_content_index(self):
+        # Lookups made while the startup build is still running wait for it
+        return await asyncio.shield(self.start_content_index())
+
+    async def preload_content_index(self):
+        # Built from the history in the background at startup, then kept current as messages arrive
+        try:
+            await self.get_content_index()
+        except Exception:
+            logger.exception("Failed to build the near-duplicate index; retrying on the first lookup")
+
+    async def build_content_index(self):
+        self.content_backlog = {}
+        await self.store.flush()
+        # A message is put in the backlog before its row can reach the history, so skipping
+        # backlog ids while reading means nothing is counted twice
+        backlog = self.content_backlog
+
+        def load():
+            # numpy's import is done here too, off the event loop
+            from fingerprint import ContentIndex
+            messages = HistoryReader(HISTORY_PATH).messages()
+            index = ContentIndex().load_rollups(read_content(ROLLUPS_PATH, read_names(HISTORY_PATH)))
+            index.load_messages(m for m in messages if str(m[0]) not in backlog)
+            # Only texts posted within the retention window are kept in memory, as compaction does
+            index.expire(time.time() - HISTORY_RETENTION)
+            return index
+
+        try:
+            # so no segment is rolled up while it is being read
+            async with self.compactor.lock:
+                index = await asyncio.to_thread(load)
+            for message in backlog.values():
+                index.add_message(message)
+        finally:
+            self.content_backlog = None
+        self.content_index = self.compactor.content_index = index
+        return index
+
+    async def generate_freq_table(self, content):
+        content_index = await self.get_content_index()
+        author_count = {author: count for author, (count, first, last)
+                        in content_index.author_counts(content, DUPLICATE_SIMILARITY).items()}
+        message_of_interest = {content: author_count}
+        return await self.renderer.render(render_freq_table, message_of_interest, FREQ_TABLE_CONVERSION)
+
     async def on_raw_reaction_add(self, payload):
-        guild = client.get_guild(payload.guild_id)
-        channel = guild.get_channel(payload.channel_id)
-        message = await channel.fetch_message(payload.message_id)
-        if str(channel) != 'group-14-mod':
-            # reaction sent but not in mod channel
+        # Only moderators' reactions to the bot's own mod-channel posts mean anything, and those
+        # posts are all in the mod queue with the case they are about
+        # Every reaction used to cost a fetch_message before any of these checks
+        self.event_filter.saved_rest_call()
+        if not self.event_filter.allow('reaction', payload.channel_id, self.mod_channel_ids):
             return
-        id_start_i = message.content.rfind(":") + 1
-        ID_LEN = 18
-        author_id = message.content[id_start_i: id_start_i + ID_LEN]
-        flagged_message_id = message.content[id_start_i + ID_LEN: id_start_i + 2 * ID_LEN]
-
-        if payload.emoji.name == "👍":
-            messageToDeleteId = flagged_message_id
-            print("Deleting message: ", messageToDeleteId)
-            await self.deleteMap[str(messageToDeleteId)]("🗑️")
+        case = self.mod_queue.get(payload.message_id)
+        if case is None or payload.user_id == self.user.id:
+            self.event_filter.drop('reaction')
+            return
+        channel = self.mod_channels[payload.guild_id]
         if payload.emoji.name == "✅":
-            authorToGraph = author_id
-            messageId = flagged_message_id
-            flagged_message = await self.general_channel.fetch_message(messageId)
-            user = await client.fetch_user(int(authorToGraph))
-            # graphing time series data
-            self.generate_time_plot(authorToGraph, user)
-            await channel.send(file=discord.File('timePlot.png'))
-            plt.clf()  
-            # graphing network data
-            self.generate_network_graph(user)
-            await channel.send(file=discord.File('networkPlot.png'))
-            plt.clf()
-            # Generate frequency table
-            self.generate_freq_table(flagged_message)
-            await channel.send(file=discord.File('table.png'))
-
-        if payload.emoji.name == "❌":
-            userToSuspend = author_id
-            user = await client.fetch_user(int(userToSuspend))
-            channel = self.mod_channels[payload.guild_id]
-            await channel.send(f"User {user.name} has been suspended.")
-        if payload.emoji.name == "🗑️":
-            userToSuspend = author_id
-            user = await client.fetch_user(int(userToSuspend))
-            channel = self.mod_channels[payload.guild_id]
-            await channel.send(f"User {user.name} has been deleted.")
-
-    async def handle_channel_message(self, message):
-        # Only handle messages sent in the "group-#" channel
-
-        # record message in csv file
-        f = open('./time_data.csv', 'a+', newline='')
-        row = [str(message.id), str(message.author.id), message.author.name, message.content, str(message.created_at), str([m.name for m in message.mentions]), "1"]
-        for el in row:
-            f.write(el + '\t')
-        f.write('\n')
-        f.close()
-
-        # record messages with mentions in csv file
-        write_obj =  open('./network_data.csv','a+',newline='')
-        for m in message.mentions:
-            row = [str(message.id), str(message.author.id), message.author.name, message.content, str(message.created_at), str(m.name), "1"]#tried to use r.find("'")... on m.name to clean user mention display, but no luck
-            if row[5] != "":
-                for el in row:
-                    write_obj.write(el + '\t')
-                write_obj.write('\n')
-        write_obj.close()
-
-
-        mod_channel = self.mod_channels[message.guild.id]
-        if message.channel == mod_channel and message.content.startswith("User-reported message"):
-            user_id_start = message.content.rfind("Author id: ") + len("Author id: ")
-            user_id = message.content[user_id_start: user_id_start + 18]
-            message_id_start = message.content.rfind("Message id: ") + len("Message id: ")
-            message_id = message.content[message_id_start: message_id_start + 18]
-            delete_message_string_suffix = f"react to this with 👍 to delete the message."
-            suspend_user_string_suffix = f"react to this with ❌ to suspend the user's account."
-            remove_user_string_suffix = f"react to this with 🗑️ to remove the user's account."
-            id_suffix = self.hidden_format(f"id:{user_id}{message_id}")
-
-
-            topic = message.content[message.content.rfind("for") + 6:]
-            topic_end = topic.find(".")
-            topic = topic[:topic_end]
-            if topic.startswith('"violence'):
-                await mod_channel.send(
-                    f"If the reported message glorifies violence, " + delete_message_string_suffix + '\n' +
-                    "If the reported message threatens violence against an individual or a group of people, " + suspend_user_string_suffix + '\n' +
-                    id_suffix
-                )
-
-            elif topic.startswith('"spam: Includes a link'):
-                await mod_channel.send("If the reported message deceptively or misleadingly directs users to a harmful site, " + delete_message_string_suffix + '\n' + id_suffix)
-            elif topic.startswith('"spam: The user is fake'):
-                await mod_channel.send("If the reported message's sender impersonates individuals or groups and intends to deceive others, " + remove_user_string_suffix + '\n' + id_suffix)
-
-            elif topic.startswith('"hate'):
-                await mod_channel.send("If the reported message promotes violence against, threatens, harasses, or promotes terrorism or violent extremism other people on the basis of race, ethnicity, sexual orientation, gender, religion, national origin, disability, or disease, " + suspend_user_string_suffix + '\n' + id_suffix)
-
-            elif topic.startswith('"false info about Politics'):
-                await mod_channel.send(
-                    "If the reported message is manipulating or interfering in elections or other civic processes (This includes posting or sharing content that may suppress participation or mislead people about when, where, or how to participate in a civic process 's sender impersonates individuals or groups and intends to deceive others), " + delete_message_string_suffix + '\n' +
-                    "If you suspect that this account is a bot or a sock puppet user, " + remove_user_string_suffix + '\n' +
-                    id_suffix
-                )
-
-            elif topic.startswith('"false info'):
-                await mod_channel.send(
-                    "If the reported message is likely to cause harm, "+ delete_message_string_suffix + '\n' +
-                    "If you suspect that this account is a bot or a sock puppet user, " + remove_user_string_suffix + '\n' +
-                    id_suffix
-                )
-            elif topic.startswith('"harrassment'):
-                if topic.startswith('"harrassment: Degrading'):
-                    await mod_channel.send("If the reported message targets a individual or group by with dehumanizing statements, calls for segregation or exclusion, or statements of inferiority, " + suspend_user_string_suffix + '\n' + id_suffix)
-                elif topic.startswith('"harrassment: Repeatedly'):
-                    await mod_channel.send("If there a pattern of actions or previous reports by the reporter, " + suspend_user_string_suffix + '\n' + id_suffix)
-                elif topic.startswith('"harrassment: Encourages'):
-                    await mod_channel.send("If the reported message includes the targeted harassment of someone, or incites other people to do so (this includes wishing or hoping that someone experiences physical harm), " + suspend_user_string_suffix + '\n' +  id_suffix)
-                await mod_channel.send("If you suspect that this account is a bot or a sock puppet user, " + remove_user_string_suffix + '\n' + id_suffix)
-
+            # Analytics are heavy, so they queue with the bulk work (but are never shed)
+            await self.lanes.run(BULK, self.send_analysis, case, channel)
+        else:
+            await self.lanes.run(MODERATOR, self.moderate, payload.emoji.name, case, channel)
+
+    async def moderate(self, emoji, case, channel):
+        self.outcomes.record(case, channel.guild.id, emoji)
+        # A coalesced post stands for every message folded into it
+        if emoji == "👍":
+            for message_id in case.message_ids():
+                logger.info("Deleting message %s", message_id)
+                await self.resolve_message(message_id).add_reaction("🗑️")
+        if emoji == "❌":
+            await channel.send(f"User {', '.join(case.author_names())} has been suspended.")
+        if emoji == "🗑️":
+            await channel.send(f"User {', '.join(case.author_names())} has been deleted.")
+
+    async def send_analysis(self, case, channel):
+        content = case.content
+        if case.category in ('report', 'sock puppet'):
+            # Cases from user reports hold the reported message as fetched; every other case
+            # already holds the normalized text that the history is indexed by
+            ascii_content, content = await self.normalizer.normalize_text(content)
+        # time series, network graph and frequency table are drawn in parallel off the event loop
+        images = await asyncio.gather(
+            self.generate_time_plot(case.author_id, case.author_name),
+            self.generate_network_graph(case.author_name),
+            self.generate_freq_table(content),
+        )
+        # one message with all three images
+        files = [discord.File(io.BytesIO(png), filename=filename)
+                 for png, filename in zip(images, ['timePlot.png', 'networkPlot.png', 'table.png'])]
+        await channel.send(files=files)
 
+    def post_to_mods(self, guild_id, text, case):
+        '''
+        Queues an alert for the guild's mod channel; the dispatcher may fold it into a summary post.
+        '''
+        self.dispatcher.submit(self.mod_channels[guild_id], text, case)
+
+    async def send_mod_post(self, channel, text, case):
+        # Posts share the flagged lane, ahead of bulk scoring for a worker
+        with self.metrics.timer('mod_send'):
+            post = await self.lanes.run(FLAGGED, channel.send, text)
+        self.metrics.count('mod_posts')
+        self.mod_queue.add(post.id, case)
+        self.outcomes.record(case, channel.guild.id, POSTED)
+        return post
+
+    async def post_report(self, message, reporter, reason, evidence=None):
+        '''
+        Sends a user report to the mod channel as one post, with whatever evidence has been gathered
+        about the message and the actions that fit its reason.
+        '''
+        case = ModCase.from_message(message, 'report', reason=reason)
+        text = f"""User-reported message:\n```{message.author.name}: "{message.content}```
+*Author id: {message.author.id}*
+*Message id: {message.id}*
+Flagged by user {reporter.name} for **"{reason}"**.
+"""
+        if evidence is not None:
+            with self.metrics.timer('evidence_wait'):
+                found = await evidence.collect(EVIDENCE_TIMEOUT)
+            if found['scores'] is not None:
+                case.scores = found['scores'][0]
+                case.vector = found['scores'][2]
+            text += self.format_evidence(found)
+        self.post_to_mods(message.guild.id, text + '\n'.join(self.report_instructions(reason)), case)
+
+    async def evidence_scores(self, message):
+        # Scored like a channel message, but the reported message object is left as fetched
+        context = await self.analyzer.normalize(message)
+        return await self.eval_text(message, context)
+
+    async def evidence_history(self, message):
+        return self.history.summary(message.author.id, time.time())
+
+    async def evidence_duplicates(self, message):
+        ascii_content, content = await self.normalizer.normalize_text(message.content)
+        content_index = await self.get_content_index()
+        counts = content_index.author_counts(content, DUPLICATE_SIMILARITY)
+        return {'copies': sum(count for count, first, last in counts.values()), 'authors': len(counts)}
+
+    def format_evidence(self, found):
+        lines = []
+        if found['scores'] is not None:
+            scores, flagged_scores, vector = found['scores']
+            top = sorted(scores.items(), key=lambda item: -item[1])[:3]
+            lines.append("Scores: " + (", ".join(f"{attr} {score:.2f}" for attr, score in top) or "clean") +
+                         (f" (flagged: {', '.join(flagged_scores)})" if flagged_scores else ""))
+        history = found['history']
+        if history is not None:
+            since = f", first seen {to_datetime(history['first']):%Y-%m-%d}" if history['first'] else ""
+            lines.append(f"Author history: {history['hour']} messages in the last hour, {history['day']} in the "
+                         f"last day, {history['week']} in the last week, {history['total']} in total{since}")
+        if found['duplicates'] is not None:
+            lines.append(f"Copies: {found['duplicates']['copies']} near-identical messages from "
+                         f"{found['duplicates']['authors']} authors")
+        if not lines:
+            return ""
+        return self.bold_format("Evidence") + ":\n" + "\n".join(lines) + "\n"
+
+    def report_instructions(self, topic):
+        delete_message_string_suffix = f"react to this with 👍 to delete the message."
+        suspend_user_string_suffix = f"react to this with ❌ to suspend the user's account."
+        remove_user_string_suffix = f"react to this with 🗑️ to remove the user's account."
+
+        if topic.startswith('violence'):
+            return [
+                f"If the reported message glorifies violence, " + delete_message_string_suffix + '\n' +
+                "If the reported message threatens violence against an individual or a group of people, " + suspend_user_string_suffix
+            ]
+
+        elif topic.startswith('spam: Includes a link'):
+            return ["If the reported message deceptively or misleadingly directs users to a harmful site, " + delete_message_string_suffix]
+        elif topic.startswith('spam: The user is fake'):
+            return ["If the reported message's sender impersonates individuals or groups and intends to deceive others, " + remove_user_string_suffix]
+
+        elif topic.startswith('hate'):
+            return ["If the reported message promotes violence against, threatens, harasses, or promotes terrorism or violent extremism other people on the basis of race, ethnicity, sexual orientation, gender, religion, national origin, disability, or disease, " + suspend_user_string_suffix]
+
+        elif topic.startswith('false info about Politics'):
+            return [
+                "If the reported message is manipulating or interfering in elections or other civic processes (This includes posting or sharing content that may suppress participation or mislead people about when, where, or how to participate in a civic process 's sender impersonates individuals or groups and intends to deceive others), " + delete_message_string_suffix + '\n' +
+                "If you suspect that this account is a bot or a sock puppet user, " + remove_user_string_suffix
+            ]
+
+        elif topic.startswith('false info'):
+            return [
+                "If the reported message is likely to cause harm, "+ delete_message_string_suffix + '\n' +
+                "If you suspect that this account is a bot or a sock puppet user, " + remove_user_string_suffix
+            ]
+        elif topic.startswith('harrassment'):
+            posts = []
+            if topic.startswith('harrassment: Degrading'):
+                posts.append("If the reported message targets a individual or group by with dehumanizing statements, calls for segregation or exclusion, or statements of inferiority, " + suspend_user_string_suffix)
+            elif topic.startswith('harrassment: Repeatedly'):
+                posts.append("If there a pattern of actions or previous reports by the reporter, " + suspend_user_string_suffix)
+            elif topic.startswith('harrassment: Encourages'):
+                posts.append("If the reported message includes the targeted harassment of someone, or incites other people to do so (this includes wishing or hoping that someone experiences physical harm), " + suspend_user_string_suffix)
+            posts.append("If you suspect that this account is a bot or a sock puppet user, " + remove_user_string_suffix)
+            return posts
+        elif topic.startswith('sock puppet'):
+            return [
+                "If the account is a bot or a sock puppet user, " + remove_user_string_suffix + '\n' +
+                "If it belongs to a real user who is acting in bad faith, " + suspend_user_string_suffix + '\n' +
+                "To see the author's messaging history, react to this with ✅."
+            ]
+        return []
+
+    async def handle_channel_message(self, message, context):
+        # Only handle messages sent in the "group-#" channel
 
+        # record message and its mentions in the message history
+        self.store.record(message)
+        self.history.add_message(message)
+        self.mention_graph.add_message(message)
+        self.index_content(message)
 
         if not message.channel.name == f'group-{self.group_num}':
             return
 
-        # Forward the message to the mod channel
+        # Floods are caught locally and reported before the message waits for Perspective
+        for kind, count in self.bursts.add(message.author.id, message.content, message_timestamp(message)):
+            self.report_burst(message, kind, count)
+
+        await self.score_and_flag(message, context)
 
-        # handle adversarial attempts at hiding text via unicode
-        message.content = uni2ascii(message.content)
-        # translate all messages in other languages to english
-        message.content = GoogleTranslator(source='auto', target='en').translate(message.content)
+    def report_burst(self, message, kind, count):
+        self.metrics.count('bursts')
+        case = ModCase.from_message(message, 'burst', reason=kind)
+        if kind == RATE:
+            what = f"{message.author.name} has sent about {count} messages in the last {BURST_RATE_WINDOW}s"
+        else:
+            what = f"This message has been posted about {count} times in the last {BURST_REPEAT_WINDOW}s"
+        self.post_to_mods(message.guild.id,
+            f'**Burst detected**: {what}:\n{message.author.name}: "{message.content}"' + "\n" +
+            self.bold_format("To delete the message") + ", react to this with 👍 \n" +
+            self.bold_format("To suspend the user who sent the message") + ", react to this with ❌ \n" +
+            self.bold_format("To see the author's messaging history") + ", react to this with ✅ \n",
+            case
+        )
 
-        scores, flagged_scores = self.eval_text(message)
+    async def score_and_flag(self, message, context=None):
+        # Scoring is the lowest-priority work; during a flood the oldest waiting messages are shed
+        result = await self.lanes.run(BULK, self.eval_text, message, context, sheddable=True)
+        if result is None:
+            return
+        scores, flagged_scores, vector = result
+        # Forward the message to the mod channel
         # await mod_channel.send(self.code_format("Scores in all measured categories: " + json.dumps(scores, indent=2)))
         if len(flagged_scores) > 0:
-
-            await mod_channel.send(
+            self.metrics.count('flagged')
+            case = ModCase.from_message(message, 'flagged', scores=flagged_scores)
+            case.vector = vector
+            self.post_to_mods(message.guild.id,
                 f'**Flagged message**:\n{message.author.name}: "{message.content}"' + "\n" +
                 f'**Flagged categories**:' + self.code_format(json.dumps(flagged_scores, indent=2)) + "\n" +
                 self.bold_format("To delete the flagged message") + ", react to this with 👍 \n" +
                 self.bold_format("To suspend the user who sent the message") + ", react to this with ❌ \n" +
-                self.bold_format("To see an analysis of the message and the author's messaging history") + ", react to this with ✅ \n" + self.hidden_format("id:"+ str(message.author.id) + str(message.id))
+                self.bold_format("To see an analysis of the message and the author's messaging history") + ", react to this with ✅ \n",
+                case
             )
 
-    def eval_text(self, message):
+    async def eval_text(self, message, context=None):
         '''
-        Given a message, forwards the message to Perspective and returns a dictionary of scores.
+        Given a message, forwards the message to Perspective and returns (scores, the scores over
+        the guild's and channel's thresholds, score vector). Messages the pre-filter decides
+        locally skip Perspective but go through the same thresholds with its scores.
         '''
-        PERSPECTIVE_URL = 'https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze'
-
-        url = PERSPECTIVE_URL + '?key=' + self.perspective_key
-        data_dict = {
-            'comment': {'text': message.content},
-            'languages': ['en'],
-            'requestedAttributes': {
-                                    'SEVERE_TOXICITY': {}, 'PROFANITY': {},
-                                    'IDENTITY_ATTACK': {}, 'THREAT': {},
-                                    'TOXICITY': {}, 'INSULT': {}, 'INCOHERENT': {},
-                                    'SPAM': {},
-                                },
-            'doNotStore': True
-        }
-        response = requests.post(url, data=json.dumps(data_dict))
-        response_dict = response.json()
-
-        scores = {}
-        flagged_scores = {}
-        # TODO: Set to False
-        use_dummy = False
-        if use_dummy:
-            pass
-                # scores = {'SEVERE_TOXICITY': 4, 'PROFANITY': 5,
-                #     'IDENTITY_ATTACK': 6, 'THREAT': 7,
-                #     'TOXICITY': 8, 'FLIRTATION': 0, 'INCOHERENT'}
+        text = context.text if context is not None else message.content
+        if context is not None and context.prefilter is not None:
+            verdict, local_scores = context.prefilter
+            self.prefilter.count(verdict)
         else:
-            for attr in response_dict["attributeScores"]:
-                score = response_dict["attributeScores"][attr]["summaryScore"]["value"]
-                scores[attr] = score
-                if score >= PERSPECTIVE_SCORE_THRESHOLD_BY_ATTR[attr]:
-                    flagged_scores[attr] = score
-
-        print("scores for `{}`".format(message.content), scores)
-        print("flagged scores for `{}`".format(message.content), flagged_scores)
-
-        return scores, flagged_scores
+            verdict, local_scores = self.prefilter.classify(text)
+        if verdict == CLEAN or verdict == BAD:
+            response_scores = local_scores
+        else:
+            response_scores = self.verdict_cache.get(text)
+            if response_scores is None:
+                with self.metrics.timer('score'):
+                    response_scores = await self.scheduler.submit(text)
+                self.verdict_cache.put(text, response_scores)
+                self.score_log.write(json.dumps({'text': text, 'scores': response_scores}) + '\n')
+
+        guild_id = message.guild.id if message.guild else None
+        vector, flagged_scores = self.thresholds.evaluate(response_scores, guild_id, message.channel.id)
+        scores = dict(response_scores)
+
+        logger.debug("Scores for %r: %s, flagged: %s", text, scores, flagged_scores)
+
+        return scores, flagged_scores, vector
+
+    async def close(self):
+        logger.info("Scoring scheduler: %s", self.scheduler.stats())
+        logger.info("Verdict cache: %s", self.verdict_cache.stats())
+        logger.info("Normalizer: %s", self.normalizer.stats())
+        logger.info("Pre-filter: %s", self.prefilter.stats())
+        logger.info("Event filter: %s", self.event_filter.stats())
+        logger.info("Edits: %s", self.edits.stats())
+        logger.info("Shards: %s", self.shard_stats.stats())
+        logger.info("Bursts: %s", self.bursts.stats())
+        logger.info("Evidence: %s", self.evidence.stats())
+        logger.info("Thresholds: %s", self.thresholds.stats())
+        logger.info("Compactor: %s", self.compactor.stats())
+        logger.info("Lanes: %s", self.lanes.stats())
+        await self.edits.close()
+        # queued alerts go out before the lanes that send them stop
+        await self.dispatcher.close()
+        logger.info("Mod dispatcher: %s", self.dispatcher.stats())
+        logger.info("Metrics: %s", self.metrics.snapshot())
+        await self.lanes.close()
+        if self.analyzer is not self.normalizer:
+            logger.info("Analysis workers: %s", self.analyzer.stats())
+            self.analyzer.close()
+        self.verdict_cache.save()
+        self.score_log.close()
+        await self.store.close()
+        for task in self.background_tasks:
+            task.cancel()
+        self.mention_graph.save(MENTION_GRAPH_PATH)
+        self.renderer.close()
+        self.mod_queue.close()
+        self.outcomes.close()
+        await self.scheduler.close()
+        await self.perspective.close()
+        await self.metrics.close()
+        await super().close()
 
     def code_format(self, text):
         return "```" + text + "```"
@@ -411,5 +703,18 @@ class ModBot(discord.Client):
         return "*"+text+"*"
 
 
-client = ModBot(perspective_key)
-client.run(discord_token)
+class ShardedModBot(ModBot, discord.AutoShardedClient):
+    '''
+    ModBot on several gateway shards. Pass shard_count and shard_ids to run an explicit range of
+    shards, e.g. one range per process, each started from its own working directory so their data
+    files don't collide; by default Discord picks the shard count and this process runs them all.
+    '''
+
+    async def on_shard_ready(self, shard_id):
+        logger.info("Shard %s ready", shard_id)
+
+
+if __name__ == '__main__':
+    # main.py is the entry point; this keeps `python bot.py` working
+    from main import main
+    main()
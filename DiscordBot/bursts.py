@@ -0,0 +1,124 @@
+# bursts.py
+from array import array
+from collections import deque
+from lru import LRUCache
+from verdict_cache import normalize_key_text
+
+
+RATE = 'message rate'
+REPEATED = 'repeated content'
+
+_MASK = (1 << 64) - 1
+# Odd multipliers for multiply-shift hashing; the top 32 bits of each product index two sketch rows
+_M1 = 0x9E3779B97F4A7C15
+_M2 = 0xC2B2AE3D27D4EB4F
+
+
+class WindowSketch:
+    '''
+    Approximate per-key counts over the last `window` seconds: one four-row count-min sketch
+    holding the whole window, and for each of `slots` slices of it the cells its messages
+    incremented, which are decremented again once the slice slides out. Memory is the fixed-size table plus four
+    ints per message in the window, however many keys there are. A count is never under the true
+    one, and is over by at most a few while the window holds fewer messages than `width`.
+    '''
+
+    def __init__(self, window=60, slots=6, width=1 << 15):
+        if width & (width - 1) or not 1 < width <= 1 << 16:
+            raise ValueError("width must be a power of two no larger than 65536")
+        self.slot_seconds = window / slots
+        self.slots = slots
+        self.width = width
+        self.bits = width.bit_length() - 1
+        self.counts = array('I', bytes(4 * width * 4))
+        self.recent = deque() # (slice index since the epoch, cells incremented in it)
+
+    def _expire(self, slot):
+        counts = self.counts
+        while self.recent and self.recent[0][0] <= slot - self.slots:
+            for cell in self.recent.popleft()[1]:
+                counts[cell] -= 1
+
+    def add(self, key, now):
+        '''
+        Counts one occurrence of `key` at `now` and returns its estimated count over the window.
+        '''
+        slot = int(now // self.slot_seconds)
+        self._expire(slot)
+        # Late messages are counted in the newest slice
+        if not self.recent or self.recent[-1][0] < slot:
+            self.recent.append((slot, array('I')))
+        # Written out for speed: this runs for every message
+        h = hash(key)
+        a = (h * _M1) & _MASK
+        b = (h * _M2) & _MASK
+        width, bits, counts = self.width, self.bits, self.counts
+        mask = width - 1
+        c0 = a >> (64 - bits)
+        c1 = width + ((a >> (64 - 2 * bits)) & mask)
+        c2 = 2 * width + (b >> (64 - bits))
+        c3 = 3 * width + ((b >> (64 - 2 * bits)) & mask)
+        counts[c0] += 1
+        counts[c1] += 1
+        counts[c2] += 1
+        counts[c3] += 1
+        self.recent[-1][1].extend((c0, c1, c2, c3))
+        return min(counts[c0], counts[c1], counts[c2], counts[c3])
+
+    def nbytes(self):
+        return (self.counts.itemsize * len(self.counts)
+                + sum(cells.itemsize * len(cells) for _, cells in self.recent))
+
+
+class BurstDetector:
+    '''
+    Watches every channel message for an author posting more than `rate_limit` messages within
+    `rate_window` seconds, and for the same normalized text (at least `min_repeat_length`
+    characters) being posted more than `repeat_limit` times within `repeat_window` seconds by
+    anyone. Counting is done in fixed-size sketches, so the cost per message and the memory used
+    don't depend on how many authors there are. A burst is reported once per author or text
+    until it has been quiet for `cooldown` seconds.
+    '''
+
+    def __init__(self, rate_limit=15, rate_window=30, repeat_limit=8, repeat_window=60, min_repeat_length=8,
+                 width=1 << 15, cooldown=300, max_reported=100000):
+        self.rate_limit = rate_limit
+        self.repeat_limit = repeat_limit
+        self.min_repeat_length = min_repeat_length
+        self.rates = WindowSketch(rate_window, width=width)
+        self.repeats = WindowSketch(repeat_window, width=width)
+        self.reported = LRUCache(max_reported, cooldown)
+        self.messages = 0
+        self.bursts = {RATE: 0, REPEATED: 0}
+
+    def add(self, author_id, text, now):
+        '''
+        Counts a message and returns a list of (kind, estimated count) for each burst it starts.
+        '''
+        self.messages += 1
+        bursts = []
+        count = self.rates.add(author_id, now)
+        if count > self.rate_limit and self._report((RATE, author_id)):
+            bursts.append((RATE, count))
+        text = normalize_key_text(text)
+        if len(text) >= self.min_repeat_length:
+            count = self.repeats.add(text, now)
+            if count > self.repeat_limit and self._report((REPEATED, text)):
+                bursts.append((REPEATED, count))
+        return bursts
+
+    def _report(self, key):
+        # Each message in an ongoing burst pushes back the end of its cooldown
+        reported = self.reported.get(key) is not None
+        self.reported.set(key, True)
+        if not reported:
+            self.bursts[key[0]] += 1
+        return not reported
+
+    def stats(self):
+        return {
+            'messages': self.messages,
+            'bursts': dict(self.bursts),
+            'sketch_bytes': self.rates.nbytes() + self.repeats.nbytes(),
+            'reported_keys': len(self.reported),
+        }
@@ -0,0 +1,303 @@
+# columnar.py
+import json
+import logging
+import os
+import sys
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+
+logger = logging.getLogger('discord')
+
+# Each segment is a directory holding one little-endian file per column. Author and mentioned
+# user names are stored as ids into names.jsonl; each message's mentions and UTF-8 content are
+# concatenated in `mentions` and `content`, and `mention_count` / `content_length` say how much
+# of each belongs to every row. Files are only ever appended to, so a segment can be read while
+# it is being written.
+COLUMNS = {
+    'message_id': 'q',
+    'author_id': 'q',
+    'timestamp': 'q', # microseconds since the epoch, UTC
+    'author': 'i',
+    'mention_count': 'i',
+    'content_length': 'i',
+    'mentions': 'i',
+    'content': 'B',
+}
+ROW_COLUMNS = ['message_id', 'author_id', 'timestamp', 'author', 'mention_count', 'content_length']
+NAMES_FILE = 'names.jsonl'
+SEGMENT_PREFIX = 'seg-'
+DTYPES = {'q': '<i8', 'i': '<i4', 'B': 'u1'}
+
+
+def _width(column):
+    return array(COLUMNS[column]).itemsize
+
+
+def _column_path(segment, column):
+    return os.path.join(segment, column + '.' + COLUMNS[column])
+
+
+def _to_disk(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def segment_paths(path):
+    if not os.path.isdir(path):
+        return []
+    return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.startswith(SEGMENT_PREFIX)]
+
+
+def read_names(path, file_name=NAMES_FILE):
+    '''
+    The strings in a JSON-lines dictionary file, whose line numbers are their ids.
+    '''
+    names = []
+    names_path = os.path.join(path, file_name)
+    if os.path.isfile(names_path):
+        with open(names_path, encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break # cut off mid-write
+                names.append(json.loads(line))
+    return names
+
+
+def truncate_names(path, names, file_name=NAMES_FILE):
+    # Cuts off a line left half-written by a crash, so the next name appended gets the right id
+    names_path = os.path.join(path, file_name)
+    if os.path.isfile(names_path):
+        size = sum(len((json.dumps(name) + '\n').encode('utf-8')) for name in names)
+        if os.path.getsize(names_path) != size:
+            with open(names_path, 'r+b') as f:
+                f.truncate(size)
+
+
+def _read_array(segment, column, count=None):
+    values = array(COLUMNS[column])
+    file_path = _column_path(segment, column)
+    if os.path.isfile(file_path):
+        with open(file_path, 'rb') as f:
+            data = f.read() if count is None else f.read(count * values.itemsize)
+        values.frombytes(data[:len(data) - len(data) % values.itemsize])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def complete_rows(segment):
+    '''
+    The number of rows whose every column is fully on disk, and the matching lengths of the
+    `mentions` and `content` files.
+    '''
+    rows = min(_file_size(_column_path(segment, column)) // _width(column) for column in ROW_COLUMNS)
+    mention_counts = _read_array(segment, 'mention_count', rows)
+    content_lengths = _read_array(segment, 'content_length', rows)
+    mentions = _file_size(_column_path(segment, 'mentions')) // _width('mentions')
+    content = _file_size(_column_path(segment, 'content'))
+    needed_mentions, needed_content = sum(mention_counts), sum(content_lengths)
+    if needed_mentions <= mentions and needed_content <= content:
+        return rows, needed_mentions, needed_content
+    # The last batch was cut off part way through
+    mention_ends = list(accumulate(mention_counts, initial=0))
+    content_ends = list(accumulate(content_lengths, initial=0))
+    rows = min(rows, bisect_right(mention_ends, mentions) - 1, bisect_right(content_ends, content) - 1)
+    return rows, mention_ends[rows], content_ends[rows]
+
+
+def _file_size(file_path):
+    return os.path.getsize(file_path) if os.path.isfile(file_path) else 0
+
+
+def segment_number(segment):
+    return int(os.path.basename(segment)[len(SEGMENT_PREFIX):])
+
+
+def first_timestamp(segment):
+    '''
+    The segment's first timestamp in microseconds, or None if it is empty.
+    '''
+    values = _read_array(segment, 'timestamp', 1)
+    return values[0] if values else None
+
+
+def read_segment(segment, columns):
+    '''
+    The segment's complete rows as {column: array}, reading only `columns` and without NumPy.
+    '''
+    rows, mentions, content = complete_rows(segment)
+    counts = {'mentions': mentions, 'content': content}
+    return {column: _read_array(segment, column, counts.get(column, rows)) for column in columns}
+
+
+def read_segments(path, columns):
+    '''
+    Yields read_segment for every segment, for loading the in-memory indexes at startup.
+    '''
+    for segment in segment_paths(path):
+        yield read_segment(segment, columns)
+
+
+class HistoryWriter:
+    '''
+    Appends messages to the columnar history at `path`, starting a new segment every
+    `segment_rows` messages and, if `segment_seconds` is set, whenever a message falls in a later
+    `segment_seconds`-long period than the segment's first one, so old segments can be dropped
+    whole. Rows left half-written by a crash are cut off when it is reopened.
+    '''
+
+    def __init__(self, path, segment_rows=1000000, segment_seconds=None):
+        self.path = path
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        os.makedirs(path, exist_ok=True)
+        self.names = read_names(path)
+        self.name_ids = {name: i for i, name in enumerate(self.names)}
+        truncate_names(path, self.names)
+        self.names_file = open(os.path.join(path, NAMES_FILE), 'a', encoding='utf-8')
+        self.segment = None
+        self.rows = 0
+        self.period_end = None # the timestamp, in microseconds, at which the segment is rolled
+        self.files = {}
+        segments = segment_paths(path)
+        if segments:
+            self._open(segments[-1])
+        if self.segment is None or self.rows >= segment_rows:
+            self._roll()
+
+    def _open(self, segment):
+        self.close_segment()
+        rows, mentions, content = complete_rows(segment)
+        lengths = {'mentions': mentions * _width('mentions'), 'content': content}
+        for column in COLUMNS:
+            file_path = _column_path(segment, column)
+            f = open(file_path, 'ab')
+            f.truncate(lengths.get(column, rows * _width(column)))
+            self.files[column] = f
+        self.segment = segment
+        self.rows = rows
+        self.period_end = None
+        if rows and self.segment_seconds:
+            self._start_period(first_timestamp(segment))
+
+    def _roll(self):
+        number = 0
+        if self.segment is not None:
+            number = segment_number(self.segment) + 1
+        segment = os.path.join(self.path, f'{SEGMENT_PREFIX}{number:06d}')
+        os.makedirs(segment, exist_ok=True)
+        self._open(segment)
+
+    def _name_id(self, name, new_names):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+            new_names.append(name)
+        return name_id
+
+    def _start_period(self, timestamp):
+        period = self.segment_seconds * 1000000
+        self.period_end = (timestamp // period + 1) * period
+
+    def append(self, messages):
+        '''
+        Writes (message id, author id, author name, content, timestamp in microseconds, [mentioned
+        user names]) tuples.
+        '''
+        while messages:
+            batch = messages[:self.segment_rows - self.rows]
+            if self.segment_seconds:
+                if self.period_end is None:
+                    self._start_period(batch[0][4])
+                # messages arrive in time order, give or take a little
+                end = next((i for i, message in enumerate(batch) if message[4] >= self.period_end), len(batch))
+                if end == 0:
+                    self._roll()
+                    continue
+                batch = batch[:end]
+            messages = messages[len(batch):]
+            self._append(batch)
+            if self.rows >= self.segment_rows or messages and self.segment_seconds:
+                self._roll()
+
+    def _append(self, batch):
+        columns = {column: array(typecode) for column, typecode in COLUMNS.items()}
+        new_names = []
+        for message_id, author_id, author_name, content, timestamp, mention_names in batch:
+            encoded = content.encode('utf-8')
+            columns['message_id'].append(message_id)
+            columns['author_id'].append(author_id)
+            columns['timestamp'].append(timestamp)
+            columns['author'].append(self._name_id(author_name, new_names))
+            columns['mention_count'].append(len(mention_names))
+            columns['content_length'].append(len(encoded))
+            columns['mentions'].extend(self._name_id(name, new_names) for name in mention_names)
+            columns['content'].frombytes(encoded)
+        # Names go first, so every id on disk can be resolved
+        if new_names:
+            self.names_file.write(''.join(json.dumps(name) + '\n' for name in new_names))
+            self.names_file.flush()
+        for column, values in columns.items():
+            self.files[column].write(_to_disk(values).tobytes())
+            self.files[column].flush()
+        self.rows += len(batch)
+
+    def fsync(self):
+        os.fsync(self.names_file.fileno())
+        for f in self.files.values():
+            os.fsync(f.fileno())
+
+    def close_segment(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def close(self):
+        self.close_segment()
+        self.names_file.close()
+
+
+class HistoryReader:
+    '''
+    Memory-maps every segment of the columnar history with NumPy (which is only imported when a
+    reader is created). A reader sees the rows on disk when it was opened.
+    '''
+
+    def __init__(self, path):
+        import numpy as np
+        self.np = np
+        self.path = path
+        self.names = read_names(path)
+        self.segments = []
+        for segment in segment_paths(path):
+            rows, mentions, content = complete_rows(segment)
+            if rows == 0:
+                continue
+            lengths = {'mentions': mentions, 'content': content}
+            self.segments.append({column: self._map(segment, column, lengths.get(column, rows))
+                                  for column in COLUMNS})
+
+    def _map(self, segment, column, count):
+        if count == 0:
+            return self.np.zeros(0, DTYPES[COLUMNS[column]])
+        return self.np.memmap(_column_path(segment, column), DTYPES[COLUMNS[column]], 'r', shape=(count,))
+
+    def __len__(self):
+        return sum(len(segment['message_id']) for segment in self.segments)
+
+    def messages(self):
+        '''
+        Yields (message id, content, author name, timestamp in epoch seconds) for every message.
+        '''
+        for segment in self.segments:
+            ends = self.np.cumsum(segment['content_length']).tolist()
+            content = segment['content'].tobytes()
+            begin = 0
+            for message_id, author, timestamp, end in zip(segment['message_id'].tolist(), segment['author'].tolist(),
+                                                         segment['timestamp'].tolist(), ends):
+                yield message_id, content[begin:end].decode('utf-8'), self.names[author], timestamp / 1e6
+                begin = end
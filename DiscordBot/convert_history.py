@@ -0,0 +1,70 @@
+# convert_history.py
+# One-shot conversion of time_data.csv into the columnar history. The bot runs this itself on
+# startup when the history directory doesn't exist yet; run it by hand to convert ahead of time.
+#
+#   python convert_history.py --time-data ./time_data.csv --history ./history
+import argparse
+import ast
+import logging
+import time
+from columnar import HistoryWriter, segment_paths
+from history import parse_timestamp
+from message_store import read_rows
+
+
+logger = logging.getLogger('discord')
+
+BATCH_ROWS = 10000
+
+
+def parse_mentions(text):
+    # Stored as str() of a list of names
+    try:
+        names = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return []
+    return [str(name) for name in names if name != ""] if isinstance(names, list) else []
+
+
+def convert(time_path, history_path, segment_rows=1000000, segment_seconds=None):
+    '''
+    Writes every readable row of `time_path` to a new columnar history at `history_path` and
+    returns the number of messages converted.
+    '''
+    if segment_paths(history_path):
+        raise ValueError(f"{history_path} already holds a history")
+    start = time.perf_counter()
+    writer = HistoryWriter(history_path, segment_rows, segment_seconds)
+    batch = []
+    converted = 0
+    try:
+        for row in read_rows(time_path):
+            try:
+                batch.append((int(row['message_id']), int(row['message_author_id']), row['message_author_name'],
+                              row['message_content'], round(parse_timestamp(row['message_timestamp']) * 1e6),
+                              parse_mentions(row['message_mentions'])))
+            except ValueError:
+                continue # rows mangled by the old unescaped writer
+            if len(batch) >= BATCH_ROWS:
+                writer.append(batch)
+                converted += len(batch)
+                batch = []
+        writer.append(batch)
+        converted += len(batch)
+        writer.fsync()
+    finally:
+        writer.close()
+    logger.info("Converted %d messages from %s to %s in %.1fs", converted, time_path, history_path,
+                time.perf_counter() - start)
+    return converted
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--time-data', default='./time_data.csv')
+    parser.add_argument('--history', default='./history')
+    parser.add_argument('--segment-rows', type=int, default=1000000)
+    parser.add_argument('--segment-seconds', type=int, default=24 * 60 * 60)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(f"{convert(args.time_data, args.history, args.segment_rows, args.segment_seconds)} messages converted")
@@ -0,0 +1,83 @@
+# edits.py
+import asyncio
+import logging
+import time
+from lru import LRUCache
+from verdict_cache import normalize_key_text
+
+
+logger = logging.getLogger('discord')
+
+
+class EditPipeline:
+    '''
+    Collapses bursts of edits to the same message. The edit is handled once the message has been
+    quiet for `delay` seconds (or `max_wait` seconds after the first edit, whichever comes first),
+    and is only rescored when its normalized text differs from the last version we scored (using
+    the same comparison as the verdict cache, so whitespace and case edits don't count).
+    '''
+
+    def __init__(self, normalizer, on_changed, delay=2.0, max_wait=10.0, maxsize=100000):
+        self.normalizer = normalizer
+        self.on_changed = on_changed
+        self.delay = delay
+        self.max_wait = max_wait
+        self.last_text = LRUCache(maxsize) # message id -> last normalized text
+        self.pending = {} # message id -> [latest message, first edit time, last edit time]
+        self.tasks = set() # one per pending message; the loop only keeps weak references
+        self.received = 0
+        self.collapsed = 0
+        self.unchanged = 0
+        self.rescored = 0
+
+    def remember(self, message_id, text):
+        self.last_text.set(message_id, normalize_key_text(text))
+
+    def submit(self, message):
+        self.received += 1
+        now = time.monotonic()
+        entry = self.pending.get(message.id)
+        if entry is not None:
+            # A later edit supersedes the one still waiting
+            self.collapsed += 1
+            entry[0] = message
+            entry[2] = now
+            return
+        self.pending[message.id] = [message, now, now]
+        task = asyncio.create_task(self._settle(message.id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _settle(self, message_id):
+        while True:
+            message, first, last = self.pending[message_id]
+            wait = min(first + self.max_wait, last + self.delay) - time.monotonic()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        message = self.pending.pop(message_id)[0]
+        try:
+            context = await self.normalizer.normalize(message)
+            if self.last_text.get(message_id) == normalize_key_text(context.text):
+                self.unchanged += 1
+                return
+            self.remember(message_id, context.text)
+            self.rescored += 1
+            await self.on_changed(message, context)
+        except Exception:
+            logger.exception("Failed to handle edit of message %s", message_id)
+
+    async def close(self):
+        # Edits still settling at shutdown are dropped rather than scored against closing services
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            'edits': self.received,
+            'collapsed': self.collapsed,
+            'scoring_avoided': self.collapsed + self.unchanged,
+            'rescored': self.rescored,
+            'pending': len(self.pending),
+        }
@@ -0,0 +1,55 @@
+# event_filter.py
+import time
+from collections import deque
+
+
+class EventFilter:
+    '''
+    Decides from the ids in a raw gateway payload whether an event is worth any work, before the
+    bot makes a single REST call. Keeps per-minute counts of events dropped and REST calls saved.
+    '''
+
+    def __init__(self, window_minutes=60):
+        self.seen = {}
+        self.dropped = {}
+        self.rest_saved = 0
+        self.minutes = deque(maxlen=window_minutes) # [minute, dropped, rest calls saved]
+
+    def _minute(self):
+        minute = int(time.time() // 60)
+        if not self.minutes or self.minutes[-1][0] != minute:
+            self.minutes.append([minute, 0, 0])
+        return self.minutes[-1]
+
+    def allow(self, event, channel_id, channel_ids):
+        '''
+        Returns True if `channel_id` is one of `channel_ids`; otherwise counts the event as dropped.
+        '''
+        self.seen[event] = self.seen.get(event, 0) + 1
+        if channel_id in channel_ids:
+            return True
+        self.dropped[event] = self.dropped.get(event, 0) + 1
+        self._minute()[1] += 1
+        return False
+
+    def drop(self, event):
+        '''
+        Counts an event that passed allow() but turned out to be irrelevant.
+        '''
+        self.dropped[event] = self.dropped.get(event, 0) + 1
+        self._minute()[1] += 1
+
+    def saved_rest_call(self, count=1):
+        self.rest_saved += count
+        self._minute()[2] += count
+
+    def stats(self):
+        # The current minute is still filling up, so rates use the completed ones
+        complete = list(self.minutes)[:-1]
+        return {
+            'seen': dict(self.seen),
+            'dropped': dict(self.dropped),
+            'rest_calls_saved': self.rest_saved,
+            'dropped_per_minute': round(sum(m[1] for m in complete) / len(complete), 1) if complete else 0.0,
+            'rest_saved_per_minute': round(sum(m[2] for m in complete) / len(complete), 1) if complete else 0.0,
+        }
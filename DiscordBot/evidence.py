@@ -0,0 +1,68 @@
+# evidence.py
+import asyncio
+import logging
+from lru import LRUCache
+from metrics import NO_METRICS
+
+
+logger = logging.getLogger('discord')
+
+
+class Evidence:
+    '''
+    Lookups about one reported message, running in the background while the reporter answers the
+    rest of the questionnaire.
+    '''
+
+    def __init__(self, tasks):
+        self.tasks = tasks # name -> task
+
+    async def collect(self, timeout=None):
+        '''
+        Waits up to `timeout` seconds and returns {name: result}, with None for lookups that failed
+        or haven't finished. Unfinished lookups keep running for later reports of the same message.
+        '''
+        pending = [task for task in self.tasks.values() if not task.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+        return {name: task.result() if task.done() and not task.cancelled() else None
+                for name, task in self.tasks.items()}
+
+
+class EvidenceCache:
+    '''
+    Starts every lookup in `gatherers` ({name: async fn(message)}) for a reported message once,
+    and hands the same Evidence to later reports of that message for `ttl` seconds.
+    '''
+
+    def __init__(self, gatherers, maxsize=1000, ttl=10 * 60, metrics=None):
+        self.gatherers = gatherers
+        self.entries = LRUCache(maxsize, ttl)
+        self.metrics = metrics or NO_METRICS
+        self.started = 0
+        self.reused = 0
+
+    def start(self, message):
+        evidence = self.entries.get(message.id)
+        if evidence is not None:
+            self.reused += 1
+            self.metrics.count('evidence_reused')
+            return evidence
+        self.started += 1
+        self.metrics.count('evidence_started')
+        evidence = Evidence({name: asyncio.create_task(self._gather(name, fn, message))
+                             for name, fn in self.gatherers.items()})
+        self.entries.set(message.id, evidence)
+        return evidence
+
+    async def _gather(self, name, fn, message):
+        # A failed lookup is left out of the post rather than holding up the report
+        try:
+            with self.metrics.timer(f'evidence_{name}'):
+                return await fn(message)
+        except Exception:
+            logger.exception("Evidence lookup %r failed for message %s", name, message.id)
+            return None
+
+    def stats(self):
+        return {'started': self.started, 'reused': self.reused, 'cached': len(self.entries)}
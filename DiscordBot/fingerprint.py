@@ -0,0 +1,153 @@
+# fingerprint.py
+import zlib
+import numpy as np
+from verdict_cache import content_key, normalize_key_text
+from history import message_timestamp
+
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+class MinHasher:
+    '''
+    MinHash signatures over character shingles, with all permutations applied at once in NumPy.
+    '''
+
+    def __init__(self, num_perm=64, shingle=5, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.a = rng.randint(1, MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def signature(self, normalized_text):
+        k = self.shingle
+        shingles = {normalized_text[i:i + k] for i in range(max(1, len(normalized_text) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+class ContentIndex:
+    '''
+    Maps each normalized message text (by hash) to how many times each author posted it and when
+    they first and last did. An LSH index over MinHash signatures finds lightly mutated copies,
+    so lookups don't depend on how much history has been recorded.
+    '''
+
+    def __init__(self, num_perm=64, bands=16, shingle=5):
+        self.hasher = MinHasher(num_perm, shingle)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.authors = {} # content key -> {author name: [count, first_seen, last_seen]}
+        self.signatures = {} # content key -> MinHash signature
+        self.buckets = {} # (band, band hash) -> set of content keys
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, text, author_name, timestamp, count=1, last=None, key=None):
+        '''
+        Counts `count` copies of `text` by the author, posted from `timestamp` to `last`.
+        '''
+        last = timestamp if last is None else last
+        key = key or content_key(text)
+        counts = self.authors.get(key)
+        if counts is None:
+            counts = self.authors[key] = {}
+            signature = self.hasher.signature(normalize_key_text(text))
+            self.signatures[key] = signature
+            for band_key in self._band_keys(signature):
+                self.buckets.setdefault(band_key, set()).add(key)
+        entry = counts.get(author_name)
+        if entry is None:
+            counts[author_name] = [count, timestamp, last]
+        else:
+            entry[0] += count
+            entry[1] = min(entry[1], timestamp)
+            entry[2] = max(entry[2], last)
+
+    def add_message(self, message):
+        self.add(message.content, message.author.name, message_timestamp(message))
+
+    def load_messages(self, messages):
+        '''
+        Indexes (message id, content, author name, timestamp) tuples from columnar.HistoryReader.
+        '''
+        for message_id, content, author_name, timestamp in messages:
+            self.add(content, author_name, timestamp)
+        return self
+
+    def load_rollups(self, contents):
+        '''
+        Indexes the rolled-up (text, author name, count, first, last) of retention.read_content.
+        '''
+        keys = {} # the same few texts come up for many authors
+        for text, author_name, count, first, last in contents:
+            key = keys.get(text)
+            if key is None:
+                key = keys[text] = content_key(text)
+            self.add(text, author_name, first, count, last, key)
+        return self
+
+    def expire(self, cutoff, keys=None):
+        '''
+        Drops texts nobody has posted since `cutoff` (epoch seconds), looking at `keys` or every
+        text. A text still being posted keeps its older counts. Returns the number dropped.
+        '''
+        expired = 0
+        for key in list(self.authors) if keys is None else keys:
+            counts = self.authors.get(key)
+            if counts is None or max(last for count, first, last in counts.values()) >= cutoff:
+                continue
+            del self.authors[key]
+            for band_key in self._band_keys(self.signatures.pop(key)):
+                bucket = self.buckets[band_key]
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+            expired += 1
+        return expired
+
+    def similar(self, text, threshold=0.8):
+        '''
+        Returns the content keys whose estimated Jaccard similarity to `text` is at least
+        `threshold`, including the exact match if there is one.
+        '''
+        key = content_key(text)
+        signature = self.signatures.get(key)
+        if signature is None:
+            signature = self.hasher.signature(normalize_key_text(text))
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates |= self.buckets.get(band_key, set())
+        candidates.discard(key)
+        matches = [key] if key in self.authors else []
+        if candidates:
+            candidates = list(candidates)
+            similarity = (np.stack([self.signatures[c] for c in candidates]) == signature).mean(axis=1)
+            matches.extend(c for c, s in zip(candidates, similarity) if s >= threshold)
+        return matches
+
+    def author_counts(self, text, threshold=None):
+        '''
+        Returns {author name: [count, first_seen, last_seen]} for exact copies of `text`, or for
+        every near-duplicate at or above `threshold` similarity if one is given.
+        '''
+        keys = [content_key(text)] if threshold is None else self.similar(text, threshold)
+        merged = {}
+        for key in keys:
+            for author, (count, first, last) in self.authors.get(key, {}).items():
+                if author in merged:
+                    entry = merged[author]
+                    entry[0] += count
+                    entry[1] = min(entry[1], first)
+                    entry[2] = max(entry[2], last)
+                else:
+                    merged[author] = [count, first, last]
+        return merged
+
+    def __len__(self):
+        return len(self.authors)
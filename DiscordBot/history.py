@@ -0,0 +1,217 @@
+# history.py
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+
+
+BUCKET_SECONDS = {'minute': 60, 'hour': 60 * 60, 'day': 24 * 60 * 60}
+
+
+def parse_timestamp(text):
+    '''
+    Parses a stored message timestamp (str(message.created_at)) into epoch seconds. Older rows
+    have no UTC offset; they were recorded from discord.py's naive UTC datetimes.
+    '''
+    moment = datetime.fromisoformat(text.strip())
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def message_timestamp(message):
+    created_at = message.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.timestamp()
+
+
+def to_datetime(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+def _append_sorted(values, value):
+    # Messages almost always arrive in time order, so this is nearly always a plain append
+    if not values or values[-1] <= value:
+        values.append(value)
+    else:
+        insort(values, value)
+
+
+class HistoryIndex:
+    '''
+    In-memory index of when each message was sent: a sorted array of timestamps per author and
+    one sorted array for the whole channel. Looking up an author costs time proportional to that
+    author's own message count, however long the channel history is. Messages older than the
+    retention window are kept only as hourly counts per author (see retention.py).
+    '''
+
+    def __init__(self):
+        self.by_author = {} # author id -> array of epoch seconds, sorted
+        self.timestamps = array('d') # every message, sorted
+        self.rolled = {} # author id -> (array of hour starts, sorted, array of counts)
+        self.rolled_before = 0.0 # timestamps before this are only in the hourly counts
+
+    def add(self, author_id, timestamp):
+        if timestamp < self.rolled_before:
+            return # an edit of a message that has already been rolled up
+        author_id = int(author_id)
+        times = self.by_author.get(author_id)
+        if times is None:
+            times = self.by_author[author_id] = array('d')
+        else:
+            # An edited message comes through again with its original timestamp; count it once
+            i = bisect_left(times, timestamp)
+            if i < len(times) and times[i] == timestamp:
+                return
+        _append_sorted(times, timestamp)
+        _append_sorted(self.timestamps, timestamp)
+
+    def add_message(self, message):
+        self.add(message.author.id, message_timestamp(message))
+
+    def load_segments(self, segments):
+        '''
+        Indexes the author_id and timestamp columns of columnar.read_segments.
+        '''
+        for segment in segments:
+            for author_id, timestamp in zip(segment['author_id'], segment['timestamp']):
+                self.add(author_id, timestamp / 1e6)
+        return self
+
+    def add_hourly(self, author_id, hour, count):
+        hours, counts = self.rolled.get(author_id) or self.rolled.setdefault(author_id, (array('d'), array('i')))
+        if hours and hours[-1] == hour:
+            counts[-1] += count
+        elif not hours or hours[-1] < hour:
+            hours.append(hour)
+            counts.append(count)
+        else:
+            i = bisect_left(hours, hour)
+            if hours[i] == hour:
+                counts[i] += count
+            else:
+                hours.insert(i, hour)
+                counts.insert(i, count)
+
+    def load_rollups(self, parts):
+        '''
+        Adds the hourly counts of retention.read_hourly, whose rows are sorted by author and hour.
+        '''
+        for author_ids, hours, counts in parts:
+            i = 0
+            while i < len(author_ids):
+                author_id = author_ids[i]
+                end = bisect_right(author_ids, author_id, i)
+                rolled = self.rolled.get(author_id)
+                if rolled is None:
+                    self.rolled[author_id] = (array('d', hours[i:end]), counts[i:end])
+                elif rolled[0][-1] < hours[i]:
+                    # parts are loaded oldest first, so this is the usual case
+                    rolled[0].extend(array('d', hours[i:end]))
+                    rolled[1].extend(counts[i:end])
+                else:
+                    for hour, count in zip(hours[i:end], counts[i:end]):
+                        self.add_hourly(author_id, hour, count)
+                i = end
+        return self
+
+    def compact(self, before, author_ids=None):
+        '''
+        Replaces the timestamps older than `before` with hourly counts, for `author_ids` or everyone.
+        '''
+        self.rolled_before = max(self.rolled_before, before)
+        for author_id in list(self.by_author) if author_ids is None else author_ids:
+            times = self.by_author.get(author_id)
+            if not times or times[0] >= before:
+                continue
+            old = bisect_left(times, before)
+            for t in times[:old]:
+                self.add_hourly(author_id, t - t % 3600, 1)
+            if old == len(times):
+                del self.by_author[author_id]
+            else:
+                del times[:old]
+        del self.timestamps[:bisect_left(self.timestamps, self.rolled_before)]
+
+    def first_seen(self, author_id):
+        times = self.by_author.get(int(author_id))
+        rolled = self.rolled.get(int(author_id))
+        firsts = ([times[0]] if times else []) + ([rolled[0][0]] if rolled else [])
+        return min(firsts) if firsts else None
+
+    def author_times(self, author_id, start=None, end=None):
+        '''
+        Returns the author's message timestamps (epoch seconds) in [start, end], within the
+        retention window.
+        '''
+        times = self.by_author.get(int(author_id))
+        if not times:
+            return []
+        lo = 0 if start is None else bisect_left(times, start)
+        hi = len(times) if end is None else bisect_right(times, end)
+        return times[lo:hi].tolist()
+
+    def count_between(self, start, end):
+        return bisect_right(self.timestamps, end) - bisect_left(self.timestamps, start)
+
+    def histogram(self, author_id, bucket='hour', start=None, end=None):
+        '''
+        Counts the author's messages per minute, hour or day. Returns a list of
+        (bucket start in epoch seconds, count) pairs, oldest first, omitting empty buckets.
+        Rolled-up messages count at the start of their hour.
+        '''
+        width = BUCKET_SECONDS[bucket]
+        counts = []
+        rolled = self.rolled.get(int(author_id))
+        if rolled:
+            hours, hour_counts = rolled
+            lo = 0 if start is None else bisect_left(hours, start - start % 3600)
+            hi = len(hours) if end is None else bisect_right(hours, end)
+            for hour, count in zip(hours[lo:hi], hour_counts[lo:hi]):
+                bucket_start = hour - hour % width
+                if counts and counts[-1][0] == bucket_start:
+                    counts[-1][1] += count
+                else:
+                    counts.append([bucket_start, count])
+        for t in self.author_times(author_id, start, end):
+            bucket_start = t - t % width
+            if counts and counts[-1][0] == bucket_start:
+                counts[-1][1] += 1
+            else:
+                counts.append([bucket_start, 1])
+        return [tuple(c) for c in counts]
+
+    def pick_bucket(self, author_id):
+        '''
+        The finest bucket size that keeps the author's histogram to a readable number of bars.
+        '''
+        times = self.by_author.get(int(author_id))
+        first = self.first_seen(author_id)
+        if first is None:
+            return 'hour'
+        span = (times[-1] if times else self.rolled[int(author_id)][0][-1]) - first
+        if span <= 3 * 60 * 60:
+            return 'minute'
+        if span <= 7 * 24 * 60 * 60:
+            return 'hour'
+        return 'day'
+
+    def summary(self, author_id, now):
+        '''
+        The author's message counts over the last hour, day and week and in total, and when
+        they were first seen (None if never).
+        '''
+        times = self.by_author.get(int(author_id)) or array('d')
+        hours, hour_counts = self.rolled.get(int(author_id)) or (array('d'), array('i'))
+        if not times and not hours:
+            return {'hour': 0, 'day': 0, 'week': 0, 'total': 0, 'first': None}
+        # Rolled-up hours count in full if they started inside the window
+        counts = {name: len(times) - bisect_left(times, now - seconds) +
+                        sum(hour_counts[bisect_left(hours, now - seconds):])
+                  for name, seconds in [('hour', BUCKET_SECONDS['hour']), ('day', BUCKET_SECONDS['day']),
+                                        ('week', 7 * BUCKET_SECONDS['day'])]}
+        counts.update(total=len(times) + sum(hour_counts), first=self.first_seen(author_id))
+        return counts
+
+    def __len__(self):
+        return len(self.timestamps)
@@ -0,0 +1,122 @@
+# lanes.py
+import asyncio
+import time
+from collections import deque
+from metrics import NO_METRICS
+
+
+# Lanes in priority order
+MODERATOR = 0 # moderator reactions and user report DMs
+FLAGGED = 1   # posts to the mod channel
+BULK = 2      # scoring every channel message, analytics
+LANE_NAMES = ['moderator', 'flagged', 'bulk']
+
+
+class LaneScheduler:
+    '''
+    Runs jobs from three queues on a fixed set of workers, always taking the highest-priority job
+    that may start. `lane_limits` caps how many workers a lane can occupy; keeping the bulk lane's
+    limit below `concurrency` means moderator jobs never wait behind scoring for a free worker.
+
+    Each lane holds at most `max_queued` jobs. When a lane is full, its oldest sheddable job is
+    dropped (or the new one, if it is sheddable and the head isn't); other jobs are still queued.
+    '''
+
+    def __init__(self, concurrency=128, lane_limits=(None, None, 96), max_queued=(1000, 1000, 5000), metrics=None):
+        if lane_limits[BULK] is None or lane_limits[BULK] >= concurrency:
+            raise ValueError("the bulk lane must leave workers free for the other lanes")
+        self.concurrency = concurrency
+        self.lane_limits = lane_limits
+        self.max_queued = max_queued
+        self.metrics = metrics or NO_METRICS
+        self.lanes = [deque() for _ in LANE_NAMES]
+        self.running = [0] * len(LANE_NAMES)
+        self.completed = [0] * len(LANE_NAMES)
+        self.shed = [0] * len(LANE_NAMES)
+        self.workers = []
+        self.wakeup = None
+
+    def _ensure_started(self):
+        if not self.workers:
+            self.wakeup = asyncio.Event()
+            self.workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    def submit(self, lane, fn, *args, sheddable=False):
+        '''
+        Queues `fn(*args)` and returns a future for its result. A shed job's future resolves to None.
+        '''
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        job = (fn, args, sheddable, future, time.perf_counter())
+        queue = self.lanes[lane]
+        if len(queue) >= self.max_queued[lane]:
+            if queue[0][2]:
+                self._shed(lane, queue.popleft())
+            elif sheddable:
+                self._shed(lane, job)
+                return future
+        queue.append(job)
+        self.wakeup.set()
+        return future
+
+    async def run(self, lane, fn, *args, sheddable=False):
+        return await self.submit(lane, fn, *args, sheddable=sheddable)
+
+    def _shed(self, lane, job):
+        self.shed[lane] += 1
+        self.metrics.count(f'shed_{LANE_NAMES[lane]}')
+        future = job[3]
+        if not future.done():
+            future.set_result(None)
+
+    def _next(self):
+        for lane, queue in enumerate(self.lanes):
+            limit = self.lane_limits[lane]
+            if queue and (limit is None or self.running[lane] < limit):
+                return lane, queue.popleft()
+        return None, None
+
+    async def _work(self):
+        while True:
+            lane, job = self._next()
+            if job is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            fn, args, sheddable, future, queued = job
+            if future.done():
+                continue
+            self.metrics.observe(f'lane_wait_{LANE_NAMES[lane]}', time.perf_counter() - queued)
+            self.running[lane] += 1
+            try:
+                result = await fn(*args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.running[lane] -= 1
+                self.completed[lane] += 1
+                # a lane that was at its limit may be able to start another job
+                self.wakeup.set()
+
+    def depths(self):
+        return {name: len(queue) for name, queue in zip(LANE_NAMES, self.lanes)}
+
+    def stats(self):
+        return {
+            name: {'queued': len(self.lanes[lane]), 'running': self.running[lane],
+                   'completed': self.completed[lane], 'shed': self.shed[lane]}
+            for lane, name in enumerate(LANE_NAMES)
+        }
+
+    async def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        for queue in self.lanes:
+            while queue:
+                future = queue.popleft()[3]
+                if not future.done():
+                    future.cancel()
@@ -0,0 +1,89 @@
+# lru.py
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    '''
+    A size-capped mapping that evicts the least recently used entry and, if `ttl` is set, treats
+    entries older than `ttl` seconds as missing.
+    '''
+
+    def __init__(self, maxsize=10000, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict() # key -> (value, stored_at)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        entry = self.data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, stored_at = entry
+        if self._expired(stored_at, time.time()):
+            del self.data[key]
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, stored_at=None):
+        self.data[key] = (value, time.time() if stored_at is None else stored_at)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def touch(self, key):
+        '''
+        Restarts the ttl of `key` without counting a hit.
+        '''
+        entry = self.data.get(key)
+        if entry is not None:
+            self.data[key] = (entry[0], time.time())
+            self.data.move_to_end(key)
+
+    def pop(self, key, default=None):
+        entry = self.data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def expire(self):
+        '''
+        Drops every expired entry and returns how many were dropped.
+        '''
+        if self.ttl is None:
+            return 0
+        now = time.time()
+        stale = [key for key, (_, stored_at) in self.data.items() if self._expired(stored_at, now)]
+        for key in stale:
+            del self.data[key]
+        return len(stale)
+
+    def items(self):
+        now = time.time()
+        return [(key, value, stored_at) for key, (value, stored_at) in self.data.items()
+                if not self._expired(stored_at, now)]
+
+    def __contains__(self, key):
+        entry = self.data.get(key)
+        return entry is not None and not self._expired(entry[1], time.time())
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
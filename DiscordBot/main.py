@@ -0,0 +1,59 @@
+# main.py
+# Entry point: sets up logging, reads tokens.json and connects to Discord. bot.py only defines the
+# bot, so it can be imported by benchmarks and worker processes without connecting.
+import argparse
+import json
+import logging
+import os
+from bot import ModBot, ShardedModBot
+
+
+logger = logging.getLogger('discord')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sharded', action='store_true', help="connect with AutoShardedClient")
+    parser.add_argument('--shard-count', type=int, help="total shards across all processes")
+    parser.add_argument('--shard-ids', help="comma-separated shards for this process to run")
+    parser.add_argument('--analysis-workers', type=int, default=0,
+                        help="worker processes for normalization and the pre-filter")
+    return parser.parse_args(argv)
+
+
+def load_tokens(token_path='tokens.json'):
+    # There should be a file called 'token.json' inside the same folder as this file
+    if not os.path.isfile(token_path):
+        raise Exception(f"{token_path} not found!")
+    with open(token_path) as f:
+        # If you get an error here, it means your token is formatted incorrectly. Did you put it in quotes?
+        tokens = json.load(f)
+        return tokens['discord'], tokens['perspective']
+
+
+def make_client(perspective_key, args):
+    if args.sharded or args.shard_count or args.shard_ids:
+        shard_ids = [int(i) for i in args.shard_ids.split(',')] if args.shard_ids else None
+        return ShardedModBot(perspective_key, analysis_workers=args.analysis_workers,
+                             shard_count=args.shard_count, shard_ids=shard_ids)
+    return ModBot(perspective_key, analysis_workers=args.analysis_workers)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Set up logging to the console
+    logger.setLevel(logging.DEBUG)
+    # Append, so a restart doesn't wipe the log from before it
+    handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='a')
+    handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
+    logger.addHandler(handler)
+
+    discord_token, perspective_key = load_tokens()
+    client = make_client(perspective_key, args)
+    client.run(discord_token)
+
+
+# Render and analysis workers re-import the main module, so only the main process may connect
+if __name__ == '__main__':
+    main()
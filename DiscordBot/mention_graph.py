@@ -0,0 +1,142 @@
+# mention_graph.py
+import asyncio
+import json
+import logging
+import os
+from columnar import read_segments, read_names
+from retention import read_edges
+
+
+logger = logging.getLogger('discord')
+
+
+class MentionGraph:
+    '''
+    A live, weighted "who mentions whom" graph keyed by user name, updated as messages arrive.
+    Analysis pulls a small neighbourhood around one user instead of the whole server.
+    '''
+
+    def __init__(self):
+        self.out_edges = {} # source -> {target: weight}
+        self.in_edges = {} # target -> {source: weight}
+        self.edge_count = 0
+        self.last_message_id = 0
+
+    def add(self, source, target, weight=1):
+        targets = self.out_edges.setdefault(source, {})
+        if target not in targets:
+            self.edge_count += 1
+        targets[target] = targets.get(target, 0) + weight
+        sources = self.in_edges.setdefault(target, {})
+        sources[source] = sources.get(source, 0) + weight
+
+    def add_message(self, message):
+        # Messages can arrive out of id order (translation runs in a thread), so every one counts;
+        # the id only tells a snapshot where to be topped up from
+        for m in message.mentions:
+            if m.name != "":
+                self.add(message.author.name, m.name)
+        self.last_message_id = max(self.last_message_id, message.id)
+
+    def load_segments(self, segments, names):
+        '''
+        Adds the mentions in columnar.read_segments (message_id, author, mention_count and
+        mentions columns) from messages newer than the last one already in the graph.
+        '''
+        newest = self.last_message_id
+        for segment in segments:
+            mentions = iter(segment['mentions'])
+            for message_id, author, count in zip(segment['message_id'], segment['author'], segment['mention_count']):
+                targets = [next(mentions) for _ in range(count)]
+                if message_id > self.last_message_id:
+                    for target in targets:
+                        self.add(names[author], names[target])
+                    newest = max(newest, message_id)
+        self.last_message_id = newest
+        return self
+
+    def neighbours(self, node):
+        # Undirected view, heaviest connections first
+        weights = dict(self.out_edges.get(node, {}))
+        for other, weight in self.in_edges.get(node, {}).items():
+            weights[other] = weights.get(other, 0) + weight
+        return sorted(weights, key=weights.get, reverse=True)
+
+    def ego(self, node, hops=2, max_nodes=50):
+        '''
+        Returns the weighted edges [(source, target, weight)] among the users within `hops`
+        mentions of `node`, expanding heaviest connections first and stopping at `max_nodes` users.
+        '''
+        included = {node}
+        frontier = [node]
+        for _ in range(hops):
+            next_frontier = []
+            for current in frontier:
+                for other in self.neighbours(current):
+                    if len(included) >= max_nodes:
+                        break
+                    if other not in included:
+                        included.add(other)
+                        next_frontier.append(other)
+            frontier = next_frontier
+            if not frontier or len(included) >= max_nodes:
+                break
+        return [(source, target, weight)
+                for source in included
+                for target, weight in self.out_edges.get(source, {}).items()
+                if target in included]
+
+    def to_json(self):
+        return json.dumps({'last_message_id': self.last_message_id, 'edges': self.out_edges})
+
+    @classmethod
+    def from_file(cls, path):
+        graph = cls()
+        with open(path) as f:
+            saved = json.load(f)
+        for source, targets in saved['edges'].items():
+            for target, weight in targets.items():
+                graph.add(source, target, weight)
+        graph.last_message_id = saved['last_message_id']
+        return graph
+
+    def save(self, path):
+        self._write(path, self.to_json())
+
+    async def snapshot_periodically(self, path, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Serialize on the loop so the graph isn't mutated mid-dump, write in a thread
+                data = self.to_json()
+                await asyncio.to_thread(self._write, path, data)
+            except OSError:
+                logger.exception("Failed to snapshot the mention graph")
+
+    @staticmethod
+    def _write(path, data):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+def load_mention_graph(snapshot_path, history_path, rollup_path=None):
+    '''
+    Starts from the snapshot if there is one, or else from the mention edges rolled up out of the
+    history, then adds any newer messages from the columnar history.
+    '''
+    graph = None
+    names = read_names(history_path)
+    if snapshot_path and os.path.isfile(snapshot_path):
+        try:
+            graph = MentionGraph.from_file(snapshot_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Rebuilding mention graph, snapshot %s unreadable: %r", snapshot_path, e)
+    if graph is None:
+        graph = MentionGraph()
+        if rollup_path:
+            for source, target, weight in read_edges(rollup_path, names):
+                graph.add(source, target, weight)
+    return graph.load_segments(read_segments(history_path, ['message_id', 'author', 'mention_count', 'mentions']),
+                               names)
@@ -0,0 +1,259 @@
+# message_store.py
+import asyncio
+import csv
+import logging
+import os
+import time
+from metrics import NO_METRICS
+from columnar import HistoryWriter
+from history import message_timestamp, parse_timestamp
+
+
+logger = logging.getLogger('discord')
+
+FIELDS = ['message_id', 'message_author_id', 'message_author_name', 'message_content',
+          'message_timestamp', 'message_mentions', 'count']
+# Edits are recorded as revisions of the original row rather than as new messages
+REVISION_FIELDS = ['message_id', 'message_author_id', 'message_content', 'edited_timestamp']
+
+# fsync policies: leave it to the OS, fsync after every batch, or fsync at most once a second
+FSYNC_NONE = 'none'
+FSYNC_BATCH = 'batch'
+FSYNC_SECOND = 'second'
+
+
+def read_rows(path, fields=FIELDS):
+    '''
+    Yields each row of a message file as a dict keyed by `fields`. Rows written by the store are
+    quoted, so tabs and newlines inside message content come back intact.
+    '''
+    if not os.path.isfile(path):
+        return
+    with open(path, newline='') as f:
+        reader = csv.reader(f, delimiter='\t')
+        next(reader, None) # header
+        for row in reader:
+            if len(row) >= len(fields):
+                yield dict(zip(fields, row))
+
+
+class MessageFile:
+    '''
+    One append-only tab-separated file, kept open between batches.
+    '''
+
+    def __init__(self, path, fields=FIELDS):
+        self.path = path
+        new = not os.path.isfile(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='', encoding='utf-8')
+        # The trailing empty column matches the layout the analytics code has always read
+        self.writer = csv.writer(self.file, delimiter='\t', lineterminator='\n')
+        if new:
+            self.writer.writerow(fields + [''])
+
+    def write(self, rows):
+        self.writer.writerows(row + [''] for row in rows)
+        self.file.flush()
+
+    def fsync(self):
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class MessageStore:
+    '''
+    Records every guild message and its mentions, in the columnar history at `history_path` if
+    it is set or else in time_data.csv and network_data.csv, and every rescored edit in
+    revisions.csv. The bot only reads the tab-separated files to convert them once, so with a
+    history they are not written any more. Rows are buffered in memory and written by a background task
+    when `max_buffer` rows are waiting or every `flush_interval` seconds, with the file I/O done
+    in a worker thread. `trim` drops rows older than the retention window from the files,
+    including whatever was in them before the history took over.
+    '''
+
+    def __init__(self, time_path='./time_data.csv', network_path='./network_data.csv',
+                 revision_path='./revisions.csv', max_buffer=500, flush_interval=1.0, fsync=FSYNC_SECOND,
+                 history_path=None, segment_rows=1000000, segment_seconds=None, metrics=None):
+        self.time_path = time_path
+        self.network_path = network_path
+        self.revision_path = revision_path
+        self.history_path = history_path
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync
+        self.metrics = metrics or NO_METRICS
+        self.time_rows = []
+        self.network_rows = []
+        self.revision_rows = []
+        self.history_rows = []
+        self.files = None
+        self.history = None
+        self.flusher = None
+        self.wakeup = None
+        self.lock = None
+        self.last_fsync = 0.0
+        self.rows_written = 0
+        self.flushes = 0
+        self.rows_trimmed = 0
+
+    def _ensure_started(self):
+        if self.flusher is None or self.flusher.done():
+            self.wakeup = asyncio.Event()
+            self.lock = asyncio.Lock()
+            self.flusher = asyncio.create_task(self._run())
+
+    def record(self, message):
+        '''
+        Buffers the rows for a message. Never blocks; the background task writes them.
+        '''
+        self._ensure_started()
+        if self.history_path:
+            self.history_rows.append((message.id, message.author.id, message.author.name, message.content,
+                                      round(message_timestamp(message) * 1e6), [m.name for m in message.mentions if m.name != ""]))
+        else:
+            base = [str(message.id), str(message.author.id), message.author.name, message.content, str(message.created_at)]
+            self.time_rows.append(base + [str([m.name for m in message.mentions]), "1"])
+            for m in message.mentions:
+                if m.name != "":
+                    self.network_rows.append(base + [str(m.name), "1"])
+        if self.buffered() >= self.max_buffer:
+            self.wakeup.set()
+
+    def buffered(self):
+        # Messages and revisions waiting to be written
+        return len(self.time_rows) + len(self.history_rows) + len(self.revision_rows)
+
+    def record_revision(self, message):
+        '''
+        Buffers a new version of a message that was already recorded.
+        '''
+        self._ensure_started()
+        edited_at = message.edited_at or message.created_at
+        self.revision_rows.append([str(message.id), str(message.author.id), message.content, str(edited_at)])
+        if self.buffered() >= self.max_buffer:
+            self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except OSError:
+                logger.exception("Failed to write message history")
+
+    def _write(self, batches, history_rows):
+        if self.files is None:
+            self.files = (MessageFile(self.time_path), MessageFile(self.network_path),
+                          MessageFile(self.revision_path, REVISION_FIELDS))
+        for f, rows in zip(self.files, batches):
+            if rows:
+                f.write(rows)
+        if history_rows:
+            if self.history is None:
+                self.history = HistoryWriter(self.history_path, self.segment_rows, self.segment_seconds)
+            self.history.append(history_rows)
+        now = time.monotonic()
+        if self.fsync_policy == FSYNC_BATCH or (self.fsync_policy == FSYNC_SECOND and now - self.last_fsync >= 1.0):
+            for f in self.files:
+                f.fsync()
+            if self.history is not None:
+                self.history.fsync()
+            self.last_fsync = now
+
+    async def flush(self):
+        '''
+        Writes everything buffered so far. Analytics call this before reading the files.
+        '''
+        if not self.buffered():
+            return
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            batches = (self.time_rows, self.network_rows, self.revision_rows)
+            history_rows = self.history_rows
+            self.time_rows, self.network_rows, self.revision_rows, self.history_rows = [], [], [], []
+            if not any(batches) and not history_rows:
+                return
+            with self.metrics.timer('store_write'):
+                await asyncio.to_thread(self._write, batches, history_rows)
+            self.rows_written += len(batches[0]) + len(history_rows) + len(batches[2])
+            self.flushes += 1
+
+    def _trim(self, cutoff, slack):
+        # Rows are in time order, so only the oldest row needs checking to see if a file is due
+        trimmed = 0
+        for path, fields, column in [(self.time_path, FIELDS, 'message_timestamp'),
+                                     (self.network_path, FIELDS, 'message_timestamp'),
+                                     (self.revision_path, REVISION_FIELDS, 'edited_timestamp')]:
+            oldest = next(read_rows(path, fields), None)
+            try:
+                if oldest is None or parse_timestamp(oldest[column]) >= cutoff - slack:
+                    continue
+            except ValueError:
+                pass # a mangled row from the old writer; rewrite the file to get rid of it
+            if self.files is not None:
+                for f in self.files:
+                    f.close()
+                self.files = None # reopened by the next write
+            tmp_path = path + '.tmp'
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            kept = MessageFile(tmp_path, fields)
+            rows = []
+            for row in read_rows(path, fields):
+                try:
+                    keep = parse_timestamp(row[column]) >= cutoff
+                except ValueError:
+                    keep = False
+                if keep:
+                    rows.append([row[field] for field in fields])
+                else:
+                    trimmed += 1
+                if len(rows) >= 10000:
+                    kept.write(rows)
+                    rows = []
+            kept.write(rows)
+            kept.fsync()
+            kept.close()
+            os.replace(tmp_path, path)
+        return trimmed
+
+    async def trim(self, cutoff, slack=0):
+        '''
+        Rewrites each file without its rows from before `cutoff` (epoch seconds), once its oldest
+        row is more than `slack` seconds older than that. Messages recorded meanwhile stay buffered.
+        Returns the number of rows dropped.
+        '''
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            with self.metrics.timer('store_trim'):
+                trimmed = await asyncio.to_thread(self._trim, cutoff, slack)
+        self.rows_trimmed += trimmed
+        return trimmed
+
+    async def close(self):
+        if self.flusher is not None:
+            self.flusher.cancel()
+        await self.flush()
+        if self.files is not None:
+            for f in self.files:
+                f.fsync()
+                f.close()
+            self.files = None
+        if self.history is not None:
+            self.history.fsync()
+            self.history.close()
+            self.history = None
+
+    def stats(self):
+        return {'buffered': self.buffered(), 'rows_written': self.rows_written, 'flushes': self.flushes,
+                'rows_trimmed': self.rows_trimmed}
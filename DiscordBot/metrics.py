@@ -0,0 +1,228 @@
+# metrics.py
+import asyncio
+import bisect
+import contextlib
+import json
+import logging
+import os
+import random
+import time
+
+
+logger = logging.getLogger('discord')
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf')]
+_NOT_SAMPLED = contextlib.nullcontext()
+
+
+class Histogram:
+    '''
+    Counts observations into fixed buckets, so memory doesn't grow with traffic.
+    '''
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # The upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms_le': self.quantile(0.5) * 1000,
+            'p99_ms_le': self.quantile(0.99) * 1000,
+        }
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Metrics:
+    '''
+    Stage timings, counters, gauges and event-loop lag for the bot. Only `sample_rate` of timed
+    calls are recorded, so under heavy load the cost can be cut to a random check per call.
+    Exported as Prometheus text over HTTP and/or as a JSON file written periodically.
+    '''
+
+    def __init__(self, sample_rate=1.0):
+        self.sample_rate = sample_rate
+        self.stages = {} # stage -> Histogram
+        self.counters = {}
+        self.gauges = {} # name -> function returning the current value
+        self.loop_lag = Histogram()
+        self.started = time.time()
+        self.runner = None
+
+    def timer(self, stage):
+        '''
+        Returns a context manager that records how long its block took under `stage`.
+        '''
+        if not self._sampled():
+            return _NOT_SAMPLED
+        return _Timer(self._histogram(stage))
+
+    def observe(self, stage, seconds):
+        '''
+        Records a duration the caller already measured.
+        '''
+        if self._sampled():
+            self._histogram(stage).observe(seconds)
+
+    def _sampled(self):
+        return self.sample_rate >= 1.0 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def _histogram(self, stage):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        return histogram
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    def _gauge_values(self):
+        values = {}
+        for name, fn in self.gauges.items():
+            try:
+                values[name] = fn()
+            except Exception:
+                logger.exception("Failed to read gauge %s", name)
+        return values
+
+    async def watch_loop_lag(self, interval=0.5):
+        '''
+        Records how late each periodic wake-up is: time the event loop was busy with something else.
+        '''
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(max(0.0, time.perf_counter() - start - interval))
+
+    def snapshot(self):
+        return {
+            'uptime_s': round(time.time() - self.started, 1),
+            'sample_rate': self.sample_rate,
+            'stages': {stage: histogram.summary() for stage, histogram in sorted(self.stages.items())},
+            'loop_lag': self.loop_lag.summary(),
+            'counters': dict(self.counters),
+            'gauges': self._gauge_values(),
+        }
+
+    def prometheus(self):
+        lines = ['# TYPE modbot_stage_seconds histogram']
+        for stage, histogram in sorted(self.stages.items()):
+            lines.extend(self._histogram_lines('modbot_stage_seconds', histogram, f'stage="{stage}"'))
+        lines.append('# TYPE modbot_loop_lag_seconds histogram')
+        lines.extend(self._histogram_lines('modbot_loop_lag_seconds', self.loop_lag))
+        lines.append('# TYPE modbot_events_total counter')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'modbot_events_total{{event="{name}"}} {value}')
+        for name, value in sorted(self._gauge_values().items()):
+            lines.append(f'# TYPE modbot_{name} gauge')
+            lines.append(f'modbot_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def _histogram_lines(self, family, histogram, labels=''):
+        prefix = labels + ',' if labels else ''
+        suffix = '{' + labels + '}' if labels else ''
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{family}_bucket{{{prefix}le="{le}"}} {cumulative}'
+        yield f'{family}_sum{suffix} {histogram.sum}'
+        yield f'{family}_count{suffix} {histogram.count}'
+
+    async def serve(self, host='127.0.0.1', port=9108):
+        '''
+        Serves /metrics (Prometheus text) and /metrics.json on a local port.
+        '''
+        from aiohttp import web
+
+        async def text(request):
+            return web.Response(text=self.prometheus(), content_type='text/plain')
+
+        async def as_json(request):
+            return web.json_response(self.snapshot())
+
+        app = web.Application()
+        app.router.add_get('/metrics', text)
+        app.router.add_get('/metrics.json', as_json)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+
+    async def dump_periodically(self, path, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.dump(path)
+            except OSError:
+                logger.exception("Failed to write metrics to %s", path)
+
+    def dump(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+class NullMetrics:
+    '''
+    Stands in for Metrics in components that aren't given one: every call records nothing, so
+    they don't share any state.
+    '''
+
+    def timer(self, stage):
+        return _NOT_SAMPLED
+
+    def observe(self, stage, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def gauge(self, name, fn):
+        pass
+
+
+NO_METRICS = NullMetrics()
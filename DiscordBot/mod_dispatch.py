@@ -0,0 +1,197 @@
+# mod_dispatch.py
+import asyncio
+import logging
+import time
+from collections import deque
+from metrics import NO_METRICS
+from mod_queue import ModCase
+from scheduler import TokenBucket
+from verdict_cache import normalize_key_text
+
+
+logger = logging.getLogger('discord')
+
+# Discord rejects longer messages
+MAX_POST_LENGTH = 2000
+# Folded alerts listed by name under a summary post; the rest are only counted
+MAX_LISTED = 5
+
+
+class AlertGroup:
+    '''
+    The first alert for some author or content, and the alerts folded into it before it was sent.
+    '''
+
+    def __init__(self, keys, text, case):
+        self.keys = keys
+        self.text = text
+        self.cases = [case]
+        self.created = time.monotonic()
+
+    def case(self):
+        if len(self.cases) == 1:
+            return self.cases[0]
+        first = self.cases[0]
+        merged = ModCase.from_dict(first.to_dict())
+        merged.others = [[c.author_id, c.author_name, c.message_id] for c in self.cases[1:]]
+        return merged
+
+    def render(self):
+        first = self.cases[0]
+        if len(self.cases) == 1:
+            return shorten(self.text, first.content, MAX_POST_LENGTH)
+        others = self.cases[1:]
+        seconds = max(1, round(time.monotonic() - self.created))
+        header = (f"\n**+{len(others)} more like this** in the last {seconds}s; "
+                  "reactions to this post apply to all of them:")
+        # Room for the header and the longest possible "...and N more" line is kept free
+        text = shorten(self.text, first.content,
+                       MAX_POST_LENGTH - len(header) - len(f"\n- ...and {len(others)} more")) + header
+        for listed, case in enumerate(others):
+            line = f'\n- {case.author_name}: "{case.content[:100]}"'
+            rest = f"\n- ...and {len(others) - listed} more"
+            if listed == MAX_LISTED or len(text) + len(line) + len(rest) > MAX_POST_LENGTH:
+                return text + rest
+            text += line
+        return text
+
+
+def shorten(text, content, length):
+    '''
+    Cuts the quoted `content` inside `text` so the whole fits in `length` characters, keeping the
+    rest of the post (who sent it, the reaction instructions) intact.
+    '''
+    excess = len(text) - length
+    if excess <= 0:
+        return text
+    start = text.find(content) if content else -1
+    if start < 0 or excess + 1 > len(content):
+        return text[:length] # nothing to cut that would be enough
+    end = start + len(content)
+    return text[:start] + content[:len(content) - excess - 1] + '…' + text[end:]
+
+
+class ChannelQueue:
+    def __init__(self, channel, bucket):
+        self.channel = channel
+        self.bucket = bucket
+        self.groups = deque() # waiting to be sent, oldest first
+        self.open = {} # coalescing key -> group that alerts with that key still join
+        self.task = None
+
+
+class ModDispatcher:
+    '''
+    Queues alerts for the mod channels. Alerts of the same kind about the same author, or with the
+    same normalized content, that arrive within `window` seconds of the first are sent as one post
+    listing them with a count. Each channel sends at most `rate` posts per second on average, in
+    bursts of up to `burst` (Discord allows 5 messages per 5 seconds in a channel), and while a post
+    waits for its turn matching alerts keep joining it, so a spam wave costs a handful of posts.
+    '''
+
+    def __init__(self, send, window=1.0, rate=1.0, burst=5, max_group=100, metrics=None):
+        self.send = send # async send(channel, text, case) -> post
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.max_group = max_group
+        self.metrics = metrics or NO_METRICS
+        self.queues = {} # channel id -> ChannelQueue
+        self.alerts = 0
+        self.posts = 0
+        self.saved = 0
+        self.failed = 0
+        self.rate_limit_wait = 0.0
+
+    def submit(self, channel, text, case):
+        '''
+        Queues an alert about `case` for `channel`. It is sent on its own or folded into a post
+        about the same author or content.
+        '''
+        self.alerts += 1
+        queue = self.queues.get(channel.id)
+        if queue is None:
+            queue = self.queues[channel.id] = ChannelQueue(channel, TokenBucket(self.rate, self.burst))
+        kind = (case.category, case.reason)
+        keys = [kind + ('author', case.author_id), kind + ('content', normalize_key_text(case.content))]
+        for key in keys:
+            group = queue.open.get(key)
+            if group is not None:
+                group.cases.append(case)
+                if len(group.cases) >= self.max_group:
+                    self._seal(queue, group)
+                break
+        else:
+            group = AlertGroup(keys, text, case)
+            queue.groups.append(group)
+            for key in keys:
+                queue.open[key] = group
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._run(queue))
+
+    def _seal(self, queue, group):
+        # Later alerts start a new group
+        for key in group.keys:
+            if queue.open.get(key) is group:
+                del queue.open[key]
+
+    async def _run(self, queue):
+        try:
+            while queue.groups:
+                group = queue.groups[0]
+                delay = group.created + self.window - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                start = time.perf_counter()
+                await queue.bucket.acquire()
+                waited = time.perf_counter() - start
+                self.rate_limit_wait += waited
+                self.metrics.observe('mod_rate_limit_wait', waited)
+                queue.groups.popleft()
+                self._seal(queue, group)
+                await self._send(queue.channel, group)
+        finally:
+            queue.task = None
+
+    async def _send(self, channel, group):
+        saved = len(group.cases) - 1
+        try:
+            await self.send(channel, group.render(), group.case())
+        except Exception:
+            self.failed += 1
+            logger.exception("Failed to post %d alert(s) to mod channel %s", len(group.cases), channel.id)
+            return
+        self.posts += 1
+        if saved:
+            self.saved += saved
+            self.metrics.count('mod_posts_saved', saved)
+        self.metrics.observe('mod_alert_delay', time.monotonic() - group.created)
+
+    def pending(self):
+        return sum(len(group.cases) for queue in self.queues.values() for group in queue.groups)
+
+    async def drain(self):
+        '''
+        Waits until every queued alert has been posted.
+        '''
+        while True:
+            tasks = [queue.task for queue in self.queues.values() if queue.task is not None]
+            if not tasks:
+                return
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self, timeout=10.0):
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %d mod-channel alert(s) still queued at shutdown", self.pending())
+
+    def stats(self):
+        return {
+            'alerts': self.alerts,
+            'posts': self.posts,
+            'saved': self.saved,
+            'failed': self.failed,
+            'pending': self.pending(),
+            'rate_limit_wait_s': round(self.rate_limit_wait, 3),
+        }
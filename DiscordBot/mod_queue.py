@@ -0,0 +1,105 @@
+# mod_queue.py
+import json
+import logging
+import os
+import time
+from lru import LRUCache
+
+
+logger = logging.getLogger('discord')
+
+
+class ModCase:
+    '''
+    Everything a moderator action needs to know about one flagged or reported message.
+    '''
+
+    FIELDS = ['author_id', 'author_name', 'message_id', 'channel_id', 'content',
+              'category', 'scores', 'reason', 'created', 'others', 'vector']
+
+    def __init__(self, author_id, author_name, message_id, channel_id, content,
+                 category, scores=None, reason=None, created=None, others=None, vector=None):
+        self.author_id = author_id
+        self.author_name = author_name
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.content = content
+        self.category = category
+        self.scores = scores or {}
+        self.reason = reason
+        self.created = created or time.time()
+        # [author id, author name, message id] of alerts folded into the same mod-channel post
+        self.others = others or []
+        # every Perspective score in thresholds.ATTRIBUTES order, for messages that were scored
+        self.vector = vector
+
+    @classmethod
+    def from_message(cls, message, category, scores=None, reason=None):
+        return cls(message.author.id, message.author.name, message.id, message.channel.id,
+                   message.content, category, scores, reason)
+
+    def message_ids(self):
+        return [self.message_id] + [message_id for _, _, message_id in self.others]
+
+    def author_names(self):
+        names = [self.author_name]
+        for _, name, _ in self.others:
+            if name not in names:
+                names.append(name)
+        return names
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) for field in cls.FIELDS})
+
+
+class ModQueue:
+    '''
+    Maps the id of each post the bot makes in a mod channel to the case it is about, so a
+    reaction on that post is a dictionary lookup. Cases are appended to a JSON-lines file as they
+    are added and the file is compacted on close.
+    '''
+
+    def __init__(self, path=None, maxsize=100000):
+        self.path = path
+        self.cases = LRUCache(maxsize)
+        self.log = None
+        if path:
+            self.load()
+            self.log = open(path, 'a', buffering=1)
+
+    def load(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.cases.set(entry['post_id'], ModCase.from_dict(entry['case']))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("Skipping unreadable mod queue entry in %s", self.path)
+
+    def add(self, post_id, case):
+        self.cases.set(post_id, case)
+        if self.log is not None:
+            self.log.write(json.dumps({'post_id': post_id, 'case': case.to_dict()}) + '\n')
+
+    def get(self, post_id):
+        return self.cases.get(post_id)
+
+    def __len__(self):
+        return len(self.cases)
+
+    def close(self):
+        if self.log is None:
+            return
+        self.log.close()
+        self.log = None
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for post_id, case, _ in self.cases.items():
+                f.write(json.dumps({'post_id': post_id, 'case': case.to_dict()}) + '\n')
+        os.replace(tmp_path, self.path)
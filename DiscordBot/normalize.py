@@ -0,0 +1,105 @@
+# normalize.py
+import asyncio
+import re
+import time
+from uni2ascii import uni2ascii
+from lru import LRUCache
+from metrics import NO_METRICS
+
+
+WORD = re.compile(r"[^\W\d_]+", re.UNICODE)
+# A handful of very common English words; any real English sentence contains some of them
+ENGLISH_WORDS = frozenset('''
+a about after all also am an and any are as at be because been but by can could did do does
+dont for from get go going got had has have he her him his how i if im in into is it its just
+know like me more my no not now of off on one only or our out please really see she so some than
+that thats the their them then there they this to too up us was we well were what when where which
+who why will with would yes you your
+'''.split())
+
+
+def looks_english(text):
+    '''
+    A cheap local check for text that doesn't need translating: all ASCII, and either very short
+    (like "ok" or "lol") or containing common English words.
+    '''
+    if not text.isascii():
+        return False
+    words = WORD.findall(text.lower())
+    if len(words) <= 2:
+        return True
+    return sum(word in ENGLISH_WORDS for word in words) / len(words) >= 0.2
+
+
+class MessageContext:
+    '''
+    The result of normalizing one message, kept so later stages never redo the work. `prefilter`
+    is the (verdict, scores) pair when the pre-filter already ran on `text`.
+    '''
+
+    def __init__(self, message, raw, text, translated, normalize_time, prefilter=None):
+        self.message = message
+        self.raw = raw
+        self.text = text
+        self.translated = translated
+        self.normalize_time = normalize_time
+        self.prefilter = prefilter
+
+
+class Normalizer:
+    '''
+    Maps unicode look-alikes to ASCII and translates non-English text to English. One translator
+    is shared by every call, translations are cached by source text, and the blocking translate
+    request runs in a worker thread instead of on the event loop. deep_translator is only
+    imported when the first non-English message arrives.
+    '''
+
+    def __init__(self, translator=None, cache_size=10000, metrics=None):
+        self.translator = translator
+        self.metrics = metrics or NO_METRICS
+        self.translations = LRUCache(cache_size)
+        self.skipped = 0
+        self.translated = 0
+
+    async def translate(self, text):
+        if not text.strip() or looks_english(text):
+            self.skipped += 1
+            return text
+        cached = self.translations.get(text)
+        if cached is not None:
+            return cached
+        self.translated += 1
+        with self.metrics.timer('translate'):
+            result = await asyncio.to_thread(self._translate, text)
+        # The translator returns None for input it can't handle; keep the original then
+        result = result or text
+        self.translations.set(text, result)
+        return result
+
+    def _translate(self, text):
+        if self.translator is None:
+            from deep_translator import GoogleTranslator
+            self.translator = GoogleTranslator(source='auto', target='en')
+        return self.translator.translate(text)
+
+    async def normalize_text(self, raw):
+        # handle adversarial attempts at hiding text via unicode
+        text = uni2ascii(raw)
+        # translate all messages in other languages to english
+        return text, await self.translate(text)
+
+    async def normalize(self, message):
+        '''
+        Normalizes message.content and returns a MessageContext holding both versions.
+        '''
+        start = time.perf_counter()
+        raw = message.content
+        text, translated = await self.normalize_text(raw)
+        return MessageContext(message, raw, translated, translated != text, time.perf_counter() - start)
+
+    def stats(self):
+        return {
+            'skipped': self.skipped,
+            'translated': self.translated,
+            'translation_cache': self.translations.stats(),
+        }
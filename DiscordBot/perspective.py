@@ -0,0 +1,112 @@
+# perspective.py
+import asyncio
+import json
+import logging
+import random
+import aiohttp
+
+
+PERSPECTIVE_URL = 'https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze'
+REQUESTED_ATTRIBUTES = [
+    'SEVERE_TOXICITY', 'PROFANITY',
+    'IDENTITY_ATTACK', 'THREAT',
+    'TOXICITY', 'INSULT', 'INCOHERENT',
+    'SPAM',
+]
+PERSPECTIVE_SCORE_THRESHOLD_BY_ATTR = {
+    'SEVERE_TOXICITY': 0.51, 'PROFANITY': 0.80,
+    'IDENTITY_ATTACK': 0.51, 'THREAT': 0.51,
+    'TOXICITY': 0.70, 'INSULT': 0.70, 'INCOHERENT': 0.9,
+    'SPAM': 0.9,
+}
+# Responses worth retrying: quota exhaustion and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+logger = logging.getLogger('discord')
+
+
+class PerspectiveError(Exception):
+    pass
+
+
+class PerspectiveClient:
+    '''
+    Async Perspective client. A single keep-alive session is shared by every call, the number of
+    requests in flight is bounded, and 429/5xx responses are retried with exponential backoff.
+    '''
+
+    def __init__(self, key, url=PERSPECTIVE_URL, max_concurrency=20, timeout=10.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.key = key
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = None
+        self.semaphore = None
+        self.requests_sent = 0
+        self.retries = 0
+
+    def _ensure_session(self):
+        # The session has to be created inside the running event loop
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * (0.5 + random.random() / 2)
+
+    async def analyze(self, text, attributes=REQUESTED_ATTRIBUTES):
+        '''
+        Sends `text` to Perspective and returns a dictionary of attribute -> summary score.
+        '''
+        session = self._ensure_session()
+        data_dict = {
+            'comment': {'text': text},
+            'languages': ['en'],
+            'requestedAttributes': {attr: {} for attr in attributes},
+            'doNotStore': True
+        }
+        body = json.dumps(data_dict)
+        params = {'key': self.key}
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with self.semaphore:
+                self.requests_sent += 1
+                try:
+                    async with session.post(self.url, params=params, data=body,
+                                            headers={'Content-Type': 'application/json'}) as response:
+                        if response.status == 200:
+                            response_dict = await response.json(content_type=None)
+                            return {attr: value["summaryScore"]["value"]
+                                    for attr, value in response_dict["attributeScores"].items()}
+                        last_error = PerspectiveError(f"Perspective returned HTTP {response.status}")
+                        if response.status not in RETRY_STATUSES:
+                            raise last_error
+                        retry_after = response.headers.get('Retry-After')
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    last_error = PerspectiveError(f"Perspective request failed: {e!r}")
+
+            if attempt < self.max_retries:
+                self.retries += 1
+                delay = self._backoff(attempt, retry_after)
+                logger.warning("%s, retrying in %.2fs", last_error, delay)
+                await asyncio.sleep(delay)
+
+        raise last_error
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
@@ -0,0 +1,211 @@
+# prefilter.py
+# Local first-pass classifier in front of Perspective. Messages it is sure about are decided
+# locally; only the uncertain ones are sent on for remote scoring.
+#
+# Train the linear model offline from the bot's logged scores with:
+#   python prefilter.py scores_log.jsonl prefilter_model.json
+import json
+import math
+import os
+import random
+import re
+import sys
+import zlib
+from perspective import PERSPECTIVE_SCORE_THRESHOLD_BY_ATTR
+
+
+CLEAN = 'clean'
+BAD = 'bad'
+UNCERTAIN = 'uncertain'
+
+WORD = re.compile(r"[a-z0-9']+")
+# Without a trained model these are the only texts with letters that skip Perspective
+SAFE_PHRASES = frozenset([
+    'ok', 'okay', 'k', 'kk', 'lol', 'lmao', 'haha', 'hahaha', 'yes', 'no', 'yep', 'nope', 'sure',
+    'hi', 'hello', 'hey', 'bye', 'thanks', 'thank you', 'ty', 'np', 'gg', 'nice', 'cool', 'brb',
+])
+LETTER = re.compile(r'[^\W\d_]', re.UNICODE)
+
+
+class AhoCorasick:
+    '''
+    Matches every term of a lexicon against a text in one pass. Matches must start and end on
+    word boundaries so "kill" doesn't fire inside "skill".
+    '''
+
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for term, label in terms:
+            self._add(term.lower(), label)
+        self._build()
+
+    def _add(self, term, label):
+        state = 0
+        for ch in term:
+            if ch not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][ch] = len(self.goto) - 1
+            state = self.goto[state][ch]
+        self.output[state].append((len(term), label))
+
+    def _build(self):
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        '''
+        Returns the labels of every lexicon term found in `text`.
+        '''
+        text = text.lower()
+        found = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for length, label in self.output[state]:
+                start = i - length + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (i + 1 == len(text) or not text[i + 1].isalnum()):
+                    found.append(label)
+        return found
+
+
+def features(text, dim):
+    words = WORD.findall(text.lower())
+    grams = words + [a + ' ' + b for a, b in zip(words, words[1:])]
+    return [zlib.crc32(gram.encode('utf-8')) % dim for gram in grams]
+
+
+class HashedLinearModel:
+    '''
+    Logistic regression over hashed unigram and bigram features. Only non-zero weights are kept.
+    '''
+
+    def __init__(self, dim=2 ** 18, weights=None, bias=0.0):
+        self.dim = dim
+        self.weights = weights or {}
+        self.bias = bias
+
+    def predict(self, text):
+        z = self.bias + sum(self.weights.get(i, 0.0) for i in features(text, self.dim))
+        return 1 / (1 + math.exp(-max(min(z, 30), -30)))
+
+    def train(self, examples, epochs=5, learning_rate=0.1, l2=1e-5):
+        examples = list(examples)
+        for _ in range(epochs):
+            random.shuffle(examples)
+            for text, label in examples:
+                error = self.predict(text) - label
+                for i in features(text, self.dim):
+                    w = self.weights.get(i, 0.0)
+                    self.weights[i] = w - learning_rate * (error + l2 * w)
+                self.bias -= learning_rate * error
+        return self
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'dim': self.dim, 'bias': self.bias,
+                       'weights': {str(i): w for i, w in self.weights.items() if abs(w) > 1e-6}}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            saved = json.load(f)
+        return cls(saved['dim'], {int(i): w for i, w in saved['weights'].items()}, saved['bias'])
+
+
+def is_flagged(scores, thresholds=PERSPECTIVE_SCORE_THRESHOLD_BY_ATTR):
+    return any(score >= thresholds.get(attr, 1.0) for attr, score in scores.items())
+
+
+class PreFilter:
+    '''
+    Classifies a normalized message as CLEAN, BAD or UNCERTAIN.
+
+    Messages with no letters (emoji, numbers, punctuation) are clean. Otherwise the model's
+    probability that Perspective would flag the message decides: below `clean_below` is clean,
+    at or above `bad_above` is bad provided the lexicon also matched, and everything else is
+    uncertain. Without a trained model, only messages that are one of `safe_phrases` are decided
+    locally.
+    '''
+
+    def __init__(self, lexicon=None, model=None, clean_below=0.05, bad_above=0.97, safe_phrases=SAFE_PHRASES):
+        # lexicon maps a Perspective attribute to the terms that suggest it
+        lexicon = lexicon or {}
+        self.automaton = AhoCorasick((term, attr) for attr, terms in lexicon.items() for term in terms)
+        self.model = model
+        self.clean_below = clean_below
+        self.bad_above = bad_above
+        self.safe_phrases = safe_phrases
+        self.counts = {CLEAN: 0, BAD: 0, UNCERTAIN: 0}
+
+    @classmethod
+    def from_files(cls, lexicon_path, model_path, **cutoffs):
+        lexicon = None
+        model = None
+        if lexicon_path and os.path.isfile(lexicon_path):
+            with open(lexicon_path) as f:
+                lexicon = json.load(f)
+        if model_path and os.path.isfile(model_path):
+            model = HashedLinearModel.load(model_path)
+        return cls(lexicon, model, **cutoffs)
+
+    def classify(self, text):
+        '''
+        Returns (verdict, scores). For BAD verdicts `scores` maps each matched attribute to the
+        model's probability so it can be shown to moderators like a Perspective score.
+        '''
+        verdict, scores = self._classify(text)
+        self.count(verdict)
+        return verdict, scores
+
+    def count(self, verdict):
+        # Verdicts reached in analysis workers are counted here too
+        self.counts[verdict] += 1
+
+    def _classify(self, text):
+        if not LETTER.search(text):
+            return CLEAN, {}
+        matched = self.automaton.find(text)
+        if self.model is None:
+            if not matched and ' '.join(WORD.findall(text.lower())) in self.safe_phrases:
+                return CLEAN, {}
+            return UNCERTAIN, {}
+        probability = self.model.predict(text)
+        if probability < self.clean_below and not matched:
+            return CLEAN, {}
+        if probability >= self.bad_above and matched:
+            return BAD, {attr: round(probability, 4) for attr in matched}
+        return UNCERTAIN, {}
+
+    def stats(self):
+        total = sum(self.counts.values())
+        return dict(self.counts, remote_avoided=round((total - self.counts[UNCERTAIN]) / total, 3) if total else 0.0)
+
+
+def load_scores_log(path):
+    '''
+    Reads the JSON-lines score log written by the bot: {"text": ..., "scores": {...}} per line.
+    '''
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: python prefilter.py <scores_log.jsonl> <model.json>")
+    rows = load_scores_log(sys.argv[1])
+    model = HashedLinearModel().train((row['text'], int(is_flagged(row['scores']))) for row in rows)
+    model.save(sys.argv[2])
+    print(f"Trained on {len(rows)} messages, {len(model.weights)} non-zero weights -> {sys.argv[2]}")
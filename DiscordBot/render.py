@@ -0,0 +1,137 @@
+# render.py
+# Moderator analytics images are drawn in worker processes and returned as PNG bytes, so the
+# event loop never blocks on matplotlib and concurrent requests never share a figure or a file.
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from metrics import NO_METRICS
+
+
+logger = logging.getLogger('discord')
+
+
+class RenderError(Exception):
+    pass
+
+
+def _figure():
+    # Each job gets its own Figure instead of pyplot's shared global one
+    from matplotlib.figure import Figure
+    return Figure(figsize=(6.4, 4.8))
+
+
+def _png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def render_time_plot(counts, bucket_days, title):
+    '''
+    counts is a list of (bucket start datetime, message count) pairs.
+    '''
+    from matplotlib import dates as mpl_dates
+    fig = _figure()
+    ax = fig.add_subplot()
+    ax.bar([start for start, count in counts], [count for start, count in counts], width=bucket_days, align='edge')
+    fig.autofmt_xdate()
+    ax.xaxis.set_major_formatter(mpl_dates.DateFormatter('%D %H:%M:%S'))
+    ax.set_title(title)
+    return _png(fig)
+
+
+def render_network_graph(edges, center, title):
+    '''
+    edges is a list of (source, target, weight) mentions; `center` is drawn in red.
+    '''
+    import networkx as nx
+    G = nx.DiGraph()
+    G.add_node(center)
+    G.add_weighted_edges_from(edges)
+    fig = _figure()
+    ax = fig.add_subplot()
+    nx.draw_networkx(G,
+        ax = ax,
+        node_color = ['red' if node == center else 'green' for node in G],
+        node_size = [500] * len(G),
+        node_shape = "8",#can choose s,o,^,>,v,<,d,p,h,8...o is default
+        alpha = 0.75,
+        font_size = 10,
+        font_color = "black",
+        font_weight = "bold",
+        edge_color = "skyblue",
+        style = "solid",
+        width = 5,
+        label = "User Mentions",
+        pos = nx.spring_layout(G, iterations = 1000),
+        arrows = True, with_labels = True)
+    ax.set_title(title)
+    return _png(fig)
+
+
+def render_freq_table(message_of_interest, table_conversion='matplotlib'):
+    '''
+    message_of_interest maps the flagged message text to {author name: copies sent}.
+    '''
+    import pandas as pd
+    import dataframe_image as dfi
+    buffer = io.BytesIO()
+    dfi.export(pd.DataFrame(message_of_interest), buffer, table_conversion=table_conversion)
+    return buffer.getvalue()
+
+
+class RenderService:
+    '''
+    Runs render jobs in a process pool, one per worker at a time; the rest wait their turn here,
+    not in the pool's queue. A job that runs longer than `timeout` seconds raises RenderError, and
+    its worker stays taken until the job really finishes.
+    '''
+
+    def __init__(self, workers=2, timeout=30.0, metrics=None):
+        self.workers = workers
+        self.metrics = metrics or NO_METRICS
+        self.timeout = timeout
+        self.pool = None
+        self.semaphore = None
+        self.completed = 0
+        self.timeouts = 0
+
+    def _ensure_pool(self):
+        if self.pool is None:
+            # spawn: forking a process that is running an event loop and threads isn't safe
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            self.semaphore = asyncio.Semaphore(self.workers)
+        return self.pool
+
+    def _finished(self, future):
+        self.semaphore.release()
+        if not future.cancelled():
+            future.exception() # a job that failed after timing out has nobody to report to
+
+    async def render(self, job, *args):
+        '''
+        Runs `job(*args)` in a worker and returns the PNG bytes it produced.
+        '''
+        pool = self._ensure_pool()
+        await self.semaphore.acquire()
+        future = asyncio.get_running_loop().run_in_executor(pool, job, *args)
+        future.add_done_callback(self._finished)
+        try:
+            with self.metrics.timer('render'):
+                # shielded, so a timeout doesn't mark the job done while its worker is still busy
+                png = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise RenderError(f"{job.__name__} took longer than {self.timeout}s")
+        self.completed += 1
+        return png
+
+    def stats(self):
+        return {'completed': self.completed, 'timeouts': self.timeouts}
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
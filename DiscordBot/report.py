@@ -1,6 +1,7 @@
 from enum import Enum, auto
 import discord
 import re
+from mod_queue import ModCase
 
 # USER REPORTING FLOW
 
@@ -26,14 +27,10 @@ class Report:
         self.state = State.REPORT_START
         self.client = client
         self.message = None
+        self.evidence = None
 
     async def generate_message_to_mods(self, reason_message, reason):
-        mod_channel = self.client.mod_channels[self.message.guild.id]
-        await mod_channel.send(f"""User-reported message:\n```{self.message.author.name}: "{self.message.content}```
-*Author id: {self.message.author.id}*
-*Message id: {self.message.id}*
-Flagged by user {reason_message.author.name} for **"{reason}"**.
-""")
+        await self.client.post_report(self.message, reason_message.author, reason, self.evidence)
 
 
     async def handle_message(self, message):
@@ -83,6 +80,8 @@ Flagged by user {reason_message.author.name} for **"{reason}"**.
             self.state = State.MESSAGE_IDENTIFIED
             # TODO: Prompt for more information
             self.message = message
+            # Scores, history and copy counts are gathered while the reporter answers the questions
+            self.evidence = self.client.evidence.start(message)
             return ["I found this message:", "```" + message.author.name + ": " + message.content + "```", \
                     "Please select a problem with this message by typing the number next to the appropriate reason:", \
                     "1: Violence or danger", "2: Spam", "3: Hate speech or symbols", "4: False information", "5: Harrassment"]
@@ -183,8 +182,12 @@ Flagged by user {reason_message.author.name} for **"{reason}"**.
                 return ["I'm sorry, that's not one of the choices. Please try again or say `cancel` to cancel."]
             else:
                 if message.content == "1":
-                    mod_channel = self.client.mod_channels[self.message.guild.id]
-                    await mod_channel.send(f"{self.message.author} was also flagged as a possible bot or sock puppet account")
+                    case = ModCase.from_message(self.message, 'sock puppet', reason="possible bot or sock puppet account")
+                    self.client.post_to_mods(self.message.guild.id,
+                        f"{self.message.author} was also flagged as a possible bot or sock puppet account for this message:\n" +
+                        f'{self.message.author.name}: "{self.message.content}"\n' +
+                        '\n'.join(self.client.report_instructions('sock puppet')),
+                        case)
                 self.state = State.BLOCK_USER
                 return [
                     "Thanks for letting us know. We'll use this information to alert our content moderation team and improve our processes. The message will be reviewed, and the user and/or message will be removed if appropriate.",
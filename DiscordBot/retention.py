@@ -0,0 +1,311 @@
+# retention.py
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from array import array
+from columnar import (segment_paths, segment_number, first_timestamp, read_segment, read_names,
+                      truncate_names)
+from metrics import NO_METRICS
+from verdict_cache import content_key
+
+
+logger = logging.getLogger('discord')
+
+# Each history segment that ages out of the retention window is folded into one rollup part, a
+# directory named after the segment holding three tables with one little-endian file per column:
+#   - hourly: messages per author and hour
+#   - edges: mention counts between two users (ids in the history's names.jsonl)
+#   - content: copies of each text per author, with when they were first and last posted
+# Texts are stored once, in texts.jsonl next to the parts, and referred to by line number.
+# Parts are written under a temporary name and renamed into place before the segment is deleted,
+# so a crash at any point leaves every message in exactly one of the two.
+#
+# Once there are more than `max_parts` parts they are merged into one, named after the range of
+# segments it covers (part-000001-000040); parts inside a merged part's range are ignored and
+# deleted, so a crash during a merge doesn't count anything twice either.
+TABLES = {
+    'hourly': {'author_id': 'q', 'hour': 'q', 'count': 'i'}, # hour start in epoch seconds
+    'edges': {'source': 'i', 'target': 'i', 'weight': 'i'},
+    'content': {'text': 'i', 'author': 'i', 'count': 'i', 'first': 'q', 'last': 'q'}, # microseconds
+}
+TEXTS_FILE = 'texts.jsonl'
+PART_PREFIX = 'part-'
+TMP_SUFFIX = '.tmp'
+SEGMENT_COLUMNS = ['author_id', 'timestamp', 'author', 'mention_count', 'mentions', 'content_length', 'content']
+
+
+def _part_range(part):
+    numbers = [int(n) for n in os.path.basename(part)[len(PART_PREFIX):].split('-')]
+    return numbers[0], numbers[-1]
+
+
+def _all_parts(path):
+    if not os.path.isdir(path):
+        return []
+    return [os.path.join(path, name) for name in sorted(os.listdir(path))
+            if name.startswith(PART_PREFIX) and not name.endswith(TMP_SUFFIX)]
+
+
+def _covered_parts(parts):
+    ranges = [_part_range(part) for part in parts]
+    return {part for part, (first, last) in zip(parts, ranges)
+            if any(f <= first and last <= l and (f, l) != (first, last) for f, l in ranges)}
+
+
+def part_paths(path):
+    '''
+    Every rollup part that isn't inside a merged one, oldest first.
+    '''
+    parts = _all_parts(path)
+    covered = _covered_parts(parts)
+    return [part for part in parts if part not in covered]
+
+
+def _has_part(path, number):
+    return any(first <= number <= last for first, last in map(_part_range, _all_parts(path)))
+
+
+def _to_disk(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _read_part_table(part, table):
+    columns = {}
+    for column, typecode in TABLES[table].items():
+        values = array(typecode)
+        with open(os.path.join(part, f'{table}.{column}.{typecode}'), 'rb') as f:
+            values.frombytes(f.read())
+        columns[column] = _to_disk(values)
+    return columns
+
+
+def read_table(path, table):
+    '''
+    Yields {column: array} of `table` for every rollup part, oldest first.
+    '''
+    for part in part_paths(path):
+        yield _read_part_table(part, table)
+
+
+def read_hourly(path):
+    '''
+    Yields (author ids, hour starts, counts) arrays for every rollup part, oldest first.
+    '''
+    for columns in read_table(path, 'hourly'):
+        yield columns['author_id'], columns['hour'], columns['count']
+
+
+def read_edges(path, names):
+    '''
+    Yields (source name, target name, weight) for every rolled-up mention edge; `names` is the
+    history's name dictionary.
+    '''
+    for columns in read_table(path, 'edges'):
+        for source, target, weight in zip(columns['source'], columns['target'], columns['weight']):
+            yield names[source], names[target], weight
+
+
+def read_content(path, names):
+    '''
+    Yields (text, author name, count, first seen, last seen) for every rolled-up text and author.
+    '''
+    texts = read_names(path, TEXTS_FILE)
+    for columns in read_table(path, 'content'):
+        for text, author, count, first, last in zip(columns['text'], columns['author'], columns['count'],
+                                                    columns['first'], columns['last']):
+            yield texts[text], names[author], count, first / 1e6, last / 1e6
+
+
+def fold_segment(segment, text_ids):
+    '''
+    Aggregates a history segment into {table: {key columns: values}}. Texts not yet in `text_ids`
+    ({content key: (id, text)}) are added to it.
+    '''
+    columns = read_segment(segment, SEGMENT_COLUMNS)
+    hourly = {}
+    edges = {}
+    contents = {}
+    mentions = iter(columns['mentions'])
+    content = columns['content'].tobytes()
+    begin = 0
+    for author_id, timestamp, author, count, length in zip(columns['author_id'], columns['timestamp'], columns['author'],
+                                                           columns['mention_count'], columns['content_length']):
+        hour = (author_id, timestamp // 3600000000 * 3600)
+        hourly[hour] = hourly.get(hour, 0) + 1
+        for _ in range(count):
+            edge = (author, next(mentions))
+            edges[edge] = edges.get(edge, 0) + 1
+        text = content[begin:begin + length].decode('utf-8')
+        begin += length
+        key = content_key(text)
+        if key not in text_ids:
+            text_ids[key] = (len(text_ids), text)
+        entry = contents.get((text_ids[key][0], author))
+        if entry is None:
+            contents[(text_ids[key][0], author)] = [1, timestamp, timestamp]
+        else:
+            entry[0] += 1
+            entry[1] = min(entry[1], timestamp)
+            entry[2] = max(entry[2], timestamp)
+    return {'hourly': {key: (count,) for key, count in hourly.items()},
+            'edges': {key: (weight,) for key, weight in edges.items()},
+            'content': {key: tuple(entry) for key, entry in contents.items()}}
+
+
+def write_part(part, tables):
+    tmp_path = part + TMP_SUFFIX
+    shutil.rmtree(tmp_path, ignore_errors=True) # left by a crash
+    os.makedirs(tmp_path)
+    for table, rows in tables.items():
+        ordered = sorted(rows)
+        for i, (column, typecode) in enumerate(TABLES[table].items()):
+            values = array(typecode, [key[i] if i < len(key) else rows[key][i - len(key)] for key in ordered])
+            with open(os.path.join(tmp_path, f'{table}.{column}.{typecode}'), 'wb') as f:
+                f.write(_to_disk(values).tobytes())
+    os.replace(tmp_path, part)
+
+
+def merge_parts(path, max_parts):
+    '''
+    Merges every rollup part into one if there are more than `max_parts`, and deletes parts left
+    inside a merged one. Returns the number of parts merged.
+    '''
+    for part in _covered_parts(_all_parts(path)):
+        shutil.rmtree(part)
+    parts = part_paths(path)
+    if len(parts) <= max_parts:
+        return 0
+    merged = {table: {} for table in TABLES}
+    for part in parts:
+        for table, rows in merged.items():
+            columns = list(_read_part_table(part, table).values())
+            keys = 2 # every table is keyed by its first two columns
+            for row in zip(*columns):
+                key, values = row[:keys], row[keys:]
+                old = rows.get(key)
+                if old is None:
+                    rows[key] = values
+                elif table == 'content':
+                    rows[key] = (old[0] + values[0], min(old[1], values[1]), max(old[2], values[2]))
+                else:
+                    rows[key] = (old[0] + values[0],)
+    first, last = _part_range(parts[0])[0], _part_range(parts[-1])[1]
+    write_part(os.path.join(path, f'{PART_PREFIX}{first:06d}-{last:06d}'), merged)
+    for part in parts:
+        shutil.rmtree(part)
+    return len(parts)
+
+
+def compact_history(history_path, rollup_path, cutoff, max_parts=8):
+    '''
+    Folds every history segment whose messages are all older than `cutoff` (epoch seconds) into
+    a rollup part and deletes it, then merges the parts if there are too many. The newest
+    segment, which is still being appended to, is always kept. Returns (segments dropped,
+    messages dropped).
+    '''
+    os.makedirs(rollup_path, exist_ok=True)
+    text_ids = None
+    dropped = rows = 0
+    for segment in segment_paths(history_path)[:-1]:
+        first = first_timestamp(segment)
+        if first is not None and first >= cutoff * 1e6:
+            break # segments are in time order
+        times = read_segment(segment, ['timestamp'])['timestamp']
+        if times and max(times) >= cutoff * 1e6:
+            break
+        # A part already exists if a crash came between writing it and deleting the segment
+        if times and not _has_part(rollup_path, segment_number(segment)):
+            if text_ids is None:
+                texts = read_names(rollup_path, TEXTS_FILE)
+                truncate_names(rollup_path, texts, TEXTS_FILE)
+                text_ids = {content_key(text): (i, text) for i, text in enumerate(texts)}
+            known = len(text_ids)
+            tables = fold_segment(segment, text_ids)
+            # New texts go first, so every id in a part can be resolved
+            new_texts = sorted(entry for entry in text_ids.values() if entry[0] >= known)
+            if new_texts:
+                with open(os.path.join(rollup_path, TEXTS_FILE), 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(text) + '\n' for _, text in new_texts))
+            write_part(os.path.join(rollup_path, f'{PART_PREFIX}{segment_number(segment):06d}'), tables)
+        shutil.rmtree(segment)
+        dropped += 1
+        rows += len(times)
+    if dropped:
+        merge_parts(rollup_path, max_parts)
+    return dropped, rows
+
+
+class Compactor:
+    '''
+    Keeps `retention` seconds of raw messages. Every run folds older history segments into
+    rollups, trims the message store's files, moves older timestamps in the history index
+    to hourly counts and drops texts not posted since from the near-duplicate index
+    (`content_index`, which may be set once it has been built). File work happens in a worker thread and index work in small steps, so
+    messages keep being recorded meanwhile. Readers that combine rollups and segments hold `lock`
+    so they don't see a segment in both or neither.
+    '''
+
+    def __init__(self, history_path, rollup_path, retention, store=None, index=None, max_parts=8,
+                 trim_slack=24 * 60 * 60, index_step=1000, content_index=None, metrics=None):
+        self.history_path = history_path
+        self.rollup_path = rollup_path
+        self.retention = retention
+        self.max_parts = max_parts
+        self.store = store
+        self.index = index
+        self.content_index = content_index
+        self.trim_slack = trim_slack
+        self.index_step = index_step
+        self.metrics = metrics or NO_METRICS
+        self.lock = asyncio.Lock()
+        self.runs = 0
+        self.segments_dropped = 0
+        self.messages_dropped = 0
+        self.rows_trimmed = 0
+        self.texts_expired = 0
+
+    async def run_once(self, now=None):
+        cutoff = (now if now is not None else time.time()) - self.retention
+        with self.metrics.timer('compaction'):
+            async with self.lock:
+                dropped, rows = await asyncio.to_thread(compact_history, self.history_path, self.rollup_path,
+                                                       cutoff, self.max_parts)
+            if self.store is not None:
+                self.rows_trimmed += await self.store.trim(cutoff, self.trim_slack)
+            if self.index is not None:
+                author_ids = list(self.index.by_author)
+                for i in range(0, len(author_ids), self.index_step):
+                    self.index.compact(cutoff, author_ids[i:i + self.index_step])
+                    await asyncio.sleep(0)
+            if self.content_index is not None:
+                # Their counts stay in the rollups
+                keys = list(self.content_index.authors)
+                for i in range(0, len(keys), self.index_step):
+                    self.texts_expired += self.content_index.expire(cutoff, keys[i:i + self.index_step])
+                    await asyncio.sleep(0)
+        self.runs += 1
+        self.segments_dropped += dropped
+        self.messages_dropped += rows
+        if dropped:
+            logger.info("Rolled up %d history segments (%d messages) older than %s", dropped, rows,
+                        time.strftime('%Y-%m-%d %H:%M', time.gmtime(cutoff)))
+
+    async def compact_periodically(self, interval):
+        while True:
+            # A corrupt segment or part is logged and retried on the next run, not left to end the task
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("History compaction failed")
+            await asyncio.sleep(interval)
+
+    def stats(self):
+        return {'runs': self.runs, 'segments_dropped': self.segments_dropped,
+                'messages_dropped': self.messages_dropped, 'rows_trimmed': self.rows_trimmed,
+                'texts_expired': self.texts_expired}
@@ -0,0 +1,145 @@
+# scheduler.py
+import asyncio
+import time
+from collections import deque
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class TokenBucket:
+    '''
+    Allows `rate` acquisitions per second on average, with bursts of up to `capacity`.
+    '''
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.waited = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self.tokens -= 1
+
+
+class ScoringScheduler:
+    '''
+    Sits in front of the Perspective client. Texts submitted within `window` seconds of each other
+    (or until `max_batch` are waiting) are collected into one batch, identical texts in a batch are
+    scored once, and the calls are sent concurrently at no more than `qps` per second.
+    '''
+
+    def __init__(self, score_fn, window=0.05, max_batch=20, qps=10, burst=None):
+        self.score_fn = score_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.bucket = TokenBucket(qps, burst)
+        self.queue = None
+        self.collector = None
+        self.dispatching = set() # batch tasks in flight; the loop only keeps weak references
+        self.in_flight = 0
+        self.batches = 0
+        self.submitted = 0
+        self.calls = 0
+        self.latencies = deque(maxlen=10000)
+
+    def _ensure_started(self):
+        if self.collector is None or self.collector.done():
+            self.queue = asyncio.Queue()
+            self.collector = asyncio.create_task(self._collect())
+
+    async def submit(self, text):
+        '''
+        Queues `text` for scoring and waits for its Perspective scores.
+        '''
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self.submitted += 1
+        enqueued = time.perf_counter()
+        await self.queue.put((text, future))
+        try:
+            return await future
+        finally:
+            self.latencies.append(time.perf_counter() - enqueued)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            task = asyncio.create_task(self._dispatch(batch))
+            self.dispatching.add(task)
+            task.add_done_callback(self.dispatching.discard)
+
+    async def _dispatch(self, batch):
+        waiting = {}
+        for text, future in batch:
+            waiting.setdefault(text, []).append(future)
+        self.in_flight += len(batch)
+
+        async def score(text, futures):
+            try:
+                await self.bucket.acquire()
+                self.calls += 1
+                result = await self.score_fn(text)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for future in futures:
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                self.in_flight -= len(futures)
+
+        await asyncio.gather(*(score(text, futures) for text, futures in waiting.items()))
+
+    def queue_depth(self):
+        return (self.queue.qsize() if self.queue else 0) + self.in_flight
+
+    def stats(self):
+        latencies = list(self.latencies)
+        return {
+            'queue_depth': self.queue_depth(),
+            'submitted': self.submitted,
+            'batches': self.batches,
+            'perspective_calls': self.calls,
+            'rate_limit_wait_s': round(self.bucket.waited, 3),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+
+    async def close(self):
+        if self.collector is not None:
+            self.collector.cancel()
+        # Batches already collected are scored, so nobody waiting on them is left hanging
+        await asyncio.gather(*self.dispatching, return_exceptions=True)
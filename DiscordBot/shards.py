@@ -0,0 +1,37 @@
+# shards.py
+import time
+from collections import deque
+from scheduler import percentile
+
+
+class ShardStats:
+    '''
+    Per-shard message counts, throughput and handling latency, so one busy or slow guild shows up
+    against the others.
+    '''
+
+    def __init__(self, samples=1000):
+        self.samples = samples
+        self.shards = {} # shard id -> [messages, total seconds, recent latencies]
+        self.started = time.monotonic()
+
+    def record(self, shard_id, seconds):
+        entry = self.shards.get(shard_id)
+        if entry is None:
+            entry = self.shards[shard_id] = [0, 0.0, deque(maxlen=self.samples)]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2].append(seconds)
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            shard_id: {
+                'messages': count,
+                'msg_per_s': round(count / elapsed, 1),
+                'mean_ms': round(total / count * 1000, 2),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            }
+            for shard_id, (count, total, latencies) in sorted(self.shards.items())
+        }
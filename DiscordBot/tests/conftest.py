@@ -0,0 +1,5 @@
+# conftest.py
+# The bot's modules are flat files in the parent directory, imported the way bot.py imports them
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+from edits import EditPipeline
+
+
+class Normalizer:
+    async def normalize(self, message):
+        return SimpleNamespace(text=message.content)
+
+
+def edit(message_id, content):
+    return SimpleNamespace(id=message_id, content=content)
+
+
+def test_bursts_collapse_and_unchanged_text_is_not_rescored():
+    rescored = []
+
+    async def on_changed(message, context):
+        rescored.append(context.text)
+
+    async def main():
+        pipeline = EditPipeline(Normalizer(), on_changed, delay=0.01, max_wait=1.0)
+        pipeline.remember(1, 'Hello')
+        for content in ['hello there', 'hello there!', 'Hello there!']:
+            pipeline.submit(edit(1, content))
+        pipeline.submit(edit(2, 'HELLO  '))
+        pipeline.remember(2, 'hello')
+        while pipeline.tasks:
+            await asyncio.sleep(0.01)
+        return pipeline.stats()
+
+    stats = asyncio.run(main())
+    assert rescored == ['Hello there!']
+    assert stats['collapsed'] == 2 and stats['rescored'] == 1 and stats['pending'] == 0
+
+
+def test_close_cancels_edits_still_settling():
+    async def on_changed(message, context):
+        raise AssertionError("scored after close")
+
+    async def main():
+        pipeline = EditPipeline(Normalizer(), on_changed, delay=10.0)
+        pipeline.submit(edit(1, 'text'))
+        await pipeline.close()
+        return pipeline.tasks
+
+    assert not asyncio.run(main())
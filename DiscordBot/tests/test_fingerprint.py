@@ -0,0 +1,36 @@
+import asyncio
+from fingerprint import ContentIndex
+from retention import Compactor
+
+
+def test_near_duplicates_are_found():
+    index = ContentIndex()
+    index.add('free nitro at discord gift slash abc', 'a', 1.0)
+    index.add('free nitro at discord gift slash abd', 'b', 2.0)
+    index.add('see you at practice tomorrow', 'c', 3.0)
+    counts = index.author_counts('free nitro at discord gift slash abc', 0.5)
+    assert sorted(counts) == ['a', 'b']
+    assert index.author_counts('free nitro at discord gift slash abc') == {'a': [1, 1.0, 1.0]}
+
+
+def test_expire_drops_texts_not_posted_since_the_cutoff():
+    index = ContentIndex()
+    index.add('old spam that nobody posts any more', 'a', 10.0)
+    index.add('a text that is still going around', 'a', 10.0)
+    index.add('a text that is still going around', 'b', 100.0)
+    assert index.expire(50.0) == 1
+    assert len(index) == 1
+    assert index.author_counts('old spam that nobody posts any more', 0.5) == {}
+    # a text still being posted keeps its older counts
+    assert sorted(index.author_counts('a text that is still going around')) == ['a', 'b']
+    assert sum(len(bucket) for bucket in index.buckets.values()) == index.bands
+
+
+def test_compaction_expires_the_content_index(tmp_path):
+    index = ContentIndex()
+    index.add('old spam that nobody posts any more', 'a', 10.0)
+    index.add('a text that is still going around', 'b', 1000.0)
+    compactor = Compactor(str(tmp_path / 'history'), str(tmp_path / 'rollups'), 500, content_index=index)
+    asyncio.run(compactor.run_once(now=1200.0))
+    assert len(index) == 1
+    assert compactor.stats()['texts_expired'] == 1
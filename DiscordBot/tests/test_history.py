@@ -0,0 +1,56 @@
+from history import HistoryIndex
+
+
+HOUR = 3600
+
+
+def make_index():
+    index = HistoryIndex()
+    for author_id in (1, 2):
+        for t in range(0, 10 * HOUR, 600):
+            index.add(author_id, float(t + author_id))
+    return index
+
+
+def test_compact_everyone_keeps_counts():
+    index = make_index()
+    before = {author_id: index.histogram(author_id, 'hour') for author_id in (1, 2)}
+    summaries = {author_id: index.summary(author_id, 10 * HOUR) for author_id in (1, 2)}
+    index.compact(5 * HOUR)
+    assert {author_id: index.histogram(author_id, 'hour') for author_id in (1, 2)} == before
+    for author_id, summary in summaries.items():
+        # rolled-up messages are only known to the hour
+        assert index.summary(author_id, 10 * HOUR) == dict(summary, first=0.0)
+    assert all(t >= 5 * HOUR for t in index.author_times(1))
+    assert len(index) == 2 * 30
+
+
+def test_compact_drops_authors_with_only_old_messages():
+    index = make_index()
+    index.add(3, 60.0)
+    index.compact(5 * HOUR)
+    assert 3 not in index.by_author
+    assert index.histogram(3, 'hour') == [(0.0, 1)]
+    assert index.summary(3, 10 * HOUR)['first'] == 0.0
+
+
+def test_edits_of_rolled_up_messages_are_not_counted_again():
+    index = make_index()
+    index.compact(5 * HOUR)
+    index.add(1, 1.0)
+    assert index.summary(1, 10 * HOUR)['total'] == 60
+
+
+def test_rollups_loaded_on_startup_match_live_compaction():
+    from array import array
+    live = make_index()
+    live.compact(5 * HOUR)
+    cold = HistoryIndex()
+    for author_id, times in make_index().by_author.items():
+        for t in times:
+            if t >= 5 * HOUR:
+                cold.add(author_id, t)
+    hours = array('q', [h * HOUR for h in range(5)] * 2)
+    cold.load_rollups([(array('q', [1] * 5 + [2] * 5), hours, array('i', [6] * 10))])
+    for author_id in (1, 2):
+        assert cold.histogram(author_id, 'day') == live.histogram(author_id, 'day')
@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+from mention_graph import MentionGraph
+
+
+def message(message_id, author, *mentions):
+    return SimpleNamespace(id=message_id, author=SimpleNamespace(name=author),
+                           mentions=[SimpleNamespace(name=name) for name in mentions])
+
+
+def test_messages_recorded_out_of_order_all_count():
+    graph = MentionGraph()
+    graph.add_message(message(2, 'a', 'b'))
+    graph.add_message(message(1, 'a', 'b', 'c'))
+    assert graph.out_edges == {'a': {'b': 2, 'c': 1}}
+    assert graph.last_message_id == 2
+
+
+def test_snapshot_round_trip(tmp_path):
+    graph = MentionGraph()
+    graph.add_message(message(5, 'a', 'b'))
+    graph.add_message(message(6, 'b', 'c'))
+    path = str(tmp_path / 'graph.json')
+    graph.save(path)
+    loaded = MentionGraph.from_file(path)
+    assert loaded.out_edges == graph.out_edges
+    assert loaded.last_message_id == 6
+    assert sorted(loaded.ego('a')) == [('a', 'b', 1), ('b', 'c', 1)]
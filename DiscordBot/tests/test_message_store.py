@@ -0,0 +1,42 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from columnar import HistoryReader
+from message_store import MessageStore, read_rows
+
+
+def message(message_id, content, *mentions):
+    return SimpleNamespace(id=message_id, author=SimpleNamespace(id=1, name='a'), content=content,
+                           created_at=datetime(2024, 1, 1, tzinfo=timezone.utc), edited_at=None,
+                           mentions=[SimpleNamespace(name=name) for name in mentions])
+
+
+def paths(directory):
+    return [str(directory / name) for name in ['time_data.csv', 'network_data.csv', 'revisions.csv']]
+
+
+def record(store, messages):
+    async def main():
+        for m in messages:
+            store.record(m)
+        await store.close()
+    asyncio.run(main())
+
+
+def test_without_a_history_messages_go_to_the_csv_files(tmp_path):
+    time_path, network_path, revision_path = paths(tmp_path)
+    record(MessageStore(time_path, network_path, revision_path), [message(1, 'hi', 'b'), message(2, 'yo')])
+    assert [row['message_id'] for row in read_rows(time_path)] == ['1', '2']
+    assert [row['message_mentions'] for row in read_rows(network_path)] == ['b']
+
+
+def test_with_a_history_the_csv_files_are_not_written(tmp_path):
+    time_path, network_path, revision_path = paths(tmp_path)
+    history_path = str(tmp_path / 'history')
+    store = MessageStore(time_path, network_path, revision_path, history_path=history_path)
+    record(store, [message(1, 'hi', 'b'), message(2, 'yo')])
+    assert list(read_rows(time_path)) == [] and list(read_rows(network_path)) == []
+    assert [(message_id, content) for message_id, content, _, _ in HistoryReader(history_path).messages()] == \
+        [(1, 'hi'), (2, 'yo')]
+    assert store.stats()['rows_written'] == 2
@@ -0,0 +1,26 @@
+from metrics import Metrics, NO_METRICS
+from mod_dispatch import ModDispatcher
+from lanes import LaneScheduler
+
+
+def test_components_without_metrics_share_no_state():
+    for component in (ModDispatcher(None), LaneScheduler()):
+        component.metrics.count('events')
+        component.metrics.observe('stage', 0.1)
+        with component.metrics.timer('stage'):
+            pass
+        assert component.metrics is NO_METRICS
+    assert not hasattr(NO_METRICS, 'counters')
+
+
+def test_metrics_record_counts_and_timings():
+    metrics = Metrics()
+    metrics.count('events', 2)
+    with metrics.timer('stage'):
+        pass
+    metrics.gauge('queue', lambda: 3)
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {'events': 2}
+    assert snapshot['stages']['stage']['count'] == 1
+    assert snapshot['gauges'] == {'queue': 3}
+    assert 'modbot_events_total{event="events"} 2' in metrics.prometheus()
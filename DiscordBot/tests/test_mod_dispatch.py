@@ -0,0 +1,67 @@
+import asyncio
+from mod_dispatch import AlertGroup, MAX_POST_LENGTH, ModDispatcher
+from mod_queue import ModCase
+
+
+INSTRUCTIONS = "\nreact to this with 👍 to delete the message.\n"
+
+
+def alert(message_id, content, author_id=1):
+    case = ModCase(author_id, f'user{author_id}', message_id, 1, content, 'flagged')
+    return f'**Flagged message**:\nuser{author_id}: "{content}"' + INSTRUCTIONS, case
+
+
+def test_short_alert_is_unchanged():
+    text, case = alert(1, 'hello')
+    assert AlertGroup([], text, case).render() == text
+
+
+def test_long_alert_keeps_its_instructions():
+    text, case = alert(1, 'x' * 3000)
+    post = AlertGroup([], text, case).render()
+    assert len(post) == MAX_POST_LENGTH
+    assert post.endswith('x…"' + INSTRUCTIONS)
+
+
+def test_group_with_a_long_first_alert_fits():
+    text, case = alert(1, 'x' * 1990)
+    group = AlertGroup([], text, case)
+    for i in range(2, 40):
+        group.cases.append(alert(i, 'y' * 500, author_id=i)[1])
+    post = group.render()
+    assert len(post) <= MAX_POST_LENGTH
+    assert INSTRUCTIONS in post
+    assert post.endswith("more")
+
+
+def test_group_lists_at_most_a_few_and_counts_the_rest():
+    text, case = alert(1, 'spam')
+    group = AlertGroup([], text, case)
+    group.cases += [alert(i, 'spam', author_id=i)[1] for i in range(2, 12)]
+    post = group.render()
+    assert post.count('\n- user') == 5
+    assert post.endswith('\n- ...and 5 more')
+
+
+class Channel:
+    id = 7
+
+
+def test_alerts_about_the_same_author_are_folded():
+    posts = []
+
+    async def send(channel, text, case):
+        posts.append((text, case))
+
+    async def main():
+        dispatcher = ModDispatcher(send, window=0.01)
+        for i in range(3):
+            dispatcher.submit(Channel(), *alert(i, f'message {i}'))
+        dispatcher.submit(Channel(), *alert(10, 'other', author_id=2))
+        await dispatcher.drain()
+        return dispatcher.stats()
+
+    stats = asyncio.run(main())
+    assert len(posts) == 2
+    assert posts[0][1].message_ids() == [0, 1, 2]
+    assert stats['saved'] == 2
@@ -0,0 +1,34 @@
+from prefilter import PreFilter, HashedLinearModel, CLEAN, BAD, UNCERTAIN
+
+
+LEXICON = {'THREAT': ['kill'], 'PROFANITY': ['damn']}
+
+
+def test_without_model_short_abusive_text_goes_to_perspective():
+    prefilter = PreFilter(LEXICON)
+    for text in ["kill all jews", "die in hell", "nazis deserve death", "you suck"]:
+        assert prefilter.classify(text) == (UNCERTAIN, {})
+
+
+def test_without_model_only_safe_phrases_and_letterless_text_are_clean():
+    prefilter = PreFilter(LEXICON)
+    for text in ["ok", "LOL!", "thank you", "🙂🙂", "12345", "..."]:
+        assert prefilter.classify(text)[0] == CLEAN
+    assert prefilter.classify("ok kill")[0] == UNCERTAIN
+
+
+def test_lexicon_match_is_never_cleared_by_the_allowlist():
+    prefilter = PreFilter({'PROFANITY': ['lol']})
+    assert prefilter.classify("lol")[0] == UNCERTAIN
+
+
+def test_model_verdicts():
+    model = HashedLinearModel(dim=16)
+    prefilter = PreFilter(LEXICON, model, clean_below=0.05, bad_above=0.97)
+    model.bias = -10
+    assert prefilter.classify("have a nice day")[0] == CLEAN
+    assert prefilter.classify("i will kill you")[0] == UNCERTAIN # a lexicon hit is never cleared
+    model.bias = 10
+    assert prefilter.classify("i will kill you") == (BAD, {'THREAT': 1.0})
+    assert prefilter.classify("have a nice day")[0] == UNCERTAIN # bad needs a lexicon hit too
+    assert prefilter.stats()['clean'] == 1
@@ -0,0 +1,28 @@
+import asyncio
+import time
+import pytest
+from render import RenderError, RenderService
+
+
+def slow_job(seconds):
+    time.sleep(seconds)
+    return b'png'
+
+
+def test_a_timed_out_job_keeps_its_worker_until_it_finishes():
+    async def main():
+        service = RenderService(workers=1, timeout=0.5)
+        try:
+            assert await service.render(slow_job, 0) == b'png' # starts the worker
+            with pytest.raises(RenderError):
+                await service.render(slow_job, 1.5)
+            assert service.semaphore.locked() # the worker is still drawing
+            start = time.perf_counter()
+            assert await service.render(slow_job, 0) == b'png'
+            # waiting for the worker didn't count against the timeout
+            assert time.perf_counter() - start > 0.5
+            return service.stats()
+        finally:
+            service.close()
+
+    assert asyncio.run(main()) == {'completed': 2, 'timeouts': 1}
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import shutil
+from columnar import HistoryWriter, segment_paths, read_names
+from retention import (Compactor, compact_history, merge_parts, part_paths, read_content, read_edges, read_hourly,
+                       fold_segment, write_part, TEXTS_FILE)
+
+
+DAY = 24 * 60 * 60
+START = 1700000000 // DAY * DAY
+
+
+def write_history(path, days=5, per_day=24):
+    writer = HistoryWriter(path, segment_seconds=DAY)
+    for day in range(days):
+        writer.append([(day * 1000 + i, 100 + i % 3, f'user{i % 3}', f'text {i % 4}', (START + day * DAY + i * 3600) * 10 ** 6,
+                        ['user0'] if i % 2 else []) for i in range(per_day)])
+    writer.close()
+
+
+def totals(history, rollups):
+    names = read_names(history)
+    hourly = sum(sum(counts) for _, _, counts in read_hourly(rollups))
+    edges = sum(weight for _, _, weight in read_edges(rollups, names))
+    copies = sum(count for _, _, count, _, _ in read_content(rollups, names))
+    return hourly, edges, copies
+
+
+def test_compaction_drops_old_segments_and_keeps_counts(tmp_path):
+    history, rollups = str(tmp_path / 'history'), str(tmp_path / 'rollups')
+    write_history(history)
+    assert compact_history(history, rollups, START + 3 * DAY) == (3, 72)
+    assert len(segment_paths(history)) == 2
+    assert totals(history, rollups) == (72, 36, 72)
+
+
+def test_newest_segment_is_never_dropped(tmp_path):
+    history, rollups = str(tmp_path / 'history'), str(tmp_path / 'rollups')
+    write_history(history, days=2)
+    assert compact_history(history, rollups, START + 10 * DAY) == (1, 24)
+    assert len(segment_paths(history)) == 1
+
+
+def test_crash_after_writing_a_part_does_not_count_twice(tmp_path):
+    history, rollups = str(tmp_path / 'history'), str(tmp_path / 'rollups')
+    write_history(history)
+    os.makedirs(rollups)
+    # the part for the first segment was written, then the process died before deleting it
+    segment = segment_paths(history)[0]
+    text_ids = {}
+    tables = fold_segment(segment, text_ids)
+    with open(os.path.join(rollups, TEXTS_FILE), 'w') as f:
+        f.writelines(f'"{text}"\n' for _, text in sorted(text_ids.values()))
+    write_part(os.path.join(rollups, 'part-000000'), tables)
+    os.makedirs(os.path.join(rollups, 'part-000001.tmp')) # and a half-written one
+    compact_history(history, rollups, START + 2 * DAY)
+    assert totals(history, rollups) == (48, 24, 48)
+    assert [os.path.basename(part) for part in part_paths(rollups)] == ['part-000000', 'part-000001']
+
+
+def test_torn_text_dictionary_is_truncated(tmp_path):
+    history, rollups = str(tmp_path / 'history'), str(tmp_path / 'rollups')
+    write_history(history)
+    compact_history(history, rollups, START + 1 * DAY)
+    with open(os.path.join(rollups, TEXTS_FILE), 'a') as f:
+        f.write('"half a te')
+    compact_history(history, rollups, START + 3 * DAY)
+    texts = read_names(rollups, TEXTS_FILE)
+    assert sorted(texts) == ['text 0', 'text 1', 'text 2', 'text 3']
+    assert totals(history, rollups) == (72, 36, 72)
+
+
+def test_merge_and_crash_during_merge(tmp_path):
+    history, rollups = str(tmp_path / 'history'), str(tmp_path / 'rollups')
+    write_history(history)
+    compact_history(history, rollups, START + 4 * DAY, max_parts=10)
+    before = totals(history, rollups)
+    saved = str(tmp_path / 'saved')
+    shutil.copytree(rollups, saved)
+    assert merge_parts(rollups, max_parts=2) == 4
+    assert [os.path.basename(part) for part in part_paths(rollups)] == ['part-000000-000003']
+    assert totals(history, rollups) == before
+    # the merged part was renamed into place but the parts it replaced weren't deleted yet
+    for name in os.listdir(saved):
+        if name.startswith('part-'):
+            shutil.copytree(os.path.join(saved, name), os.path.join(rollups, name))
+    assert totals(history, rollups) == before
+    merge_parts(rollups, max_parts=2)
+    assert sorted(os.listdir(rollups)) == ['part-000000-000003', TEXTS_FILE]
+
+
+def test_compactor_keeps_running_after_an_error(tmp_path):
+    compactor = Compactor(str(tmp_path / 'history'), str(tmp_path / 'rollups'), DAY)
+    runs = []
+
+    async def run_once():
+        runs.append(1)
+        if len(runs) == 1:
+            raise ValueError("corrupt segment")
+
+    compactor.run_once = run_once
+
+    async def main():
+        task = asyncio.create_task(compactor.compact_periodically(0))
+        while len(runs) < 3:
+            await asyncio.sleep(0)
+        task.cancel()
+
+    asyncio.run(main())
+    assert len(runs) >= 3
@@ -0,0 +1,44 @@
+import asyncio
+import gc
+from scheduler import ScoringScheduler
+
+
+def test_identical_texts_in_a_batch_are_scored_once():
+    calls = []
+
+    async def score(text):
+        calls.append(text)
+        await asyncio.sleep(0)
+        return {'TOXICITY': len(text) / 10}
+
+    async def main():
+        scheduler = ScoringScheduler(score, window=0.01, qps=1000)
+        results = await asyncio.gather(*(scheduler.submit(text) for text in ['a', 'bb', 'a']))
+        await scheduler.close()
+        return results
+
+    assert asyncio.run(main()) == [{'TOXICITY': 0.1}, {'TOXICITY': 0.2}, {'TOXICITY': 0.1}]
+    assert sorted(calls) == ['a', 'bb']
+
+
+def test_batches_in_flight_survive_gc_and_close():
+    release = None
+
+    async def score(text):
+        await release.wait()
+        return {}
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        scheduler = ScoringScheduler(score, window=0.001, qps=1000)
+        waiting = asyncio.ensure_future(scheduler.submit('text'))
+        while not scheduler.dispatching:
+            await asyncio.sleep(0.001)
+        gc.collect()
+        asyncio.get_running_loop().call_later(0.01, release.set)
+        await scheduler.close()
+        assert not scheduler.dispatching
+        return await waiting
+
+    assert asyncio.run(main()) == {}
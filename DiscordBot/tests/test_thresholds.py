@@ -0,0 +1,75 @@
+import json
+import os
+from thresholds import ATTRIBUTES, COMBINED, ThresholdEngine, to_vector
+
+
+DEFAULTS = {attr: 0.8 for attr in ATTRIBUTES}
+CONFIG = {
+    'default': {'thresholds': {'TOXICITY': 0.7}},
+    'guilds': {
+        '1': {'thresholds': {'INSULT': 0.5}, 'weights': {'TOXICITY': 1.0, 'INSULT': 1.0}, 'combined': 1.0,
+              'channels': {'10': {'thresholds': {'TOXICITY': 0.9}}}},
+    },
+}
+
+
+def write(path, config):
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    # make sure the change is seen even on filesystems with coarse timestamps
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def thresholds(policy):
+    return dict(zip(ATTRIBUTES, policy.thresholds))
+
+
+def test_levels_override_attribute_by_attribute(tmp_path):
+    path = str(tmp_path / 'thresholds.json')
+    write(path, CONFIG)
+    engine = ThresholdEngine(path, DEFAULTS)
+    assert thresholds(engine.policy(2))['TOXICITY'] == 0.7
+    guild = thresholds(engine.policy(1))
+    assert (guild['TOXICITY'], guild['INSULT'], guild['PROFANITY']) == (0.7, 0.5, 0.8)
+    channel = engine.policy(1, 10)
+    assert (thresholds(channel)['TOXICITY'], thresholds(channel)['INSULT']) == (0.9, 0.5)
+    assert channel.combined == 1.0 # inherited as a whole
+    assert engine.policy(1, 11) is engine.policy(1)
+
+
+def test_combined_score_flags_only_when_nothing_else_does(tmp_path):
+    path = str(tmp_path / 'thresholds.json')
+    write(path, CONFIG)
+    engine = ThresholdEngine(path, DEFAULTS)
+    vector, flagged = engine.evaluate({'TOXICITY': 0.6, 'INSULT': 0.45}, 1)
+    assert vector == to_vector({'TOXICITY': 0.6, 'INSULT': 0.45})
+    assert flagged == {COMBINED: 1.05}
+    assert engine.evaluate({'TOXICITY': 0.6, 'INSULT': 0.45}, 2)[1] == {}
+    assert engine.evaluate({'TOXICITY': 0.75, 'INSULT': 0.5}, 1)[1] == {'TOXICITY': 0.75, 'INSULT': 0.5}
+
+
+def test_reload_picks_up_changes_and_keeps_policies_on_bad_config(tmp_path):
+    path = str(tmp_path / 'thresholds.json')
+    engine = ThresholdEngine(path, DEFAULTS)
+    assert thresholds(engine.policy(1))['TOXICITY'] == 0.8
+    write(path, CONFIG)
+    assert engine.reload()
+    assert not engine.reload() # unchanged
+    assert thresholds(engine.policy(1))['INSULT'] == 0.5
+    write(path, {'guilds': {'1': {'thresholds': {'NOT_AN_ATTRIBUTE': 0.5}}}})
+    assert not engine.reload()
+    assert thresholds(engine.policy(1))['INSULT'] == 0.5
+    with open(path, 'w') as f:
+        f.write('{"default": ')
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 2 * 10 ** 9))
+    assert not engine.reload()
+    write(path, {'default': {'combined': '0.5', 'weights': {'TOXICITY': 1}}})
+    assert not engine.reload()
+    write(path, {'default': {'thresholds': {'TOXICITY': True}}})
+    assert not engine.reload()
+    assert engine.stats()['errors'] == 4
+    assert engine.evaluate({'TOXICITY': 0.6, 'INSULT': 0.45}, 1)[1] == {COMBINED: 1.05}
+    os.remove(path)
+    assert engine.reload()
+    assert thresholds(engine.policy(1))['INSULT'] == 0.8
@@ -0,0 +1,276 @@
+# thresholds.py
+# Per-guild and per-channel flagging policies, reloaded from a JSON file while the bot runs.
+#
+#   {
+#     "default": {"thresholds": {"TOXICITY": 0.7}, "weights": {"TOXICITY": 0.5, "INSULT": 0.5}, "combined": 0.6},
+#     "guilds": {
+#       "<guild id>": {"thresholds": {"PROFANITY": 0.95},
+#                      "channels": {"<channel id>": {"thresholds": {"SPAM": 0.8}}}}
+#     }
+#   }
+#
+# Each level overrides the one above it attribute by attribute; "weights" and "combined" replace
+# the inherited ones as a whole. A message is flagged when any attribute reaches its threshold or,
+# if "combined" is set, when the weighted sum of its scores reaches it.
+#
+# Re-tune a policy offline against the moderators' decisions with:
+#   python thresholds.py outcomes.jsonl [thresholds.json]
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from perspective import REQUESTED_ATTRIBUTES, PERSPECTIVE_SCORE_THRESHOLD_BY_ATTR
+
+
+logger = logging.getLogger('discord')
+
+# Scores are handled as vectors in this order
+ATTRIBUTES = list(REQUESTED_ATTRIBUTES)
+ATTRIBUTE_INDEX = {attr: i for i, attr in enumerate(ATTRIBUTES)}
+# Shown among the flagged categories when only the weighted sum crossed its threshold
+COMBINED = 'COMBINED'
+# Moderator actions on a post; anything else in the outcomes log is a post nobody acted on
+ACTIONS = ('👍', '❌', '🗑️')
+POSTED = 'posted'
+
+
+def to_vector(scores):
+    '''
+    The scores as a tuple in ATTRIBUTES order; attributes Perspective didn't return are 0.
+    '''
+    return tuple(scores.get(attr, 0.0) for attr in ATTRIBUTES)
+
+
+def _check_number(value, where, name):
+    # bool is an int, but true/false in the config is a mistake, not a threshold
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{where}: {name} must be a number")
+
+
+def _check_attributes(values, where):
+    for attr, value in values.items():
+        if attr not in ATTRIBUTE_INDEX:
+            raise ValueError(f"{where}: unknown attribute {attr!r}")
+        _check_number(value, where, attr)
+
+
+class Policy:
+    '''
+    Per-attribute thresholds and an optional weighted combined score, both over score vectors.
+    '''
+
+    def __init__(self, thresholds, weights=None, combined=None):
+        self.thresholds = tuple(thresholds.get(attr, 1.0) for attr in ATTRIBUTES)
+        self.weights = tuple((weights or {}).get(attr, 0.0) for attr in ATTRIBUTES)
+        self.combined = combined
+
+    def evaluate(self, vector):
+        '''
+        Returns the flagged attributes of one vector as {attr: score}.
+        '''
+        flagged = {attr: score for attr, score, threshold in zip(ATTRIBUTES, vector, self.thresholds)
+                   if score >= threshold}
+        if self.combined is not None and not flagged:
+            total = sum(score * weight for score, weight in zip(vector, self.weights))
+            if total >= self.combined:
+                flagged[COMBINED] = round(total, 4)
+        return flagged
+
+    def evaluate_many(self, matrix):
+        '''
+        Flags a batch at once: `matrix` is an (n, len(ATTRIBUTES)) NumPy array of score vectors.
+        Returns (n x attributes boolean mask, n booleans for "flagged at all").
+        '''
+        import numpy as np
+        over = matrix >= np.asarray(self.thresholds)
+        flagged = over.any(axis=1)
+        if self.combined is not None:
+            flagged |= matrix @ np.asarray(self.weights) >= self.combined
+        return over, flagged
+
+
+class ThresholdEngine:
+    '''
+    Resolves the policy for a guild and channel. The config file at `path` is checked for changes
+    by `reload()`; a config that fails to parse is logged and the previous policies are kept.
+    Without a config file every guild gets `defaults`.
+    '''
+
+    def __init__(self, path=None, defaults=PERSPECTIVE_SCORE_THRESHOLD_BY_ATTR):
+        self.path = path
+        self.defaults = dict(defaults)
+        self.mtime = None
+        self.reloads = 0
+        self.errors = 0
+        self._build({})
+        self.reload()
+
+    def _build(self, config):
+        default = config.get('default', {})
+        base = self._merge({'thresholds': self.defaults, 'weights': None, 'combined': None}, default, 'default')
+        policies = {}
+        for guild_id, guild in config.get('guilds', {}).items():
+            merged = self._merge(base, guild, f'guild {guild_id}')
+            policies[(int(guild_id), None)] = Policy(**merged)
+            for channel_id, channel in guild.get('channels', {}).items():
+                policies[(int(guild_id), int(channel_id))] = Policy(**self._merge(merged, channel, f'channel {channel_id}'))
+        # Built completely before being swapped in, so lookups never see half a config
+        self.default = Policy(**base)
+        self.policies = policies
+
+    @staticmethod
+    def _merge(parent, level, where):
+        thresholds = level.get('thresholds', {})
+        _check_attributes(thresholds, where)
+        merged = {'thresholds': dict(parent['thresholds'], **thresholds),
+                  'weights': parent['weights'], 'combined': parent['combined']}
+        if 'weights' in level:
+            _check_attributes(level['weights'], where)
+            merged['weights'] = level['weights']
+        if 'combined' in level:
+            if level['combined'] is not None:
+                _check_number(level['combined'], where, 'combined')
+            merged['combined'] = level['combined']
+        return merged
+
+    def reload(self):
+        '''
+        Re-reads the config if it changed since the last check. Returns True if it was reloaded.
+        '''
+        if not self.path:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        try:
+            config = {}
+            if mtime is not None:
+                with open(self.path) as f:
+                    config = json.load(f)
+            self._build(config)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            self.errors += 1
+            logger.error("Keeping the previous thresholds, %s is invalid: %s", self.path, e)
+            return False
+        self.reloads += 1
+        logger.info("Loaded thresholds from %s (%d guild/channel policies)", self.path, len(self.policies))
+        return True
+
+    async def reload_periodically(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.reload()
+
+    def policy(self, guild_id=None, channel_id=None):
+        return (self.policies.get((guild_id, channel_id)) or self.policies.get((guild_id, None))
+                or self.default)
+
+    def evaluate(self, scores, guild_id=None, channel_id=None):
+        '''
+        Returns (score vector, flagged attributes) for a Perspective result.
+        '''
+        vector = to_vector(scores)
+        return vector, self.policy(guild_id, channel_id).evaluate(vector)
+
+    def stats(self):
+        return {'policies': len(self.policies), 'reloads': self.reloads, 'errors': self.errors}
+
+
+class OutcomeLog:
+    '''
+    Appends one JSON line per scored mod-channel post and per moderator action on one, with the
+    message's score vector, so thresholds can be re-tuned against what moderators acted on.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.log = open(path, 'a', buffering=1)
+
+    def record(self, case, guild_id, event):
+        vector = getattr(case, 'vector', None)
+        if vector is None:
+            return
+        self.log.write(json.dumps({'time': time.time(), 'event': event, 'guild_id': guild_id,
+                                   'channel_id': case.channel_id, 'message_id': case.message_id,
+                                   'category': case.category, 'vector': list(vector)}) + '\n')
+
+    def close(self):
+        self.log.close()
+
+
+def load_outcomes(path):
+    '''
+    Returns (score matrix, labels, guild ids) with one row per posted message; the label is 1 if a
+    moderator acted on it.
+    '''
+    import numpy as np
+    posts = {}
+    acted = set()
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue # cut off mid-write
+            if entry['event'] == POSTED:
+                posts[entry['message_id']] = entry
+            elif entry['event'] in ACTIONS:
+                acted.add(entry['message_id'])
+                posts.setdefault(entry['message_id'], entry)
+    entries = list(posts.values())
+    matrix = np.array([entry['vector'] for entry in entries], dtype=float).reshape(-1, len(ATTRIBUTES))
+    labels = np.array([entry['message_id'] in acted for entry in entries])
+    guilds = np.array([entry['guild_id'] or 0 for entry in entries], dtype=np.int64)
+    return matrix, labels, guilds
+
+
+def precision_recall(flagged, labels):
+    hits = int((flagged & labels).sum())
+    return hits / max(int(flagged.sum()), 1), hits / max(int(labels.sum()), 1)
+
+
+def tune(policy, matrix, labels, grid):
+    '''
+    For each attribute in turn, the threshold from `grid` with the best F1 against `labels` while
+    the others stay at the policy's values. Returns {attr: (threshold, precision, recall)}.
+    '''
+    import numpy as np
+    best = {}
+    for i, attr in enumerate(ATTRIBUTES):
+        others = np.delete(matrix, i, axis=1) >= np.delete(np.asarray(policy.thresholds), i)
+        flagged_by_others = others.any(axis=1)
+        if policy.combined is not None:
+            flagged_by_others |= matrix @ np.asarray(policy.weights) >= policy.combined
+        # every candidate threshold at once: (len(grid), n)
+        flagged = flagged_by_others | (matrix[:, i] >= np.asarray(grid)[:, None])
+        hits = (flagged & labels).sum(axis=1)
+        precision = hits / np.maximum(flagged.sum(axis=1), 1)
+        recall = hits / max(int(labels.sum()), 1)
+        f1 = 2 * precision * recall / np.maximum(precision + recall, 1e-9)
+        j = int(f1.argmax())
+        best[attr] = (float(grid[j]), float(precision[j]), float(recall[j]))
+    return best
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        sys.exit("usage: python thresholds.py <outcomes.jsonl> [thresholds.json]")
+    import numpy as np
+    engine = ThresholdEngine(sys.argv[2] if len(sys.argv) == 3 else None)
+    matrix, labels, guilds = load_outcomes(sys.argv[1])
+    print(f"{len(labels)} posted messages, {int(labels.sum())} acted on")
+    # Each guild is tuned against its own policy and decisions (guild 0 is direct messages)
+    for guild_id in np.unique(guilds).tolist():
+        rows = guilds == guild_id
+        policy = engine.policy(guild_id)
+        precision, recall = precision_recall(policy.evaluate_many(matrix[rows])[1], labels[rows])
+        print(f"guild {guild_id}: {int(rows.sum())} posts, current policy precision {precision:.2f}, recall {recall:.2f}")
+        for attr, (threshold, precision, recall) in tune(policy, matrix[rows], labels[rows], np.arange(0.3, 1.0, 0.01)).items():
+            print(f"  {attr:16} {policy.thresholds[ATTRIBUTE_INDEX[attr]]:.2f} -> {threshold:.2f} "
+                  f"(precision {precision:.2f}, recall {recall:.2f})")
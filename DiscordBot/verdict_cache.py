@@ -0,0 +1,72 @@
+# verdict_cache.py
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+from lru import LRUCache
+
+
+logger = logging.getLogger('discord')
+
+ZERO_WIDTH = re.compile('[\u200b-\u200f\u2060\ufeff]')
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_key_text(text):
+    '''
+    Folds away differences that don't change how Perspective scores a message (case, repeated
+    whitespace, zero-width characters) so lightly varied copies of a spam text share a cache entry.
+    '''
+    text = unicodedata.normalize('NFKC', text)
+    text = ZERO_WIDTH.sub('', text)
+    return WHITESPACE.sub(' ', text).strip().casefold()
+
+
+def content_key(text):
+    return hashlib.sha256(normalize_key_text(text).encode('utf-8')).hexdigest()
+
+
+class VerdictCache:
+    '''
+    Perspective attribute scores keyed by a hash of the normalized message text. If `path` is set
+    the cache is loaded from and saved to that JSON file so it survives restarts.
+    '''
+
+    def __init__(self, maxsize=50000, ttl=24 * 60 * 60, path=None):
+        self.entries = LRUCache(maxsize, ttl)
+        self.path = path
+        if path:
+            self.load()
+
+    def get(self, text):
+        return self.entries.get(content_key(text))
+
+    def put(self, text, scores):
+        self.entries.set(content_key(text), scores)
+
+    def stats(self):
+        return self.entries.stats()
+
+    def load(self):
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable verdict cache %s: %r", self.path, e)
+            return
+        # Saved oldest first, so replaying the entries restores the LRU order
+        for key, scores, stored_at in saved:
+            self.entries.set(key, scores, stored_at)
+        self.entries.expire()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries.items(), f)
+        os.replace(tmp_path, self.path)